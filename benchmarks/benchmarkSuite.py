@@ -0,0 +1,465 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from benchmarks.fixtures import (
+    API_UM_FIXTURE,
+    FIXTURE_ROUTE_REFS,
+    fixtureNetwork,
+    loadApiResults,
+    loadGTFSStops,
+    loadOverpassJson,
+    loadOverpassResult,
+    loadWTPPages,
+    recordFixtures,
+    writeFixtureGTFSZip,
+)
+from compare.comparator import buildDiffRows, compareStops
+from gtfs.gtfsPatterns import buildPatternIndex
+from gtfs.gtfsShapes import GTFSShapes
+from gtfs.osmGTFSStopsComparer import compareOSMAndGTFSStops
+from model.runContext import RunContext
+from osm.OSMRelationAnalyzer import analyzeOSMRelations, scrapeOSMRoutes
+from osm.overpass import parseOverpassJson
+from pipeline.report import (
+    findNotLinkedWtpUrls,
+    renderIndex,
+    sharedTemplateContext,
+    templateEnvironment,
+)
+from pipeline.staticOutput import OutputOptions
+from warsaw.fetchApiRoutes import parseApiRoutesJson
+from warsaw.wtpLastStopRefs import generateLastStopRefs
+from warsaw.wtpScraper import cachedParseWebsite
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+# templates are read relative to the working directory
+REPOSITORY_DIRECTORY = Path(__file__).parent.parent
+BASELINE_VERSION = 1
+# a benchmark regresses when it is this much slower than in the baseline
+REGRESSION_TOLERANCE = 0.3
+MIN_REPEATS = 5
+MAX_REPEATS = 1000
+MIN_SECONDS = 1.0
+# a regression is reported only when it is measured again
+CONFIRMATION_RUNS = 2
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    # prepares fresh inputs outside of the measured time
+    setup: Callable[[], Any]
+    run: Callable[[Any], object]
+    # calls per timed sample, fast benchmarks with reusable inputs take several
+    number: int = 1
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    name: str
+    seconds: float
+    # seconds divided by seconds of the calibration loop on the same machine
+    relative: float
+
+
+CALIBRATION = "calibration"
+
+
+@dataclass(frozen=True)
+class Comparison:
+    name: str
+    relative: float
+    baselineRelative: float | None
+    regression: bool
+
+
+def interpreterName() -> str:
+    return f"{platform.python_implementation()} {platform.python_version()}"
+
+
+def calibrationLoop() -> int:
+    # pure Python work similar to the pipeline: strings, dicts and small objects
+    counts: dict[str, int] = {}
+    for i in range(20000):
+        key = f"{i % 97:02d}-{i % 13}"
+        counts[key] = counts.get(key, 0) + len(key.split("-"))
+    return sum(counts.values())
+
+
+def _emptyGTFSInputs() -> dict[str, Any]:
+    # recorded fixtures have no GTFS trips, route shapes aren't compared
+    return {
+        "gtfsPatterns": buildPatternIndex([]),
+        "gtfsShapes": GTFSShapes(shapeRanges={}, lats=array("d"), lons=array("d")),
+    }
+
+
+def runPython(arguments: list[str]) -> None:
+    # a fresh interpreter, imports and lazy initialization are measured too
+    subprocess.run(  # noqa: S603
+        [sys.executable, *arguments],
+        cwd=REPOSITORY_DIRECTORY,
+        check=True,
+        capture_output=True,
+    )
+
+
+def benchmarks(workDirectory: Path) -> list[Benchmark]:
+    pages = loadWTPPages()
+    overpassJson = loadOverpassJson()
+    overpassResult = loadOverpassResult()
+    apiResults = loadApiResults()
+    gtfsStops = loadGTFSStops()
+    network = fixtureNetwork(pages, workDirectory / "osm-wtp")
+    network.outputDirectory.mkdir(parents=True, exist_ok=True)
+
+    def scrapeFixtures() -> tuple[list, RunContext]:
+        context = RunContext()
+        scrapedRoutes = scrapeOSMRoutes(
+            list(overpassResult.relations.values()),
+            network,
+            httpClient=None,
+            context=context,
+        )
+        return scrapedRoutes, context
+
+    def analyze(inputs: tuple[list, RunContext]) -> Any:  # noqa: ANN401
+        scrapedRoutes, context = inputs
+        return analyzeOSMRelations(
+            overpassResult=overpassResult,
+            scrapedOSMRoutes=scrapedRoutes,
+            apiResults=apiResults,
+            gtfsStops=gtfsStops,
+            lastStopRefs=generateLastStopRefs(scrapedRoutes),
+            network=network,
+            context=context,
+            **_emptyGTFSInputs(),
+        )
+
+    scrapedRoutes, context = scrapeFixtures()
+    osmResults = analyze((scrapedRoutes, context))
+    compareResult = compareStops(osmResults, context.osmRefToName)
+    variants = [variant for results in osmResults.values() for variant in results]
+    env = templateEnvironment()
+    gtfsZipPath = workDirectory / "gtfs.zip"
+    writeFixtureGTFSZip(gtfsZipPath)
+
+    def renderFixtureIndex(_: None) -> None:
+        renderIndex(
+            env,
+            compareResult,
+            findNotLinkedWtpUrls(context, network),
+            context,
+            sharedTemplateContext(datetime.now(UTC)),
+            network,
+            outputOptions=OutputOptions(),
+        )
+
+    return [
+        Benchmark(
+            "cachedParseWebsite",
+            lambda: pages,
+            lambda pages: [
+                cachedParseWebsite(htmlContent=html, inputUrl=url, httpClient=None)
+                for url, html in pages.items()
+            ],
+        ),
+        Benchmark("parseOverpassJson", lambda: overpassJson, parseOverpassJson),
+        Benchmark(
+            "parseApiRoutesJson",
+            API_UM_FIXTURE.read_text,
+            parseApiRoutesJson,
+            number=20,
+        ),
+        Benchmark("analyzeOSMRelations", scrapeFixtures, analyze),
+        Benchmark(
+            "generateLastStopRefs",
+            lambda: scrapedRoutes,
+            generateLastStopRefs,
+            number=10,
+        ),
+        Benchmark(
+            "compareStops",
+            lambda: osmResults,
+            lambda osmResults: compareStops(osmResults, context.osmRefToName),
+            number=50,
+        ),
+        Benchmark(
+            "buildDiffRows",
+            lambda: variants,
+            lambda variants: [
+                buildDiffRows(
+                    [stop.ref for stop in variant.osmStops],
+                    [stop.ref for stop in variant.operatorStops],
+                    context.osmRefToName,
+                    compareResult.operatorRefToName,
+                    variant.stopsDetour,
+                    variant.stopsNew,
+                )
+                for variant in variants
+            ],
+            number=50,
+        ),
+        Benchmark(
+            "compareOSMAndGTFSStops",
+            lambda: context,
+            lambda context: compareOSMAndGTFSStops(gtfsStops, context),
+            number=5,
+        ),
+        Benchmark("renderIndex", lambda: None, renderFixtureIndex),
+        Benchmark(
+            "startupHelp", lambda: None, lambda _: runPython(["main.py", "--help"])
+        ),
+        Benchmark(
+            "startupSingleRoute",
+            lambda: None,
+            lambda _: runPython(
+                [
+                    "-m",
+                    "benchmarks.singleRouteCheck",
+                    str(gtfsZipPath),
+                    str(workDirectory / "fragment.html"),
+                ],
+            ),
+        ),
+    ]
+
+
+@contextlib.contextmanager
+def quietPipeline() -> Iterator[None]:
+    # logDuration messages and tqdm progress bars of measured functions
+    logging.disable(logging.INFO)
+    try:
+        with contextlib.redirect_stderr(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def _timed(function: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def measure(
+    benchmark: Benchmark,
+    *,
+    minRepeats: int = MIN_REPEATS,
+    minSeconds: float = MIN_SECONDS,
+) -> tuple[float, float]:
+    # repeats alternate with the calibration loop, so both see the same machine speed,
+    # the fastest repeat is the least disturbed by the rest of the machine
+    times: list[float] = []
+    calibrationTimes: list[float] = []
+    while len(times) < MAX_REPEATS and (
+        len(times) < minRepeats or sum(times) + sum(calibrationTimes) < minSeconds
+    ):
+        inputs = benchmark.setup()
+        calibrationTimes.append(_timed(calibrationLoop))
+        times.append(
+            _timed(lambda: [benchmark.run(inputs) for _ in range(benchmark.number)])  # noqa: B023
+            / benchmark.number,
+        )
+    return min(times), min(calibrationTimes)
+
+
+def runBenchmarks(
+    workDirectory: Path,
+    *,
+    minRepeats: int = MIN_REPEATS,
+    minSeconds: float = MIN_SECONDS,
+    names: set[str] | None = None,
+) -> list[BenchmarkResult]:
+    results = []
+    calibrationTimes = []
+    with quietPipeline():
+        for benchmark in benchmarks(workDirectory):
+            if names is not None and benchmark.name not in names:
+                continue
+            seconds, calibrationSeconds = measure(
+                benchmark,
+                minRepeats=minRepeats,
+                minSeconds=minSeconds,
+            )
+            calibrationTimes.append(calibrationSeconds)
+            results.append(
+                BenchmarkResult(
+                    name=benchmark.name,
+                    seconds=seconds,
+                    relative=seconds / calibrationSeconds,
+                ),
+            )
+    return [BenchmarkResult(CALIBRATION, min(calibrationTimes), 1.0), *results]
+
+
+def loadBaseline(path: Path) -> dict[str, float] | None:
+    if not path.exists():
+        return None
+    baseline = json.loads(path.read_text())
+    if baseline["version"] != BASELINE_VERSION:
+        logging.warning(f"⚠️ Baseline version {baseline['version']} is outdated")
+        return None
+    if baseline["interpreter"].split()[0] != platform.python_implementation():
+        logging.warning(
+            f"⚠️ Baseline was recorded with {baseline['interpreter']}, "
+            f"not comparable with {interpreterName()}",
+        )
+        return None
+    return baseline["relative"]
+
+
+def writeBaseline(results: list[BenchmarkResult], path: Path) -> None:
+    path.write_text(
+        json.dumps(
+            {
+                "version": BASELINE_VERSION,
+                "interpreter": interpreterName(),
+                "relative": {
+                    result.name: round(result.relative, 4) for result in results
+                },
+            },
+            indent=2,
+        )
+        + "\n",
+    )
+
+
+def compareWithBaseline(
+    results: list[BenchmarkResult],
+    baseline: dict[str, float],
+    tolerance: float = REGRESSION_TOLERANCE,
+) -> list[Comparison]:
+    return [
+        Comparison(
+            name=result.name,
+            relative=result.relative,
+            baselineRelative=baseline.get(result.name),
+            regression=result.name in baseline
+            and result.relative > baseline[result.name] * (1 + tolerance),
+        )
+        for result in results
+        if result.name != CALIBRATION
+    ]
+
+
+def confirmRegressions(
+    results: list[BenchmarkResult],
+    baseline: dict[str, float],
+    tolerance: float,
+    workDirectory: Path,
+    minSeconds: float,
+) -> list[BenchmarkResult]:
+    # a single noisy measurement on a shared machine shouldn't fail the suite,
+    # benchmarks which regressed are measured again and keep their best result
+    resultByName = {result.name: result for result in results}
+    for _ in range(CONFIRMATION_RUNS):
+        regressions = {
+            comparison.name
+            for comparison in compareWithBaseline(
+                list(resultByName.values()),
+                baseline,
+                tolerance,
+            )
+            if comparison.regression
+        }
+        if len(regressions) == 0:
+            break
+        for result in runBenchmarks(
+            workDirectory,
+            minSeconds=minSeconds,
+            names=regressions,
+        )[1:]:
+            if result.relative < resultByName[result.name].relative:
+                resultByName[result.name] = result
+    return list(resultByName.values())
+
+
+def formatResults(
+    results: list[BenchmarkResult],
+    comparisons: list[Comparison],
+) -> str:
+    comparisonByName = {comparison.name: comparison for comparison in comparisons}
+    lines = [f"{'benchmark':24} {'ms':>10} {'relative':>10} {'baseline':>10}"]
+    for result in results:
+        comparison = comparisonByName.get(result.name)
+        baselineText = "-"
+        marker = ""
+        if comparison is not None and comparison.baselineRelative is not None:
+            baselineText = f"{comparison.baselineRelative:.3f}"
+            change = comparison.relative / comparison.baselineRelative - 1
+            marker = f" {change:+.0%}" + (
+                " ❌ regression" if comparison.regression else ""
+            )
+        lines.append(
+            f"{result.name:24} {result.seconds * 1000:10.3f} "
+            f"{result.relative:10.3f} {baselineText:>10}{marker}",
+        )
+    return "\n".join(lines) + "\n"
+
+
+def parseArguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline on recorded fixtures, fully offline",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store results as the new baseline instead of comparing with it",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=REGRESSION_TOLERANCE,
+        help="allowed slowdown relative to the baseline, 0.3 means 30%%",
+    )
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS)
+    parser.add_argument(
+        "--record",
+        nargs="*",
+        metavar="ROUTE_REF",
+        help="download current fixtures of these routes instead of benchmarking, "
+        f"default {' '.join(FIXTURE_ROUTE_REFS)}",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parseArguments()
+    if arguments.record is not None:
+        recordFixtures(arguments.record or FIXTURE_ROUTE_REFS, os.getenv("API_KEY"))
+        sys.exit(0)
+    with tempfile.TemporaryDirectory() as workDirectory:
+        results = runBenchmarks(Path(workDirectory), minSeconds=arguments.min_seconds)
+        if arguments.update_baseline:
+            writeBaseline(results, arguments.baseline)
+            sys.stdout.write(formatResults(results, []))
+            sys.exit(0)
+        baseline = loadBaseline(arguments.baseline) or {}
+        results = confirmRegressions(
+            results,
+            baseline,
+            arguments.tolerance,
+            Path(workDirectory),
+            arguments.min_seconds,
+        )
+    comparisons = compareWithBaseline(results, baseline, arguments.tolerance)
+    sys.stdout.write(formatResults(results, comparisons))
+    if any(comparison.regression for comparison in comparisons):
+        sys.exit(1)
@@ -0,0 +1,233 @@
+import csv
+import dataclasses
+import json
+import logging
+import zipfile
+from collections.abc import Callable, Iterator, Mapping
+from pathlib import Path
+
+import httpx
+from httpx import Client
+from starsep_utils import OverpassResult
+
+from configuration import OVERPASS_URL
+from gtfs.gtfsFeed import GTFSFeed, readGTFSColumns
+from gtfs.osmGTFSStopsComparer import shouldIgnoreGTFSRef
+from model.gtfs import GTFSStop
+from model.operatorRoute import OperatorRouteResult, OperatorRoutes
+from model.runContext import RunContext
+from model.types import RouteRef, StopRef
+from network.transitNetwork import TransitNetwork
+from osm.overpass import (
+    downloadOverpassJson,
+    parseOverpassJson,
+    relationsWithMembersQuery,
+)
+from pipeline.routeCheck import downloadRouteRelationIds
+from pipeline.runState import currentRun
+from scraper.httpx_client import httpxClient
+from scraper.scraper import fetchWebsite
+from warsaw.fetchApiRoutes import downloadApiRoutesJson, parseApiRoutesJson
+from warsaw.network import warsawNetwork
+from warsaw.wtpScraper import (
+    WTPLink,
+    addWTPResultToContext,
+    cachedParseWebsite,
+)
+
+FIXTURES_DIRECTORY = Path(__file__).parent / "fixtures"
+WTP_PAGES_DIRECTORY = FIXTURES_DIRECTORY / "wtp"
+OVERPASS_FIXTURE = FIXTURES_DIRECTORY / "overpass.json"
+API_UM_FIXTURE = FIXTURES_DIRECTORY / "api-um.json"
+GTFS_STOPS_FIXTURE = FIXTURES_DIRECTORY / "stops.txt"
+GTFS_STOPS_COLUMNS = ["stop_id", "stop_name", "stop_lat", "stop_lon"]
+# routes whose data is recorded by --record
+FIXTURE_ROUTE_REFS = ["520", "17"]
+# recorded fixtures have no GTFS trips, other files of the feed have only headers
+GTFS_EMPTY_FILES = {
+    "routes.txt": ["route_id", "route_short_name"],
+    "trips.txt": ["route_id", "trip_id", "shape_id"],
+    "stop_times.txt": ["trip_id", "stop_sequence", "stop_id"],
+    "shapes.txt": ["shape_id", "shape_pt_sequence", "shape_pt_lat", "shape_pt_lon"],
+}
+
+
+def wtpPageName(link: WTPLink) -> str:
+    return f"{link.line}-{link.direction}-{link.variant}.html"
+
+
+class WTPPageDirectory(Mapping[str, str]):
+    # operator url => HTML read on demand, large synthetic networks don't fit in memory
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def __getitem__(self, url: str) -> str:
+        link = WTPLink.parseWTPRouteLink(url)
+        path = None if link is None else self.directory / wtpPageName(link)
+        if path is None or not path.exists():
+            raise KeyError(url)
+        return path.read_text()
+
+    def __iter__(self) -> Iterator[str]:
+        for path in sorted(self.directory.glob("*.html")):
+            line, direction, variant = path.stem.rsplit("-", 2)
+            yield WTPLink(line, direction, variant).url()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.directory.glob("*.html"))
+
+
+def loadWTPPages() -> dict[str, str]:
+    # operator url => recorded HTML
+    return dict(WTPPageDirectory(WTP_PAGES_DIRECTORY))
+
+
+def loadOverpassJson() -> str:
+    return OVERPASS_FIXTURE.read_text()
+
+
+def loadOverpassResult() -> OverpassResult:
+    return parseOverpassJson(loadOverpassJson())
+
+
+def loadApiResults() -> OperatorRoutes:
+    return parseApiRoutesJson(API_UM_FIXTURE.read_text())
+
+
+def loadGTFSStops() -> dict[StopRef, GTFSStop]:
+    with GTFS_STOPS_FIXTURE.open(newline="") as stopsFile:
+        return {
+            row["stop_id"]: GTFSStop(
+                ref=row["stop_id"],
+                name=row["stop_name"],
+                lat=float(row["stop_lat"]),
+                lon=float(row["stop_lon"]),
+            )
+            for row in csv.DictReader(stopsFile)
+            if not shouldIgnoreGTFSRef(row["stop_id"], warsawNetwork.stopRefLength)
+        }
+
+
+def writeFixtureGTFSZip(zipPath: Path) -> None:
+    with zipfile.ZipFile(zipPath, "w", zipfile.ZIP_DEFLATED) as zipFile:
+        zipFile.write(GTFS_STOPS_FIXTURE, "stops.txt")
+        for fileName, header in GTFS_EMPTY_FILES.items():
+            zipFile.writestr(fileName, ",".join(header) + "\n")
+
+
+def fixtureGTFSFeed(zipPath: Path) -> GTFSFeed:
+    return GTFSFeed(
+        name="fixture",
+        zipPath=zipPath,
+        stopRefLength=warsawNetwork.stopRefLength,
+    )
+
+
+def serveFixtures(request: httpx.Request) -> httpx.Response:
+    # answers Overpass, API UM and WTP requests of recorded routes
+    pages = WTPPageDirectory(WTP_PAGES_DIRECTORY)
+    if str(request.url) == OVERPASS_URL:
+        return httpx.Response(200, text=OVERPASS_FIXTURE.read_text())
+    if request.url.host == "api.um.warszawa.pl":
+        return httpx.Response(200, text=API_UM_FIXTURE.read_text())
+    if str(request.url) in pages:
+        return httpx.Response(200, text=pages[str(request.url)])
+    return httpx.Response(200, text="<html><body></body></html>")
+
+
+def fixtureTransport() -> httpx.MockTransport:
+    return httpx.MockTransport(serveFixtures)
+
+
+def fixtureNetwork(
+    pages: Mapping[str, str],
+    outputDirectory: Path,
+    fetchOperatorRoutes: Callable[[], OperatorRoutes] = loadApiResults,
+    **overrides: object,
+) -> TransitNetwork:
+    # Warsaw network which reads operator pages from fixtures instead of the web
+    def scrapeRecordedPage(
+        link: str,
+        httpClient: Client,
+        context: RunContext,
+    ) -> OperatorRouteResult | None:
+        parsedLink = WTPLink.parseWTPRouteLink(link)
+        htmlContent = None if parsedLink is None else pages.get(parsedLink.url())
+        if htmlContent is None:
+            return None
+        return addWTPResultToContext(
+            cachedParseWebsite(
+                htmlContent=htmlContent,
+                inputUrl=parsedLink.url(),
+                httpClient=httpClient,
+            ),
+            context,
+        )
+
+    return dataclasses.replace(
+        warsawNetwork,
+        scrapeOperatorRoute=scrapeRecordedPage,
+        scrapeOperatorHomepage=lambda context: None,  # noqa: ARG005
+        fetchOperatorRoutes=fetchOperatorRoutes,
+        outputDirectory=outputDirectory,
+        **overrides,
+    )
+
+
+def recordFixtures(routeRefs: list[RouteRef], apiKey: str | None) -> None:
+    # replaces fixtures with current data of the given routes, the only part which needs network
+    network = warsawNetwork
+    relationIds = sorted(
+        {
+            relationId
+            for routeRef in routeRefs
+            for relationId in downloadRouteRelationIds(routeRef, network)
+        },
+    )
+    overpassJson = downloadOverpassJson(relationsWithMembersQuery(relationIds))
+    OVERPASS_FIXTURE.write_text(overpassJson)
+    overpassResult = parseOverpassJson(overpassJson)
+
+    for path in WTP_PAGES_DIRECTORY.glob("*.html"):
+        path.unlink()
+    with httpxClient(currentRun()) as httpClient:
+        for relationId in relationIds:
+            link = WTPLink.parseWTPRouteLink(
+                overpassResult.relations[relationId].tags.get("url", ""),
+            )
+            if link is None:
+                continue
+            (WTP_PAGES_DIRECTORY / wtpPageName(link)).write_text(
+                fetchWebsite(link.url(), httpClient=httpClient),
+            )
+
+    if apiKey is None:
+        logging.warning("⚠️ Missing API_KEY, API UM Warszawa fixture isn't recorded")
+    else:
+        apiJson = json.loads(downloadApiRoutesJson(apiKey))
+        apiJson["result"] = {
+            routeRef: variants
+            for routeRef, variants in apiJson["result"].items()
+            if routeRef in routeRefs
+        }
+        API_UM_FIXTURE.write_text(json.dumps(apiJson, ensure_ascii=False, indent=1))
+
+    # stop groups used by recorded routes, with all their stops
+    stopGroups = {
+        str(element.tags.get("ref", ""))[:4]
+        for element in overpassResult.nodes.values()
+        if "public_transport" in element.tags
+    }
+    with GTFS_STOPS_FIXTURE.open("w", newline="") as stopsFile:
+        writer = csv.writer(stopsFile)
+        writer.writerow(GTFS_STOPS_COLUMNS)
+        writer.writerows(
+            row
+            for row in readGTFSColumns(
+                network.gtfsFeed.zipPath,
+                "stops.txt",
+                GTFS_STOPS_COLUMNS,
+            )
+            if row[0][:4] in stopGroups
+        )
+    logging.info(f"📼 Recorded fixtures of {len(relationIds)} relations")
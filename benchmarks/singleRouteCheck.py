@@ -0,0 +1,26 @@
+import dataclasses
+import sys
+from pathlib import Path
+
+from benchmarks.fixtures import fixtureGTFSFeed, fixtureTransport
+from main import checkSubset
+from warsaw.network import warsawNetwork
+
+# started as a fresh process by the startup benchmark, imports are part of the measurement
+SINGLE_ROUTE_REF = "520"
+
+
+def checkFixtureRoute(gtfsZipPath: Path, fragmentPath: Path) -> None:
+    network = dataclasses.replace(warsawNetwork, gtfsFeed=fixtureGTFSFeed(gtfsZipPath))
+    checkSubset(
+        network,
+        [SINGLE_ROUTE_REF],
+        [],
+        fragmentPath,
+        transport=fixtureTransport(),
+        offline=True,
+    )
+
+
+if __name__ == "__main__":
+    checkFixtureRoute(Path(sys.argv[1]), Path(sys.argv[2]))
@@ -0,0 +1,721 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import math
+import random
+import resource
+import subprocess
+import sys
+import time
+import zipfile
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+from itertools import pairwise
+from pathlib import Path
+from typing import Any, TextIO
+
+from benchmarks.fixtures import WTPPageDirectory, fixtureNetwork, wtpPageName
+from gtfs.gtfsFeed import GTFSFeed
+from main import processData
+from network.transitNetwork import TransitNetwork
+from osm.overpass import parseOverpassJson
+from pipeline.metrics import RSS_UNIT_BYTES
+from pipeline.staticOutput import OutputOptions
+from warsaw.fetchApiRoutes import parseApiRoutesJson
+from warsaw.wtpScraper import WTPLink
+
+SYNTHETIC_DIRECTORY = Path("synthetic")
+SYNTHETIC_ROOT_RELATION_ID = 1
+# scale 1 is roughly the size of today's Warsaw network
+WARSAW_LINES = 300
+TRAM_LINES_SHARE = 0.08
+STOPS_PER_ROUTE = 24
+STOP_GROUPS_PER_LINE = 7
+# Warsaw stop refs are a 4 digit group and a 2 digit stop,
+# larger networks get more stops per group instead of more groups
+MAX_STOP_GROUPS = 9000
+# stops 8x are mapped to 0x by mapWtpStop
+STOP_NUMBERS = [f"{number:02d}" for number in range(1, 100) if number // 10 != 8]
+TRAM_STOP_PAIRS = 2
+WAY_INTERMEDIATE_NODES = 3
+GROUP_SPACING_LAT = 0.004
+GROUP_SPACING_LON = 0.0065
+ERROR_KINDS = [
+    "osmWrongStopRef",
+    "osmMissingStop",
+    "osmRouteGap",
+    "osmMissingUrl",
+    "operatorDetour",
+    "operatorUnavailable",
+    "gtfsFarAwayStop",
+]
+STREET_NAMES = [
+    "Lipowa",
+    "Brzozowa",
+    "Klonowa",
+    "Polna",
+    "Leśna",
+    "Słoneczna",
+    "Krótka",
+    "Szkolna",
+    "Ogrodowa",
+    "Łąkowa",
+    "Kwiatowa",
+    "Różana",
+    "Parkowa",
+    "Kościelna",
+    "Młyńska",
+    "Dworcowa",
+    "Żwirki",
+    "Wiśniowa",
+    "Jaśminowa",
+    "Akacjowa",
+]
+# operator pages link to other lines, the list is capped to keep page size constant
+PAGE_LINE_LINKS = 250
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    # multiple of a Warsaw sized network
+    scale: float = 1.0
+    # share of route variants with one seeded problem
+    errorRate: float = 0.1
+    seed: int = 0
+
+    def lineCount(self) -> int:
+        return max(1, round(WARSAW_LINES * self.scale))
+
+    def directoryName(self) -> str:
+        return f"scale-{self.scale:g}-errors-{self.errorRate:g}-seed-{self.seed}"
+
+
+@dataclass(frozen=True)
+class StopPlace:
+    ref: str
+    name: str
+    lat: float
+    lon: float
+
+
+def lineModeAndRef(spec: SyntheticSpec, lineIndex: int) -> tuple[str, str]:
+    if lineIndex < round(spec.lineCount() * TRAM_LINES_SHARE):
+        return "tram", str(lineIndex + 1)
+    return "bus", str(100 + lineIndex)
+
+
+def groupName(groupIndex: int) -> str:
+    name = STREET_NAMES[groupIndex % len(STREET_NAMES)]
+    number = groupIndex // len(STREET_NAMES)
+    return name if number == 0 else f"{name} {number}"
+
+
+class SyntheticWriter:
+    """
+    Writes a network as Overpass JSON, operator pages, API UM JSON and a GTFS feed.
+
+    Elements are written as soon as they are created,
+    only stops and ids of shared ways are kept in memory.
+    """
+
+    def __init__(
+        self, spec: SyntheticSpec, directory: Path, overpassFile: TextIO
+    ) -> None:
+        self.spec = spec
+        self.directory = directory
+        self.overpassFile = overpassFile
+        self.random = random.Random(spec.seed)  # noqa: S311
+        lines = spec.lineCount()
+        self.groupCount = min(MAX_STOP_GROUPS, lines * STOP_GROUPS_PER_LINE)
+        self.gridSize = math.ceil(math.sqrt(self.groupCount))
+        # stop numbers are used in direction pairs, 01/02, 03/04, ...,
+        # the last ones are tram stops which buses don't share
+        self.busStopPairs = min(
+            len(STOP_NUMBERS) // 2 - TRAM_STOP_PAIRS,
+            math.ceil(lines * STOP_GROUPS_PER_LINE / self.groupCount),
+        )
+        self.nextId = 0
+        self.elementCount = 0
+        # (group, stop number) => OSM stop position and platform
+        self.stopNodes: dict[tuple[int, str], tuple[int, int]] = {}
+        self.stops: dict[str, StopPlace] = {}
+        self.ways: dict[tuple[int, int], int] = {}
+        self.nodeLocations: dict[int, tuple[float, float]] = {}
+        self.farAwayStopRefs: set[str] = set()
+        self.seededErrors: Counter[str] = Counter()
+        self.pageLineLinks = "\n".join(
+            '<li><a href="https://www.wtp.waw.pl/rozklady-jazdy/?wtp_md=3'
+            f'&amp;wtp_ln={line}">{line}</a></li>'
+            for _, line in (
+                lineModeAndRef(spec, lineIndex)
+                for lineIndex in range(min(lines, PAGE_LINE_LINKS))
+            )
+        )
+
+    def newId(self) -> int:
+        self.nextId += 1
+        return self.nextId
+
+    def writeElement(self, element: dict) -> None:
+        if self.elementCount > 0:
+            self.overpassFile.write(",\n")
+        self.overpassFile.write(json.dumps(element, ensure_ascii=False))
+        self.elementCount += 1
+
+    def writeNode(self, lat: float, lon: float, tags: dict | None = None) -> int:
+        nodeId = self.newId()
+        node: dict[str, Any] = {
+            "type": "node",
+            "id": nodeId,
+            "lat": round(lat, 7),
+            "lon": round(lon, 7),
+        }
+        if tags is not None:
+            node["tags"] = tags
+        self.writeElement(node)
+        return nodeId
+
+    def groupLocation(self, groupIndex: int) -> tuple[float, float]:
+        row, column = divmod(groupIndex, self.gridSize)
+        return 52.1 + row * GROUP_SPACING_LAT, 20.85 + column * GROUP_SPACING_LON
+
+    def stop(self, groupIndex: int, number: str, mode: str) -> StopPlace:
+        ref = f"{1000 + groupIndex}{number}"
+        if (groupIndex, number) not in self.stopNodes:
+            lat, lon = self.groupLocation(groupIndex)
+            numberIndex = STOP_NUMBERS.index(number)
+            # odd and even stops on both sides of the street, pairs on parallel streets
+            side = 1 if numberIndex % 2 == 0 else -1
+            lat += side * 0.00008
+            lon += numberIndex // 2 * 0.0003
+            name = f"{groupName(groupIndex)} {number}"
+            stopTags = {"public_transport": "stop_position", "name": name, "ref": ref}
+            platformTags = {"public_transport": "platform", "name": name, "ref": ref}
+            if mode == "tram":
+                stopTags |= {"railway": "tram_stop", "tram": "yes"}
+                platformTags |= {"railway": "platform"}
+            else:
+                stopTags |= {"bus": "yes"}
+                platformTags |= {"highway": "bus_stop", "bus": "yes"}
+            stopId = self.writeNode(lat, lon, stopTags)
+            platformId = self.writeNode(lat + side * 0.0001, lon, platformTags)
+            self.nodeLocations[stopId] = (lat, lon)
+            self.stopNodes[(groupIndex, number)] = (stopId, platformId)
+            self.stops[ref] = StopPlace(ref=ref, name=name, lat=lat, lon=lon)
+        return self.stops[ref]
+
+    def way(self, fromNode: int, toNode: int, mode: str) -> int:
+        if (fromNode, toNode) not in self.ways:
+            (fromLat, fromLon) = self.nodeLocations[fromNode]
+            (toLat, toLon) = self.nodeLocations[toNode]
+            steps = WAY_INTERMEDIATE_NODES + 1
+            intermediateNodes = [
+                self.writeNode(
+                    fromLat + (toLat - fromLat) * step / steps,
+                    fromLon + (toLon - fromLon) * step / steps,
+                )
+                for step in range(1, steps)
+            ]
+            wayId = self.newId()
+            tags = (
+                {"railway": "tram", "gauge": "1435"}
+                if mode == "tram"
+                else {"highway": "primary", "lanes": "2"}
+            )
+            self.writeElement(
+                {
+                    "type": "way",
+                    "id": wayId,
+                    "nodes": [fromNode, *intermediateNodes, toNode],
+                    "tags": tags,
+                },
+            )
+            self.ways[(fromNode, toNode)] = wayId
+        return self.ways[(fromNode, toNode)]
+
+    def randomWalk(self) -> list[int]:
+        # routes follow neighbouring groups, so lines share stops like in a city
+        row, column = divmod(self.random.randrange(self.groupCount), self.gridSize)
+        direction = (0, 1)
+        groups = [row * self.gridSize + column]
+        while len(groups) < STOPS_PER_ROUTE:
+            if self.random.random() < 0.3:
+                direction = self.random.choice(
+                    [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1)],
+                )
+            candidates = [
+                (row + rowStep, column + columnStep)
+                for rowStep, columnStep in [direction, (1, 0), (0, 1), (-1, 0), (0, -1)]
+            ]
+            for nextRow, nextColumn in candidates:
+                groupIndex = nextRow * self.gridSize + nextColumn
+                if (
+                    0 <= nextRow < self.gridSize
+                    and 0 <= nextColumn < self.gridSize
+                    and groupIndex < self.groupCount
+                    and groupIndex not in groups
+                ):
+                    row, column = nextRow, nextColumn
+                    groups.append(groupIndex)
+                    break
+            else:
+                break
+        return groups
+
+    def writeLine(
+        self,
+        lineIndex: int,
+        line: str,
+        mode: str,
+    ) -> tuple[list[int], dict[str, dict], list[tuple[str, list[StopPlace]]]]:
+        groups = self.randomWalk()
+        pair = (
+            len(STOP_NUMBERS) // 2 - 1 - lineIndex % TRAM_STOP_PAIRS
+            if mode == "tram"
+            else lineIndex % self.busStopPairs
+        )
+        relationIds = []
+        apiVariants = {}
+        gtfsVariants = []
+        for direction in ["A", "B"]:
+            number = STOP_NUMBERS[pair * 2 + (0 if direction == "A" else 1)]
+            ordered = groups if direction == "A" else list(reversed(groups))
+            stops = [self.stop(groupIndex, number, mode) for groupIndex in ordered]
+            error = (
+                self.random.choice(ERROR_KINDS)
+                if self.random.random() < self.spec.errorRate
+                else None
+            )
+            if error is not None:
+                self.seededErrors[error] += 1
+            errorIndex = self.random.randrange(1, len(stops) - 1)
+            relationIds.append(
+                self.writeRouteRelation(
+                    line, direction, mode, ordered, number, error, errorIndex
+                ),
+            )
+            self.writeOperatorPage(line, direction, stops, error, errorIndex)
+            apiVariants[f"TP-{direction}"] = {
+                str(index + 1): {
+                    "odleglosc": index * 450,
+                    "ulica_id": str(1000 + index),
+                    "nr_zespolu": stop.ref[:4],
+                    "typ": "1" if index in (0, len(stops) - 1) else "3",
+                    "nr_przystanku": stop.ref[4:],
+                }
+                for index, stop in enumerate(stops)
+            }
+            gtfsVariants.append((f"{line}-{direction}", stops))
+            if error == "gtfsFarAwayStop":
+                self.farAwayStopRefs.add(stops[errorIndex].ref)
+        return relationIds, apiVariants, gtfsVariants
+
+    def writeRouteRelation(
+        self,
+        line: str,
+        direction: str,
+        mode: str,
+        groups: list[int],
+        number: str,
+        error: str | None,
+        errorIndex: int,
+    ) -> int:
+        nodes = [self.stopNodes[(groupIndex, number)] for groupIndex in groups]
+        if error == "osmWrongStopRef":
+            # a separate stop with a mistyped ref, shared stops stay correct
+            stop = self.stops[f"{1000 + groups[errorIndex]}{number}"]
+            tags = {
+                "public_transport": "stop_position",
+                "name": stop.name,
+                "ref": "999999",
+            }
+            stopId = self.writeNode(stop.lat, stop.lon, tags)
+            self.nodeLocations[stopId] = (stop.lat, stop.lon)
+            nodes[errorIndex] = (stopId, nodes[errorIndex][1])
+        wayIds = [
+            self.way(fromNode, toNode, mode)
+            for (fromNode, _), (toNode, _) in pairwise(nodes)
+        ]
+        if error == "osmMissingStop":
+            del nodes[errorIndex]
+        if error == "osmRouteGap":
+            del wayIds[errorIndex]
+        members = []
+        for stopId, platformId in nodes:
+            members.append({"type": "node", "ref": stopId, "role": "stop"})
+            members.append({"type": "node", "ref": platformId, "role": "platform"})
+        members.extend({"type": "way", "ref": wayId, "role": ""} for wayId in wayIds)
+        fromName = groupName(groups[0])
+        toName = groupName(groups[-1])
+        vehicle = "Tramwaj" if mode == "tram" else "Autobus"
+        tags = {
+            "type": "route",
+            "route": mode,
+            "ref": line,
+            "name": f"{vehicle} {line}: {fromName} => {toName}",
+            "from": fromName,
+            "to": toName,
+            "network": "ZTM Warszawa",
+            "public_transport:version": "2",
+        }
+        if error != "osmMissingUrl":
+            tags["url"] = WTPLink(line, direction, "0").url()
+        relationId = self.newId()
+        self.writeElement(
+            {"type": "relation", "id": relationId, "members": members, "tags": tags},
+        )
+        return relationId
+
+    def writeOperatorPage(
+        self,
+        line: str,
+        direction: str,
+        stops: list[StopPlace],
+        error: str | None,
+        errorIndex: int,
+    ) -> None:
+        if error == "operatorUnavailable":
+            route = (
+                '<div class="timetable-message">Wybrany wariant trasy jest niedostępny '
+                "dla określonego kierunku linii</div>"
+            )
+        else:
+            detour = set()
+            if error == "operatorDetour":
+                stops = stops[:errorIndex] + stops[errorIndex + 1 :]
+                detour = {errorIndex - 1, errorIndex}
+            points = []
+            for index, stop in enumerate(stops[:-1]):
+                link = (
+                    "https://www.wtp.waw.pl/rozklady-jazdy/?wtp_md=5"
+                    f"&amp;wtp_ln={line}&amp;wtp_st={stop.ref[:4]}"
+                    f"&amp;wtp_pt={stop.ref[4:]}&amp;wtp_dr={direction}"
+                    "&amp;wtp_vr=0&amp;wtp_lm=1"
+                )
+                classes = "timetable-route-point name active"
+                icon = ""
+                if index in detour:
+                    classes += " detour"
+                    icon = '<span class="detour" title="Objazd"></span>'
+                points.append(
+                    f'<div class="{classes}">{icon}'
+                    f'<a class="timetable-link active" href="{link}">{stop.name}</a>'
+                    '<span class="timetable-route-point-zone">1</span></div>',
+                )
+            points.append(
+                '<div class="timetable-route-point name active follow disabled">'
+                f"{stops[-1].name}</div>",
+            )
+            variants = "\n".join(
+                f'<li><a class="timetable-variant" href="'
+                f"{WTPLink(line, variantDirection, '0').url().replace('&', '&amp;')}"
+                f'">{variantDirection}</a></li>'
+                for variantDirection in ["A", "B"]
+            )
+            pointsHtml = "\n".join(points)
+            route = (
+                f'<ul class="timetable-variants">\n{variants}\n</ul>\n'
+                f'<div class="timetable-route-points">\n{pointsHtml}\n</div>'
+            )
+        (
+            self.directory / "wtp" / wtpPageName(WTPLink(line, direction, "0"))
+        ).write_text(
+            f"""<!DOCTYPE html>
+<html lang="pl-PL">
+<head><meta charset="UTF-8"><title>Linia {line}</title></head>
+<body class="page-template page-template-timetable">
+<main class="timetable">
+<section class="timetable-lines"><ul class="timetable-lines-list">
+{self.pageLineLinks}
+</ul></section>
+<section class="timetable-route">
+<h1 class="timetable-title">Linia {line}</h1>
+{route}
+</section>
+</main>
+</body>
+</html>
+""",
+        )
+
+
+def _writeCsv(
+    zipFile: zipfile.ZipFile,
+    fileName: str,
+    header: list[str],
+    rows: Iterable[list],
+) -> None:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(header)
+    writer.writerows(rows)
+    zipFile.writestr(fileName, output.getvalue())
+
+
+def generateSyntheticNetwork(spec: SyntheticSpec, directory: Path) -> dict:
+    (directory / "wtp").mkdir(parents=True, exist_ok=True)
+    for path in (directory / "wtp").glob("*.html"):
+        path.unlink()
+    lines = spec.lineCount()
+    apiResult: dict[str, dict] = {}
+    gtfsVariants: list[tuple[str, list[StopPlace]]] = []
+    with (directory / "overpass.json").open("w") as overpassFile:
+        overpassFile.write('{"version": 0.6, "elements": [\n')
+        writer = SyntheticWriter(spec, directory, overpassFile)
+        masterIds = []
+        for lineIndex in range(lines):
+            mode, line = lineModeAndRef(spec, lineIndex)
+            relationIds, apiResult[line], lineGTFSVariants = writer.writeLine(
+                lineIndex,
+                line,
+                mode,
+            )
+            gtfsVariants.extend(lineGTFSVariants)
+            masterId = writer.newId()
+            masterIds.append(masterId)
+            writer.writeElement(
+                {
+                    "type": "relation",
+                    "id": masterId,
+                    "members": [
+                        {"type": "relation", "ref": relationId, "role": ""}
+                        for relationId in relationIds
+                    ],
+                    "tags": {"type": "route_master", "route_master": mode, "ref": line},
+                },
+            )
+        writer.writeElement(
+            {
+                "type": "relation",
+                "id": SYNTHETIC_ROOT_RELATION_ID,
+                "members": [
+                    {"type": "relation", "ref": masterId, "role": ""}
+                    for masterId in masterIds
+                ],
+                "tags": {"type": "network", "name": "ZTM Warszawa"},
+            },
+        )
+        overpassFile.write("\n]}\n")
+    (directory / "api-um.json").write_text(
+        json.dumps({"result": apiResult}, ensure_ascii=False),
+    )
+    with zipfile.ZipFile(directory / "gtfs.zip", "w", zipfile.ZIP_DEFLATED) as zipFile:
+        _writeCsv(
+            zipFile,
+            "stops.txt",
+            ["stop_id", "stop_name", "stop_lat", "stop_lon"],
+            (
+                [
+                    stop.ref,
+                    stop.name,
+                    # far away from OSM, where the stop isn't moved
+                    f"{stop.lat + (0.003 if stop.ref in writer.farAwayStopRefs else 0):.6f}",
+                    f"{stop.lon:.6f}",
+                ]
+                for stop in writer.stops.values()
+            ),
+        )
+        _writeCsv(
+            zipFile,
+            "routes.txt",
+            ["route_id", "route_short_name"],
+            ([line, line] for line in apiResult),
+        )
+        _writeCsv(
+            zipFile,
+            "trips.txt",
+            ["route_id", "trip_id", "shape_id"],
+            ([tripId.rsplit("-", 1)[0], tripId, tripId] for tripId, _ in gtfsVariants),
+        )
+        _writeCsv(
+            zipFile,
+            "stop_times.txt",
+            ["trip_id", "stop_sequence", "stop_id"],
+            (
+                [tripId, sequence, stop.ref]
+                for tripId, stops in gtfsVariants
+                for sequence, stop in enumerate(stops, start=1)
+            ),
+        )
+        _writeCsv(
+            zipFile,
+            "shapes.txt",
+            ["shape_id", "shape_pt_sequence", "shape_pt_lat", "shape_pt_lon"],
+            (
+                [tripId, sequence, f"{stop.lat:.6f}", f"{stop.lon:.6f}"]
+                for tripId, stops in gtfsVariants
+                for sequence, stop in enumerate(stops, start=1)
+            ),
+        )
+    manifest = {
+        "spec": asdict(spec),
+        "lines": lines,
+        "routes": len(gtfsVariants),
+        "stopGroups": writer.groupCount,
+        "stops": len(writer.stops),
+        "ways": len(writer.ways),
+        "elements": writer.elementCount,
+        "seededErrors": dict(sorted(writer.seededErrors.items())),
+    }
+    (directory / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    logging.info(
+        f"🧪 Generated {lines} lines, {len(gtfsVariants)} routes in {directory}"
+    )
+    return manifest
+
+
+def ensureSyntheticNetwork(spec: SyntheticSpec, directory: Path) -> dict:
+    manifestPath = directory / "manifest.json"
+    if manifestPath.exists():
+        manifest = json.loads(manifestPath.read_text())
+        if manifest["spec"] == asdict(spec):
+            return manifest
+    return generateSyntheticNetwork(spec, directory)
+
+
+def syntheticNetwork(directory: Path) -> TransitNetwork:
+    return fixtureNetwork(
+        WTPPageDirectory(directory / "wtp"),
+        directory / "osm-wtp",
+        name="synthetic",
+        rootRelationId=SYNTHETIC_ROOT_RELATION_ID,
+        gtfsFeed=GTFSFeed(
+            name=f"synthetic-{directory.name}",
+            zipPath=directory / "gtfs.zip",
+            stopRefLength=6,
+        ),
+        fetchOperatorRoutes=lambda: parseApiRoutesJson(
+            (directory / "api-um.json").read_text(),
+        ),
+    )
+
+
+def peakRssBytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT_BYTES
+
+
+def runSyntheticPipeline(directory: Path) -> dict:
+    # the whole pipeline offline, Overpass and operator pages are read from files
+    network = syntheticNetwork(directory)
+    startRss = peakRssBytes()
+    start = time.perf_counter()
+    results = processData(
+        [network],
+        outputOptions=OutputOptions(
+            historyDatabasePath=directory / "history.sqlite",
+            cacheDirectory=directory / "cache",
+            metricsDirectory=directory / "metrics",
+        ),
+        downloadRelations=lambda _relationIds: parseOverpassJson(
+            (directory / "overpass.json").read_text(),
+        ),
+    )
+    seconds = time.perf_counter() - start
+    summary = results["metricsSummary"]
+    return {
+        "seconds": round(seconds, 3),
+        "relationsAnalyzed": summary["relationsAnalyzed"].get(network.name, 0),
+        "wtpPagesParsed": summary["wtpPagesParsed"],
+        "startRssBytes": startRss,
+        "peakRssBytes": summary["peakRssBytes"],
+        "stageDurationSeconds": summary["stageDurationSeconds"],
+    }
+
+
+def measureScale(spec: SyntheticSpec, directory: Path) -> dict:
+    manifest = ensureSyntheticNetwork(spec, directory / spec.directoryName())
+    # a fresh process for every scale, peak RSS can't be reset
+    output = subprocess.run(  # noqa: S603
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.syntheticNetwork",
+            "--run",
+            str(directory / spec.directoryName()),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    measurement = json.loads(output.splitlines()[-1])
+    return {
+        "scale": spec.scale,
+        "lines": manifest["lines"],
+        "routes": manifest["routes"],
+        "stops": manifest["stops"],
+        "seededErrors": sum(manifest["seededErrors"].values()),
+        **measurement,
+        "routesPerSecond": round(manifest["routes"] / measurement["seconds"], 1),
+        "peakRssBytesPerRoute": round(
+            (measurement["peakRssBytes"] - measurement["startRssBytes"])
+            / manifest["routes"],
+        ),
+    }
+
+
+def formatScaling(measurements: list[dict], topStages: int = 3) -> str:
+    header = (
+        f"{'scale':>6} {'routes':>7} {'seconds':>9} {'routes/s':>9} "
+        f"{'peak MB':>8} {'KB/route':>9}  slowest stages"
+    )
+    lines = [header]
+    for measurement in measurements:
+        stages = sorted(
+            measurement["stageDurationSeconds"].items(),
+            key=lambda item: item[1],
+            reverse=True,
+        )[:topStages]
+        lines.append(
+            f"{measurement['scale']:>6g} {measurement['routes']:>7} "
+            f"{measurement['seconds']:>9.2f} {measurement['routesPerSecond']:>9.1f} "
+            f"{measurement['peakRssBytes'] / 2**20:>8.0f} "
+            f"{measurement['peakRssBytesPerRoute'] / 1024:>9.1f}  "
+            + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stages),
+        )
+    return "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Synthetic networks: throughput and memory of the pipeline by size",
+    )
+    parser.add_argument(
+        "--scales",
+        type=float,
+        nargs="+",
+        default=[0.1, 1, 10],
+        help="network sizes as multiples of Warsaw",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.1,
+        help="share of route variants with a seeded problem",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--directory", type=Path, default=SYNTHETIC_DIRECTORY)
+    # internal, measures one generated network in a fresh process
+    parser.add_argument("--run", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run is not None:
+        logging.disable(logging.WARNING)
+        sys.stdout.write(json.dumps(runSyntheticPipeline(args.run)) + "\n")
+        return
+    logging.basicConfig(level=logging.INFO)
+    measurements = [
+        measureScale(
+            SyntheticSpec(scale=scale, errorRate=args.error_rate, seed=args.seed),
+            args.directory,
+        )
+        for scale in args.scales
+    ]
+    args.directory.mkdir(parents=True, exist_ok=True)
+    (args.directory / "scaling.json").write_text(json.dumps(measurements, indent=2))
+    sys.stdout.write(formatScaling(measurements))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.benchmarkSuite import (
+    REPOSITORY_DIRECTORY,
+    BenchmarkResult,
+    benchmarks,
+    compareWithBaseline,
+    loadBaseline,
+    runBenchmarks,
+    writeBaseline,
+)
+from benchmarks.fixtures import FIXTURE_ROUTE_REFS, loadWTPPages
+from warsaw.wtpScraper import cachedParseWebsite
+
+
+def testFixturesCoverRecordedRoutes(tmp_path: Path) -> None:
+    pages = loadWTPPages()
+    parsed = [
+        cachedParseWebsite(htmlContent=html, inputUrl=url, httpClient=None).wtpResult
+        for url, html in pages.items()
+    ]
+    assert any(result.unavailable for result in parsed)
+    assert all(len(result.stops) > 1 for result in parsed if not result.unavailable)
+
+    analyze = next(
+        benchmark
+        for benchmark in benchmarks(tmp_path)
+        if benchmark.name == "analyzeOSMRelations"
+    )
+    assert sorted(analyze.run(analyze.setup())) == sorted(FIXTURE_ROUTE_REFS)
+
+
+def testBenchmarksRunOffline(tmp_path: Path) -> None:
+    results = runBenchmarks(tmp_path, minRepeats=1, minSeconds=0)
+    assert results[0].name == "calibration"
+    assert results[0].relative == 1
+    assert all(result.seconds > 0 for result in results)
+
+    writeBaseline(results, tmp_path / "baseline.json")
+    baseline = loadBaseline(tmp_path / "baseline.json")
+    assert baseline is not None
+    assert baseline.keys() == {result.name for result in results}
+
+
+def testMainLoadsHeavyDependenciesLazily() -> None:
+    # a fresh interpreter, modules imported by other tests don't count
+    script = (
+        "import sys, main, warsaw.wtpScraper as wtp; "
+        "print(*sorted({'bs4', 'diskcache', 'jinja2', 'tqdm', 'http.server'} & sys.modules.keys()), "
+        "wtp.wtpCache.cache_info().currsize)"
+    )
+    output = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", script],
+        cwd=REPOSITORY_DIRECTORY,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert output.split() == ["0"]
+
+
+def testRegressionsBeyondTolerance() -> None:
+    results = [
+        BenchmarkResult("calibration", 0.01, 1.0),
+        BenchmarkResult("faster", 0.001, 0.1),
+        BenchmarkResult("slightlySlower", 0.0011, 0.11),
+        BenchmarkResult("slower", 0.002, 0.2),
+        BenchmarkResult("new", 0.002, 0.2),
+    ]
+    baseline = {"calibration": 1.0, "faster": 0.2, "slightlySlower": 0.1, "slower": 0.1}
+    comparisons = compareWithBaseline(results, baseline, tolerance=0.25)
+    assert [(comparison.name, comparison.regression) for comparison in comparisons] == [
+        ("faster", False),
+        ("slightlySlower", False),
+        ("slower", True),
+        ("new", False),
+    ]
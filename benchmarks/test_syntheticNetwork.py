@@ -0,0 +1,52 @@
+import json
+from pathlib import Path
+
+from benchmarks.syntheticNetwork import (
+    SyntheticSpec,
+    formatScaling,
+    generateSyntheticNetwork,
+    runSyntheticPipeline,
+)
+
+
+def testGeneratorIsDeterministic(tmp_path: Path) -> None:
+    spec = SyntheticSpec(scale=0.02, errorRate=0.5, seed=7)
+    manifest = generateSyntheticNetwork(spec, tmp_path / "first")
+    generateSyntheticNetwork(spec, tmp_path / "second")
+    assert manifest["lines"] == 6
+    assert manifest["routes"] == 12
+    assert sum(manifest["seededErrors"].values()) > 0
+    for fileName in ["overpass.json", "api-um.json", "wtp/100-A-0.html"]:
+        assert (tmp_path / "first" / fileName).read_text() == (
+            tmp_path / "second" / fileName
+        ).read_text()
+
+
+def testPipelineRunsOfflineWithoutFalseProblems(tmp_path: Path) -> None:
+    manifest = generateSyntheticNetwork(
+        SyntheticSpec(scale=0.02, errorRate=0),
+        tmp_path,
+    )
+    measurement = runSyntheticPipeline(tmp_path)
+    assert measurement["relationsAnalyzed"] == manifest["routes"]
+    assert measurement["wtpPagesParsed"] == manifest["routes"]
+    assert measurement["peakRssBytes"] > 0
+    assert (tmp_path / "history.sqlite").exists()
+
+    results = json.loads((tmp_path / "osm-wtp" / "results.json").read_text())
+    assert not any(route["error"] for route in results["routes"].values())
+    assert results["notLinkedOperatorUrls"] == []
+    assert results["stops"]["farAwayStops"] == []
+
+    table = formatScaling(
+        [
+            {
+                "scale": 0.02,
+                "routes": manifest["routes"],
+                **measurement,
+                "routesPerSecond": 1.0,
+                "peakRssBytesPerRoute": 1024,
+            },
+        ],
+    )
+    assert "synthetic." in table.splitlines()[1]
@@ -4,7 +4,7 @@ from itertools import zip_longest
 
 from configuration import MISSING_REF
 from model.types import RouteRef, StopName, StopRef
-from osm.OSMRelationAnalyzer import OSMResults, VariantResult, osmRefToName
+from osm.OSMRelationAnalyzer import OSMResults, VariantResult
 
 
 @dataclass(frozen=True)
@@ -40,7 +40,10 @@ class CompareResult:
     operatorRefToName: dict[StopRef, set[StopName]]
 
 
-def compareStops(osmResults: OSMResults) -> CompareResult:
+def compareStops(
+    osmResults: OSMResults,
+    osmRefToName: dict[StopRef, set[StopName]],
+) -> CompareResult:
     renderResults: dict[RouteRef, RouteResult] = {}
     refs = sorted(osmResults.keys(), key=lambda x: (len(x), x))
     operatorRefToName: dict[StopRef, set[StopName]] = {}
@@ -58,10 +61,13 @@ def compareStops(osmResults: OSMResults) -> CompareResult:
                 operatorRefToName[stop.ref].add(stop.name)
             otherErrors = variant.otherErrors
             if len(variant.unknownRoles) > 0:
-                otherErrors.add(f"Nieznane role: {variant.unknownRoles}")
+                otherErrors.add(
+                    f"Nieznane role: {', '.join(sorted(variant.unknownRoles))}",
+                )
             diffRows = buildDiffRows(
                 osmRefs,
                 operatorRefs,
+                osmRefToName,
                 operatorRefToName,
                 variant.stopsDetour,
                 variant.stopsNew,
@@ -94,6 +100,7 @@ def compareStops(osmResults: OSMResults) -> CompareResult:
 def buildDiffRows(
     osmRefs: list[StopRef],
     operatorRefs: list[StopRef],
+    osmRefToName: dict[StopRef, set[StopName]],
     operatorRefToName: dict[StopRef, set[StopName]],
     stopsDetour: list[bool],
     stopsNew: list[bool],
@@ -4,9 +4,40 @@ import httpx
 
 MISSING_REF = "-"
 cacheDirectory = Path("cache")
+# unlike the cache, data is kept between runs and isn't safe to remove,
+# in Docker it's a volume like the cache
+dataDirectory = Path("data")
+historyDatabasePath = Path(dataDirectory, "history.sqlite")
 outputDirectory = Path("osm-wtp")
+# metrics of the last run, read by node_exporter, not published with the output
+metricsDirectory = Path(cacheDirectory, "metrics")
+profileDirectory = Path("profile")
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"  # "http://localhost:12345/api/interpreter"
+# Overpass operators ask clients to identify themselves
+OVERPASS_USER_AGENT = "osm-wtp (+https://starsep.com/osm-wtp/)"
 EXPIRE_WTP_SECONDS = 60 * 60 * 12
+# expired WTP pages are kept this long as a fallback when wtp.waw.pl fails
+WTP_STALE_SECONDS = 60 * 60 * 24 * 7
+# least recently used WTP pages are evicted above this size
+WTP_CACHE_SIZE_LIMIT = 64 * 1024 * 1024
+# decoded WTP pages kept in memory, about 30 kB each
+WTP_MEMORY_CACHE_ENTRIES = 2048
 ENABLE_TRAIN = True
 
 httpxTimeout = httpx.Timeout(connect=10.0, read=60.0, write=60.0, pool=60.0)
+# seconds per stage, afterwards its requests fail fast and last known good data is used
+STAGE_DEADLINE_SECONDS = {
+    "overpassResult": 60 * 10,
+    "homepage": 60 * 2,
+    "apiResults": 60 * 2,
+    "scrapedOSMRoutes": 60 * 20,
+}
+# consecutive failures of a host which open its circuit, requests to it then fail
+# fast until a trial request is let through after CIRCUIT_BREAKER_RESET_SECONDS
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_RESET_SECONDS = 60 * 5
+ROUTE_SHAPE_TOLERANCE = 100.0  # metres between OSM route and GTFS shape
+STOP_ROUTE_DISTANCE_THRESHOLD = 30.0  # metres between stop/platform and route ways
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_REFRESH_SECONDS = 60 * 60
@@ -0,0 +1,131 @@
+from collections.abc import Callable
+from math import ceil, floor, hypot
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+Cell = tuple[int, int]
+
+
+class PointGridIndex(Generic[T]):
+    def __init__(self, cellSize: float) -> None:
+        self.cellSize = cellSize
+        self.cells: dict[Cell, list[tuple[float, float, T]]] = {}
+
+    def cell(self, x: float, y: float) -> Cell:
+        return floor(x / self.cellSize), floor(y / self.cellSize)
+
+    def insert(self, x: float, y: float, item: T) -> None:
+        cell = self.cell(x, y)
+        if cell not in self.cells:
+            self.cells[cell] = []
+        self.cells[cell].append((x, y, item))
+
+    def nearest(self, x: float, y: float, maxDistance: float) -> tuple[T, float] | None:
+        cellX, cellY = self.cell(x, y)
+        best = None
+        bestDistance = maxDistance
+        for ring in range(ceil(maxDistance / self.cellSize) + 1):
+            for cell in _ringCells(cellX, cellY, ring):
+                for pointX, pointY, item in self.cells.get(cell, ()):
+                    distance = hypot(pointX - x, pointY - y)
+                    if distance <= bestDistance:
+                        best = item
+                        bestDistance = distance
+            # every point in further rings is at least this far away
+            if best is not None and bestDistance <= ring * self.cellSize:
+                break
+        if best is None:
+            return None
+        return best, bestDistance
+
+    def within(self, x: float, y: float, radius: float) -> list[T]:
+        cellX, cellY = self.cell(x, y)
+        cellsRadius = ceil(radius / self.cellSize)
+        result = []
+        for dx in range(-cellsRadius, cellsRadius + 1):
+            for dy in range(-cellsRadius, cellsRadius + 1):
+                for pointX, pointY, item in self.cells.get(
+                    (cellX + dx, cellY + dy), ()
+                ):
+                    if hypot(pointX - x, pointY - y) <= radius:
+                        result.append(item)
+        return result
+
+
+def _ringCells(cellX: int, cellY: int, ring: int) -> list[Cell]:
+    if ring == 0:
+        return [(cellX, cellY)]
+    cells = []
+    for dx in range(-ring, ring + 1):
+        cells.append((cellX + dx, cellY - ring))
+        cells.append((cellX + dx, cellY + ring))
+    for dy in range(-ring + 1, ring):
+        cells.append((cellX - ring, cellY + dy))
+        cells.append((cellX + ring, cellY + dy))
+    return cells
+
+
+def segmentDistance(
+    x: float,
+    y: float,
+    segment: tuple[float, float, float, float],
+) -> float:
+    startX, startY, endX, endY = segment
+    dx = endX - startX
+    dy = endY - startY
+    lengthSquared = dx * dx + dy * dy
+    if lengthSquared == 0:
+        return hypot(x - startX, y - startY)
+    t = max(0.0, min(1.0, ((x - startX) * dx + (y - startY) * dy) / lengthSquared))
+    return hypot(x - startX - t * dx, y - startY - t * dy)
+
+
+class SegmentGridIndex(Generic[T]):
+    def __init__(self, cellSize: float) -> None:
+        self.cellSize = cellSize
+        self.cells: dict[Cell, list[tuple[tuple[float, float, float, float], T]]] = {}
+
+    def insert(
+        self,
+        segment: tuple[float, float, float, float],
+        item: T,
+    ) -> None:
+        startX, startY, endX, endY = segment
+        for cellX in range(
+            floor(min(startX, endX) / self.cellSize),
+            floor(max(startX, endX) / self.cellSize) + 1,
+        ):
+            for cellY in range(
+                floor(min(startY, endY) / self.cellSize),
+                floor(max(startY, endY) / self.cellSize) + 1,
+            ):
+                cell = (cellX, cellY)
+                if cell not in self.cells:
+                    self.cells[cell] = []
+                self.cells[cell].append((segment, item))
+
+    def nearest(
+        self,
+        x: float,
+        y: float,
+        maxDistance: float,
+        accept: Callable[[T], bool] | None = None,
+    ) -> tuple[T, float] | None:
+        cellX, cellY = floor(x / self.cellSize), floor(y / self.cellSize)
+        best = None
+        bestDistance = maxDistance
+        for ring in range(ceil(maxDistance / self.cellSize) + 1):
+            for cell in _ringCells(cellX, cellY, ring):
+                for segment, item in self.cells.get(cell, ()):
+                    if accept is not None and not accept(item):
+                        continue
+                    distance = segmentDistance(x, y, segment)
+                    if distance <= bestDistance:
+                        best = item
+                        bestDistance = distance
+            if best is not None and bestDistance <= ring * self.cellSize:
+                break
+        if best is None:
+            return None
+        return best, bestDistance
@@ -0,0 +1,98 @@
+from itertools import pairwise
+from math import ceil, hypot
+
+from geometry.gridIndex import PointGridIndex, SegmentGridIndex
+
+Point = tuple[float, float]
+
+
+def densify(points: list[Point], step: float) -> list[Point]:
+    if len(points) == 0:
+        return []
+    result = [points[0]]
+    for (startX, startY), (endX, endY) in pairwise(points):
+        parts = max(1, ceil(hypot(endX - startX, endY - startY) / step))
+        for part in range(1, parts + 1):
+            t = part / parts
+            result.append((startX + t * (endX - startX), startY + t * (endY - startY)))
+    return result
+
+
+def segmentIndex(points: list[Point], cellSize: float) -> SegmentGridIndex[int]:
+    index: SegmentGridIndex[int] = SegmentGridIndex(cellSize=cellSize)
+    for i, ((startX, startY), (endX, endY)) in enumerate(
+        pairwise(points),
+    ):
+        index.insert((startX, startY, endX, endY), i)
+    if len(points) == 1:
+        index.insert((*points[0], *points[0]), 0)
+    return index
+
+
+def directedHausdorff(
+    densePoints: list[Point],
+    otherIndex: SegmentGridIndex[int],
+    maxDistance: float,
+) -> float:
+    # distances are capped at maxDistance, so far away polylines are rejected early
+    worst = 0.0
+    for x, y in densePoints:
+        nearest = otherIndex.nearest(x, y, maxDistance=maxDistance)
+        if nearest is None:
+            return maxDistance
+        worst = max(worst, nearest[1])
+    return worst
+
+
+def hausdorffDistance(
+    points: list[Point],
+    otherPoints: list[Point],
+    step: float,
+    maxDistance: float,
+) -> float:
+    cellSize = max(step, maxDistance / 4)
+    distance = directedHausdorff(
+        densify(points, step),
+        segmentIndex(otherPoints, cellSize),
+        maxDistance,
+    )
+    if distance >= maxDistance:
+        return maxDistance
+    return max(
+        distance,
+        directedHausdorff(
+            densify(otherPoints, step),
+            segmentIndex(points, cellSize),
+            maxDistance,
+        ),
+    )
+
+
+def discreteFrechetWithin(
+    points: list[Point],
+    otherPoints: list[Point],
+    epsilon: float,
+) -> bool:
+    # Decision version of the discrete Fréchet distance. Only pairs closer than
+    # epsilon can be on a coupling path, so the grid index limits the dynamic
+    # programming to a narrow band instead of the full len(points) x len(other) table.
+    if len(points) == 0 or len(otherPoints) == 0:
+        return len(points) == len(otherPoints)
+    index: PointGridIndex[int] = PointGridIndex(cellSize=epsilon)
+    for j, (x, y) in enumerate(otherPoints):
+        index.insert(x, y, j)
+    previousReachable: set[int] = set()
+    for i, (x, y) in enumerate(points):
+        reachable: set[int] = set()
+        for j in sorted(index.within(x, y, epsilon)):
+            if (
+                (i == 0 and j == 0)
+                or j in previousReachable
+                or j - 1 in previousReachable
+                or j - 1 in reachable
+            ):
+                reachable.add(j)
+        if len(reachable) == 0:
+            return False
+        previousReachable = reachable
+    return len(otherPoints) - 1 in previousReachable
@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+from math import cos, radians
+
+from starsep_utils import GeoPoint
+
+EARTH_RADIUS = 6373000.0  # metres, same as starsep_utils.haversine
+METRES_PER_DEGREE = radians(1) * EARTH_RADIUS
+
+
+# Equirectangular projection to metres, accurate enough within a single city
+@dataclass(frozen=True)
+class LocalProjection:
+    originLat: float
+    originLon: float
+    xScale: float
+
+    def project(self, point: GeoPoint) -> tuple[float, float]:
+        return self.projectLatLon(point.lat, point.lon)
+
+    def projectLatLon(self, lat: float, lon: float) -> tuple[float, float]:
+        return (
+            (lon - self.originLon) * self.xScale,
+            (lat - self.originLat) * METRES_PER_DEGREE,
+        )
+
+
+def localProjection(originLat: float, originLon: float) -> LocalProjection:
+    return LocalProjection(
+        originLat=originLat,
+        originLon=originLon,
+        xScale=METRES_PER_DEGREE * cos(radians(originLat)),
+    )
+
+
+def projectionFor(points: list[GeoPoint]) -> LocalProjection:
+    if len(points) == 0:
+        return localProjection(originLat=0.0, originLon=0.0)
+    return localProjection(
+        originLat=sum(point.lat for point in points) / len(points),
+        originLon=sum(point.lon for point in points) / len(points),
+    )
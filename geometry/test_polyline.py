@@ -0,0 +1,32 @@
+from geometry.polyline import densify, discreteFrechetWithin, hausdorffDistance
+
+LINE = [(0.0, 0.0), (100.0, 0.0), (100.0, 100.0)]
+
+
+def testDensify() -> None:
+    assert densify(LINE, step=50.0) == [
+        (0.0, 0.0),
+        (50.0, 0.0),
+        (100.0, 0.0),
+        (100.0, 50.0),
+        (100.0, 100.0),
+    ]
+    assert densify([], step=50.0) == []
+
+
+def testHausdorffDistance() -> None:
+    shifted = [(x + 10.0, y) for x, y in LINE]
+    assert hausdorffDistance(LINE, shifted, step=5.0, maxDistance=1000.0) == 10.0
+    detour = [(0.0, 0.0), (50.0, -300.0), (100.0, 0.0), (100.0, 100.0)]
+    assert hausdorffDistance(LINE, detour, step=5.0, maxDistance=1000.0) == 300.0
+    farAway = [(x + 5000.0, y) for x, y in LINE]
+    assert hausdorffDistance(LINE, farAway, step=5.0, maxDistance=1000.0) == 1000.0
+
+
+def testDiscreteFrechetWithin() -> None:
+    line = densify(LINE, step=10.0)
+    assert discreteFrechetWithin(line, line, epsilon=1.0)
+    # same points, opposite direction: Hausdorff is 0, Fréchet isn't
+    assert hausdorffDistance(line, line[::-1], step=10.0, maxDistance=1000.0) == 0.0
+    assert not discreteFrechetWithin(line, line[::-1], epsilon=20.0)
+    assert discreteFrechetWithin(line, densify(LINE, step=7.0), epsilon=10.0)
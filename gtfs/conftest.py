@@ -0,0 +1,11 @@
+from pathlib import Path
+
+import pytest
+
+from gtfs.feedFixtures import FeedWriter, writeFeedZip
+
+
+@pytest.fixture
+def writeFeed(tmp_path: Path) -> FeedWriter:
+    # writing again replaces the feed, like a new download
+    return lambda files: writeFeedZip(tmp_path / "warsaw.zip", files)
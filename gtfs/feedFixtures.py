@@ -0,0 +1,13 @@
+import zipfile
+from collections.abc import Callable
+from pathlib import Path
+
+# writes GTFS files, by name, to a feed zip and returns its path
+FeedWriter = Callable[[dict[str, str]], Path]
+
+
+def writeFeedZip(zipPath: Path, files: dict[str, str]) -> Path:
+    with zipfile.ZipFile(zipPath, "w") as zipFile:
+        for name, text in files.items():
+            zipFile.writestr(name, text)
+    return zipPath
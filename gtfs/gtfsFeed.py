@@ -0,0 +1,82 @@
+import csv
+import hashlib
+import io
+import logging
+import os
+import zipfile
+from collections.abc import Iterator
+from dataclasses import dataclass
+from operator import itemgetter
+from pathlib import Path
+
+from configuration import cacheDirectory
+
+gtfsCacheDirectory = cacheDirectory / "GTFS"
+
+CACHE_MAGIC = b"OSMWTPGTFS"
+
+
+@dataclass(frozen=True)
+class GTFSFeed:
+    name: str
+    zipPath: Path
+    # stops with other refs, e.g. railway stations, aren't compared
+    stopRefLength: int
+
+    def cacheName(self, fileName: str) -> str:
+        return f"{self.name}-{fileName}"
+
+
+def gtfsFeedFingerprint(
+    zipPath: Path,
+    fileNames: list[str],
+    formatVersion: int,
+) -> bytes:
+    # CRCs from the zip central directory change whenever member content changes,
+    # so the archive doesn't have to be read fully just to validate a cache
+    digest = hashlib.sha256(f"v{formatVersion}".encode())
+    with zipfile.ZipFile(zipPath) as zipFile:
+        for fileName in fileNames:
+            info = zipFile.getinfo(fileName)
+            digest.update(f"{fileName}:{info.CRC}:{info.file_size};".encode())
+    return digest.digest()
+
+
+def readGTFSColumns(
+    zipPath: Path,
+    fileName: str,
+    columns: list[str],
+) -> Iterator[tuple[str, ...]]:
+    with (
+        zipfile.ZipFile(zipPath) as zipFile,
+        zipFile.open(fileName) as rawFile,
+    ):
+        reader = csv.reader(io.TextIOWrapper(rawFile, encoding="utf-8-sig", newline=""))
+        header = next(reader)
+        getColumns = itemgetter(*[header.index(column) for column in columns])
+        if len(columns) == 1:
+            for row in reader:
+                yield (getColumns(row),)
+        else:
+            yield from map(getColumns, reader)
+
+
+def readCachedPayload(name: str, fingerprint: bytes) -> bytes | None:
+    path = gtfsCacheDirectory / name
+    if not path.exists():
+        return None
+    data = path.read_bytes()
+    header = CACHE_MAGIC + fingerprint
+    if not data.startswith(header):
+        logging.info(f"GTFS cache {name} is outdated")
+        return None
+    return data[len(header) :]
+
+
+def writeCachedPayload(name: str, fingerprint: bytes, payload: bytes) -> None:
+    gtfsCacheDirectory.mkdir(parents=True, exist_ok=True)
+    path = gtfsCacheDirectory / name
+    # unique per process, shard workers may fill the same cache concurrently
+    temporaryPath = path.with_suffix(f".{os.getpid()}.tmp")
+    temporaryPath.write_bytes(CACHE_MAGIC + fingerprint + payload)
+    temporaryPath.replace(path)
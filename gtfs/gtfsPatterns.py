@@ -0,0 +1,202 @@
+import logging
+import struct
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+
+from starsep_utils import logDuration
+
+from gtfs.gtfsFeed import (
+    GTFSFeed,
+    gtfsFeedFingerprint,
+    readCachedPayload,
+    readGTFSColumns,
+    writeCachedPayload,
+)
+from model.types import RouteRef, StopRef
+
+PATTERNS_CACHE_NAME = "patterns.bin"
+PATTERNS_CACHE_VERSION = 2
+PATTERNS_STRING_SEPARATOR = "\0"
+
+
+@dataclass(frozen=True)
+class GTFSPattern:
+    routeRef: RouteRef
+    stopRefs: tuple[StopRef, ...]
+    shapeId: str
+
+
+@dataclass(frozen=True)
+class GTFSPatternIndex:
+    bySequence: dict[tuple[RouteRef, tuple[StopRef, ...]], GTFSPattern]
+    lastStopsAfter: dict[tuple[RouteRef, tuple[StopRef, ...]], set[StopRef]]
+
+    def findPattern(
+        self,
+        routeRef: RouteRef,
+        stopRefs: list[StopRef],
+    ) -> GTFSPattern | None:
+        return self.bySequence.get((routeRef, tuple(stopRefs)))
+
+    def lastStopRef(
+        self,
+        routeRef: RouteRef,
+        stopRefsWithoutLastOne: list[StopRef],
+    ) -> StopRef | None:
+        lastStops = self.lastStopsAfter.get((routeRef, tuple(stopRefsWithoutLastOne)))
+        if lastStops is None or len(lastStops) != 1:
+            return None
+        return next(iter(lastStops))
+
+
+def buildPatternIndex(patterns: list[GTFSPattern]) -> GTFSPatternIndex:
+    bySequence = {}
+    lastStopsAfter: dict[tuple[RouteRef, tuple[StopRef, ...]], set[StopRef]] = {}
+    for pattern in patterns:
+        bySequence[(pattern.routeRef, pattern.stopRefs)] = pattern
+        if len(pattern.stopRefs) < 2:
+            continue
+        key = (pattern.routeRef, pattern.stopRefs[:-1])
+        if key not in lastStopsAfter:
+            lastStopsAfter[key] = set()
+        lastStopsAfter[key].add(pattern.stopRefs[-1])
+    return GTFSPatternIndex(
+        bySequence=bySequence,
+        lastStopsAfter=lastStopsAfter,
+    )
+
+
+def _readRouteRefs(zipPath: Path) -> dict[str, RouteRef]:
+    return dict(
+        readGTFSColumns(zipPath, "routes.txt", ["route_id", "route_short_name"]),
+    )
+
+
+def _readGTFSPatterns(zipPath: Path) -> list[GTFSPattern]:
+    routeRefs = _readRouteRefs(zipPath)
+    tripRouteRefs = {
+        tripId: (routeRefs.get(routeId, routeId), shapeId)
+        for routeId, tripId, shapeId in readGTFSColumns(
+            zipPath,
+            "trips.txt",
+            ["route_id", "trip_id", "shape_id"],
+        )
+    }
+    # stop_times.txt is the largest file in the feed. It's grouped by trip,
+    # so only the current trip and distinct patterns are kept in memory.
+    patterns: dict[tuple[RouteRef, tuple[StopRef, ...]], GTFSPattern] = {}
+    finishedTripIds: set[str] = set()
+    currentTripId = None
+    currentStops: list[tuple[int, StopRef]] = []
+
+    def finishTrip() -> None:
+        finishedTripIds.add(currentTripId)
+        trip = tripRouteRefs.pop(currentTripId, None)
+        if trip is None:
+            logging.warning(f"GTFS stop_times for unknown trip {currentTripId}")
+            return
+        routeRef, shapeId = trip
+        currentStops.sort()
+        key = (routeRef, tuple(stopRef for _, stopRef in currentStops))
+        if key not in patterns:
+            patterns[key] = GTFSPattern(
+                routeRef=routeRef,
+                stopRefs=key[1],
+                shapeId=shapeId,
+            )
+
+    for tripId, stopSequence, stopRef in readGTFSColumns(
+        zipPath,
+        "stop_times.txt",
+        ["trip_id", "stop_sequence", "stop_id"],
+    ):
+        if tripId != currentTripId:
+            if currentTripId is not None:
+                finishTrip()
+            if tripId in finishedTripIds:
+                # the spec doesn't require grouping, a pattern of the trip would be cut
+                message = (
+                    f"GTFS stop_times.txt isn't grouped by trip, {tripId} is split"
+                )
+                raise ValueError(message)
+            currentTripId = tripId
+            currentStops = []
+        currentStops.append((int(stopSequence), stopRef))
+    if currentTripId is not None:
+        finishTrip()
+    return list(patterns.values())
+
+
+def encodeGTFSPatterns(patterns: list[GTFSPattern]) -> bytes:
+    stringIds: dict[str, int] = {}
+
+    def stringId(value: str) -> int:
+        if value not in stringIds:
+            stringIds[value] = len(stringIds)
+        return stringIds[value]
+
+    numbers = array("I")
+    for pattern in patterns:
+        numbers.append(stringId(pattern.routeRef))
+        numbers.append(stringId(pattern.shapeId))
+        numbers.append(len(pattern.stopRefs))
+        numbers.extend(stringId(stopRef) for stopRef in pattern.stopRefs)
+    strings = PATTERNS_STRING_SEPARATOR.join(stringIds).encode()
+    return (
+        struct.pack("<III", len(patterns), len(numbers), len(strings))
+        + strings
+        + numbers.tobytes()
+    )
+
+
+def decodeGTFSPatterns(payload: bytes) -> list[GTFSPattern]:
+    patternsCount, numbersCount, stringsSize = struct.unpack_from("<III", payload)
+    stringsStart = struct.calcsize("<III")
+    numbersStart = stringsStart + stringsSize
+    strings = (
+        payload[stringsStart:numbersStart].decode().split(PATTERNS_STRING_SEPARATOR)
+    )
+    numbers = array("I")
+    numbers.frombytes(
+        payload[numbersStart : numbersStart + numbersCount * numbers.itemsize],
+    )
+    patterns = []
+    position = 0
+    for _ in range(patternsCount):
+        routeRef = strings[numbers[position]]
+        shapeId = strings[numbers[position + 1]]
+        stopsCount = numbers[position + 2]
+        stopsStart = position + 3
+        position = stopsStart + stopsCount
+        patterns.append(
+            GTFSPattern(
+                routeRef=routeRef,
+                stopRefs=tuple(strings[i] for i in numbers[stopsStart:position]),
+                shapeId=shapeId,
+            ),
+        )
+    return patterns
+
+
+@logDuration
+def loadGTFSPatterns(gtfsFeed: GTFSFeed) -> GTFSPatternIndex:
+    fingerprint = gtfsFeedFingerprint(
+        gtfsFeed.zipPath,
+        ["routes.txt", "trips.txt", "stop_times.txt"],
+        formatVersion=PATTERNS_CACHE_VERSION,
+    )
+    payload = readCachedPayload(
+        gtfsFeed.cacheName(PATTERNS_CACHE_NAME),
+        fingerprint,
+    )
+    if payload is not None:
+        patterns = decodeGTFSPatterns(payload)
+    else:
+        patterns = _readGTFSPatterns(gtfsFeed.zipPath)
+        writeCachedPayload(
+            gtfsFeed.cacheName(PATTERNS_CACHE_NAME),
+            fingerprint,
+            encodeGTFSPatterns(patterns),
+        )
+    return buildPatternIndex(patterns)
@@ -0,0 +1,133 @@
+import struct
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+
+from starsep_utils import GeoPoint, logDuration
+
+from gtfs.gtfsFeed import (
+    GTFSFeed,
+    gtfsFeedFingerprint,
+    readCachedPayload,
+    readGTFSColumns,
+    writeCachedPayload,
+)
+
+SHAPES_CACHE_NAME = "shapes.bin"
+SHAPES_CACHE_VERSION = 1
+SHAPES_STRING_SEPARATOR = "\0"
+
+
+@dataclass(frozen=True)
+class GTFSShapes:
+    shapeRanges: dict[str, tuple[int, int]]
+    lats: array
+    lons: array
+
+    def shape(self, shapeId: str) -> list[GeoPoint] | None:
+        if shapeId not in self.shapeRanges:
+            return None
+        start, end = self.shapeRanges[shapeId]
+        return [
+            GeoPoint(lat=lat, lon=lon)
+            for lat, lon in zip(self.lats[start:end], self.lons[start:end], strict=True)
+        ]
+
+
+def _readGTFSShapes(zipPath: Path) -> GTFSShapes:
+    shapeRanges: dict[str, tuple[int, int]] = {}
+    lats = array("d")
+    lons = array("d")
+    currentShapeId = None
+    currentPoints: list[tuple[int, float, float]] = []
+
+    def finishShape() -> None:
+        currentPoints.sort()
+        start = len(lats)
+        for _, lat, lon in currentPoints:
+            lats.append(lat)
+            lons.append(lon)
+        shapeRanges[currentShapeId] = (start, len(lats))
+
+    # shapes.txt is grouped by shape, points are appended straight to flat arrays
+    for shapeId, sequence, lat, lon in readGTFSColumns(
+        zipPath,
+        "shapes.txt",
+        ["shape_id", "shape_pt_sequence", "shape_pt_lat", "shape_pt_lon"],
+    ):
+        if shapeId != currentShapeId:
+            if currentShapeId is not None:
+                finishShape()
+            if shapeId in shapeRanges:
+                # the spec doesn't require grouping, only the last run would be kept
+                message = f"GTFS shapes.txt isn't grouped by shape, {shapeId} is split"
+                raise ValueError(message)
+            currentShapeId = shapeId
+            currentPoints = []
+        currentPoints.append((int(sequence), float(lat), float(lon)))
+    if currentShapeId is not None:
+        finishShape()
+    return GTFSShapes(shapeRanges=shapeRanges, lats=lats, lons=lons)
+
+
+def encodeGTFSShapes(shapes: GTFSShapes) -> bytes:
+    shapeIds = list(shapes.shapeRanges)
+    ranges = array("I")
+    for shapeId in shapeIds:
+        ranges.extend(shapes.shapeRanges[shapeId])
+    strings = SHAPES_STRING_SEPARATOR.join(shapeIds).encode()
+    return (
+        struct.pack("<III", len(shapeIds), len(shapes.lats), len(strings))
+        + strings
+        + ranges.tobytes()
+        + shapes.lats.tobytes()
+        + shapes.lons.tobytes()
+    )
+
+
+def decodeGTFSShapes(payload: bytes) -> GTFSShapes:
+    shapesCount, pointsCount, stringsSize = struct.unpack_from("<III", payload)
+    position = struct.calcsize("<III")
+    shapeIds = (
+        payload[position : position + stringsSize]
+        .decode()
+        .split(SHAPES_STRING_SEPARATOR)
+    )
+    position += stringsSize
+    ranges = array("I")
+    rangesSize = 2 * shapesCount * ranges.itemsize
+    ranges.frombytes(payload[position : position + rangesSize])
+    position += rangesSize
+    lats = array("d")
+    pointsSize = pointsCount * lats.itemsize
+    lats.frombytes(payload[position : position + pointsSize])
+    position += pointsSize
+    lons = array("d")
+    lons.frombytes(payload[position : position + pointsSize])
+    return GTFSShapes(
+        shapeRanges={
+            shapeId: (ranges[2 * i], ranges[2 * i + 1])
+            for i, shapeId in enumerate(shapeIds[:shapesCount])
+        },
+        lats=lats,
+        lons=lons,
+    )
+
+
+@logDuration
+def loadGTFSShapes(gtfsFeed: GTFSFeed) -> GTFSShapes:
+    fingerprint = gtfsFeedFingerprint(
+        gtfsFeed.zipPath,
+        ["shapes.txt"],
+        formatVersion=SHAPES_CACHE_VERSION,
+    )
+    payload = readCachedPayload(gtfsFeed.cacheName(SHAPES_CACHE_NAME), fingerprint)
+    if payload is not None:
+        return decodeGTFSShapes(payload)
+    shapes = _readGTFSShapes(gtfsFeed.zipPath)
+    writeCachedPayload(
+        gtfsFeed.cacheName(SHAPES_CACHE_NAME),
+        fingerprint,
+        encodeGTFSShapes(shapes),
+    )
+    return shapes
@@ -1,55 +1,139 @@
-import csv
-from pathlib import Path
+import struct
+from array import array
 
-from starsep_utils import haversine
+from starsep_utils import logDuration
 
+from gtfs.gtfsFeed import (
+    GTFSFeed,
+    gtfsFeedFingerprint,
+    readCachedPayload,
+    readGTFSColumns,
+    writeCachedPayload,
+)
+from gtfs.stopDistanceEngine import (
+    distanceDistribution,
+    haversineDistances,
+    nearestStops,
+)
 from model.gtfs import GTFSStop, OSMAndGTFSComparisonResult
+from model.runContext import RunContext
 from model.types import StopRef
-from osm.OSMRelationAnalyzer import osmStopsWithLocation
-
-gtfsPath = Path("./GTFS-Warsaw")
-
 
 STOP_DISTANCE_THRESHOLD = 100.0  # metres
+STOP_DISTANCE_THRESHOLDS = [25.0, 50.0, STOP_DISTANCE_THRESHOLD, 250.0, 500.0]
 
 
+@logDuration
 def compareOSMAndGTFSStops(
     gtfsStops: dict[StopRef, GTFSStop],
+    context: RunContext,
 ) -> OSMAndGTFSComparisonResult:
-    osmStops = osmStopsWithLocation
+    osmStops = context.osmStopsWithLocation
     osmStopRefsNotInGTFS = sorted(osmStops.keys() - gtfsStops.keys())
     gtfsStopRefsNotInOSM = sorted(gtfsStops.keys() - osmStops.keys())
-    commonRefs = gtfsStops.keys() & osmStops.keys()
-    farAwayStops = []
-    for ref in sorted(commonRefs):
-        distance = haversine(osmStops[ref], gtfsStops[ref])
-        if distance > STOP_DISTANCE_THRESHOLD:
-            farAwayStops.append((ref, round(distance)))
+    commonRefs = sorted(gtfsStops.keys() & osmStops.keys())
+    distances = haversineDistances(
+        [osmStops[ref] for ref in commonRefs],
+        [gtfsStops[ref] for ref in commonRefs],
+    )
+    farAwayStops = [
+        (ref, int(distance))
+        for ref, distance in zip(commonRefs, distances, strict=True)
+        if int(distance) > STOP_DISTANCE_THRESHOLD
+    ]
     return OSMAndGTFSComparisonResult(
         osmStops=osmStops,
         gtfsStops=gtfsStops,
         osmStopRefsNotInGTFS=osmStopRefsNotInGTFS,
         gtfsStopRefsNotInOSM=gtfsStopRefsNotInOSM,
         farAwayStops=farAwayStops,
+        distanceDistribution=distanceDistribution(
+            distances,
+            STOP_DISTANCE_THRESHOLDS,
+        ),
+        nearestGTFSStops=nearestStops(osmStopRefsNotInGTFS, osmStops, gtfsStops),
+        nearestOSMStops=nearestStops(gtfsStopRefsNotInOSM, gtfsStops, osmStops),
     )
 
 
-def shouldIgnoreGTFSRef(ref: StopRef) -> bool:
-    return len(ref) != 6 or not ref.isnumeric()
-
-
-def loadGTFSStops() -> dict[StopRef, GTFSStop]:
-    result = {}
-    with (gtfsPath / "stops.txt").open() as stopsFile:
-        stopsReader = csv.DictReader(stopsFile, delimiter=",")
-        for stop in stopsReader:
-            ref = stop["stop_id"]
-            if shouldIgnoreGTFSRef(ref):
-                continue
-            result[ref] = GTFSStop(
-                ref=ref,
-                name=stop["stop_name"],
-                lat=float(stop["stop_lat"]),
-                lon=float(stop["stop_lon"]),
-            )
-    return result
+def shouldIgnoreGTFSRef(ref: StopRef, stopRefLength: int) -> bool:
+    return len(ref) != stopRefLength or not ref.isnumeric()
+
+
+STOPS_CACHE_NAME = "stops.bin"
+STOPS_CACHE_VERSION = 1
+STOPS_STRING_SEPARATOR = "\0"
+
+
+def encodeGTFSStops(stops: list[GTFSStop]) -> bytes:
+    lats = array("d", [stop.lat for stop in stops])
+    lons = array("d", [stop.lon for stop in stops])
+    strings = STOPS_STRING_SEPARATOR.join(
+        [stop.ref for stop in stops] + [stop.name for stop in stops],
+    )
+    return (
+        struct.pack("<I", len(stops))
+        + lats.tobytes()
+        + lons.tobytes()
+        + strings.encode()
+    )
+
+
+def decodeGTFSStops(payload: bytes) -> list[GTFSStop]:
+    (count,) = struct.unpack_from("<I", payload)
+    coordinatesStart = struct.calcsize("<I")
+    coordinatesSize = count * array("d").itemsize
+    lats = array("d", payload[coordinatesStart : coordinatesStart + coordinatesSize])
+    lonsStart = coordinatesStart + coordinatesSize
+    lons = array("d", payload[lonsStart : lonsStart + coordinatesSize])
+    if count == 0:
+        return []
+    strings = (
+        payload[lonsStart + coordinatesSize :]
+        .decode()
+        .split(
+            STOPS_STRING_SEPARATOR,
+        )
+    )
+    return [
+        GTFSStop(ref=ref, name=name, lat=lat, lon=lon)
+        for ref, name, lat, lon in zip(
+            strings[:count],
+            strings[count:],
+            lats,
+            lons,
+            strict=True,
+        )
+    ]
+
+
+def _readGTFSStops(gtfsFeed: GTFSFeed) -> list[GTFSStop]:
+    return [
+        GTFSStop(ref=ref, name=name, lat=float(lat), lon=float(lon))
+        for ref, name, lat, lon in readGTFSColumns(
+            gtfsFeed.zipPath,
+            "stops.txt",
+            ["stop_id", "stop_name", "stop_lat", "stop_lon"],
+        )
+        if not shouldIgnoreGTFSRef(ref, gtfsFeed.stopRefLength)
+    ]
+
+
+@logDuration
+def loadGTFSStops(gtfsFeed: GTFSFeed) -> dict[StopRef, GTFSStop]:
+    fingerprint = gtfsFeedFingerprint(
+        gtfsFeed.zipPath,
+        ["stops.txt"],
+        formatVersion=STOPS_CACHE_VERSION,
+    )
+    payload = readCachedPayload(gtfsFeed.cacheName(STOPS_CACHE_NAME), fingerprint)
+    if payload is not None:
+        stops = decodeGTFSStops(payload)
+    else:
+        stops = _readGTFSStops(gtfsFeed)
+        writeCachedPayload(
+            gtfsFeed.cacheName(STOPS_CACHE_NAME),
+            fingerprint,
+            encodeGTFSStops(stops),
+        )
+    return {stop.ref: stop for stop in stops}
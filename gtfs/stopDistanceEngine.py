@@ -0,0 +1,90 @@
+from array import array
+from bisect import bisect_left
+from math import atan2, cos, radians, sin, sqrt
+
+from starsep_utils import GeoPoint
+
+from geometry.gridIndex import PointGridIndex
+from geometry.projection import EARTH_RADIUS, projectionFor
+from model.gtfs import StopDistanceDistribution
+from model.types import StopRef
+
+DISTANCE_PERCENTILES = [50, 90, 99]
+NEAREST_STOP_MAX_DISTANCE = 1000.0  # metres
+NEAREST_STOP_CELL_SIZE = 250.0  # metres
+
+
+def coordinateArrays(points: list[GeoPoint]) -> tuple[array, array]:
+    return (
+        array("d", [radians(point.lat) for point in points]),
+        array("d", [radians(point.lon) for point in points]),
+    )
+
+
+def haversineDistances(
+    fromPoints: list[GeoPoint],
+    toPoints: list[GeoPoint],
+) -> array:
+    # whole batch works on flat coordinate arrays, which PyPy's JIT turns into a tight loop
+    fromLats, fromLons = coordinateArrays(fromPoints)
+    toLats, toLons = coordinateArrays(toPoints)
+    distances = array("d", bytes(len(fromLats) * array("d").itemsize))
+    for i in range(len(fromLats)):
+        sinLat = sin((toLats[i] - fromLats[i]) / 2)
+        sinLon = sin((toLons[i] - fromLons[i]) / 2)
+        a = sinLat * sinLat + cos(fromLats[i]) * cos(toLats[i]) * sinLon * sinLon
+        distances[i] = 2 * EARTH_RADIUS * atan2(sqrt(a), sqrt(1 - a))
+    return distances
+
+
+def distanceDistribution(
+    distances: array,
+    thresholds: list[float],
+) -> StopDistanceDistribution:
+    sortedThresholds = sorted(thresholds)
+    # single pass: bucket every distance by the number of thresholds it exceeds
+    buckets = [0] * (len(sortedThresholds) + 1)
+    for distance in distances:
+        buckets[bisect_left(sortedThresholds, int(distance))] += 1
+    aboveThreshold = {}
+    above = 0
+    for i in range(len(sortedThresholds), 0, -1):
+        above += buckets[i]
+        aboveThreshold[int(sortedThresholds[i - 1])] = above
+    sortedDistances = sorted(distances)
+    percentiles = {}
+    for percentile in DISTANCE_PERCENTILES:
+        if len(sortedDistances) == 0:
+            break
+        index = min(
+            len(sortedDistances) - 1,
+            len(sortedDistances) * percentile // 100,
+        )
+        percentiles[percentile] = int(sortedDistances[index])
+    return StopDistanceDistribution(
+        count=len(sortedDistances),
+        percentiles=percentiles,
+        maximum=int(sortedDistances[-1]) if len(sortedDistances) > 0 else 0,
+        aboveThreshold=dict(sorted(aboveThreshold.items())),
+    )
+
+
+def nearestStops(
+    refs: list[StopRef],
+    sourceStops: dict[StopRef, GeoPoint],
+    targetStops: dict[StopRef, GeoPoint],
+) -> dict[StopRef, tuple[StopRef, int]]:
+    projection = projectionFor(list(targetStops.values()))
+    index: PointGridIndex[StopRef] = PointGridIndex(cellSize=NEAREST_STOP_CELL_SIZE)
+    for targetRef, target in targetStops.items():
+        index.insert(*projection.project(target), targetRef)
+    result = {}
+    for ref in refs:
+        nearest = index.nearest(
+            *projection.project(sourceStops[ref]),
+            maxDistance=NEAREST_STOP_MAX_DISTANCE,
+        )
+        if nearest is not None:
+            nearestRef, distance = nearest
+            result[ref] = (nearestRef, round(distance))
+    return result
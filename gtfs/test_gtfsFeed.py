@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from gtfs import gtfsFeed, osmGTFSStopsComparer
+from gtfs.feedFixtures import FeedWriter
+from gtfs.gtfsFeed import GTFSFeed, readGTFSColumns
+from gtfs.osmGTFSStopsComparer import loadGTFSStops
+from model.gtfs import GTFSStop
+
+STOPS_TXT = """﻿stop_id,stop_name,stop_lat,stop_lon,zone_id
+100101,"Kijowska 01",52.252,21.045,1
+100102,Kijowska 02,52.253,21.046,1
+wkd01,Warszawa Śródmieście WKD,52.229,21.008,1
+"""
+
+
+def testReadGTFSColumns(writeFeed: FeedWriter) -> None:
+    zipPath = writeFeed({"stops.txt": STOPS_TXT})
+    assert list(readGTFSColumns(zipPath, "stops.txt", ["stop_name", "stop_id"])) == [
+        ("Kijowska 01", "100101"),
+        ("Kijowska 02", "100102"),
+        ("Warszawa Śródmieście WKD", "wkd01"),
+    ]
+    assert list(readGTFSColumns(zipPath, "stops.txt", ["zone_id"])) == [
+        ("1",),
+        ("1",),
+        ("1",),
+    ]
+
+
+def testLoadGTFSStopsUsesCache(tmp_path: Path, mocker, writeFeed: FeedWriter) -> None:  # noqa: ANN001
+    zipPath = writeFeed({"stops.txt": STOPS_TXT})
+    mocker.patch.object(gtfsFeed, "gtfsCacheDirectory", tmp_path / "cache")
+    gtfsFeedConfig = GTFSFeed(name="test", zipPath=zipPath, stopRefLength=6)
+    expected = {
+        "100101": GTFSStop(ref="100101", name="Kijowska 01", lat=52.252, lon=21.045),
+        "100102": GTFSStop(ref="100102", name="Kijowska 02", lat=52.253, lon=21.046),
+    }
+
+    assert loadGTFSStops(gtfsFeedConfig) == expected
+    readSpy = mocker.spy(osmGTFSStopsComparer, "readGTFSColumns")
+    assert loadGTFSStops(gtfsFeedConfig) == expected
+    readSpy.assert_not_called()
+
+    writeFeed({"stops.txt": STOPS_TXT.replace("Kijowska 02", "Kijowska 52")})
+    assert loadGTFSStops(gtfsFeedConfig)["100102"].name == "Kijowska 52"
+    readSpy.assert_called_once()
@@ -0,0 +1,107 @@
+from pathlib import Path
+
+import pytest
+
+from gtfs import gtfsFeed
+from gtfs.feedFixtures import FeedWriter
+from gtfs.gtfsFeed import GTFSFeed
+from gtfs.gtfsPatterns import (
+    GTFSPattern,
+    decodeGTFSPatterns,
+    encodeGTFSPatterns,
+    loadGTFSPatterns,
+)
+
+ROUTES_TXT = """route_id,agency_id,route_short_name,route_type
+R-520,0,520,3
+R-N14,0,N14,3
+"""
+TRIPS_TXT = """route_id,service_id,trip_id,shape_id
+R-520,1,520/1,520-A
+R-520,1,520/2,520-A
+R-520,1,520/3,520-B
+R-N14,1,N14/1,N14-A
+"""
+STOP_TIMES_TXT = """trip_id,arrival_time,departure_time,stop_id,stop_sequence
+520/1,10:00:00,10:00:00,100101,0
+520/1,10:02:00,10:02:00,100201,1
+520/1,10:04:00,10:04:00,100301,2
+520/2,11:04:00,11:04:00,100301,2
+520/2,11:00:00,11:00:00,100101,0
+520/2,11:02:00,11:02:00,100201,1
+520/3,12:00:00,12:00:00,100101,0
+520/3,12:02:00,12:02:00,100201,1
+520/3,12:04:00,12:04:00,100302,2
+N14/1,23:00:00,23:00:00,100201,0
+N14/1,23:02:00,23:02:00,100301,1
+"""
+
+
+def testLoadGTFSPatterns(tmp_path: Path, mocker, writeFeed: FeedWriter) -> None:  # noqa: ANN001
+    mocker.patch.object(gtfsFeed, "gtfsCacheDirectory", tmp_path / "cache")
+    gtfsFeedConfig = GTFSFeed(
+        name="test",
+        zipPath=writeFeed(
+            {
+                "routes.txt": ROUTES_TXT,
+                "trips.txt": TRIPS_TXT,
+                "stop_times.txt": STOP_TIMES_TXT,
+            },
+        ),
+        stopRefLength=6,
+    )
+
+    for _ in range(2):
+        patternIndex = loadGTFSPatterns(gtfsFeedConfig)
+        assert patternIndex.findPattern("520", ["100101", "100201", "100301"]) == (
+            GTFSPattern(
+                routeRef="520",
+                stopRefs=("100101", "100201", "100301"),
+                shapeId="520-A",
+            )
+        )
+        assert patternIndex.findPattern("N14", ["100101", "100201"]) is None
+        assert patternIndex.lastStopRef("N14", ["100201"]) == "100301"
+        # two patterns of 520 end with different stops after the same prefix
+        assert patternIndex.lastStopRef("520", ["100101", "100201"]) is None
+
+
+def testLoadGTFSPatternsRejectsInterleavedTrips(
+    tmp_path: Path,
+    mocker,  # noqa: ANN001
+    writeFeed: FeedWriter,
+) -> None:
+    mocker.patch.object(gtfsFeed, "gtfsCacheDirectory", tmp_path / "cache")
+    stopTimes = STOP_TIMES_TXT.replace(
+        "520/1,10:04:00,10:04:00,100301,2\n",
+        "",
+    ).replace(
+        "N14/1,23:02:00,23:02:00,100301,1\n",
+        "N14/1,23:02:00,23:02:00,100301,1\n520/1,10:04:00,10:04:00,100301,2\n",
+    )
+    gtfsFeedConfig = GTFSFeed(
+        name="test",
+        zipPath=writeFeed(
+            {
+                "routes.txt": ROUTES_TXT,
+                "trips.txt": TRIPS_TXT,
+                "stop_times.txt": stopTimes,
+            },
+        ),
+        stopRefLength=6,
+    )
+    with pytest.raises(ValueError, match="520/1"):
+        loadGTFSPatterns(gtfsFeedConfig)
+
+
+def testEncodeGTFSPatterns() -> None:
+    patterns = [
+        GTFSPattern(
+            routeRef="520",
+            stopRefs=("100101", "100201", "100301"),
+            shapeId="520-A",
+        ),
+        GTFSPattern(routeRef="N14", stopRefs=(), shapeId=""),
+        GTFSPattern(routeRef="N14", stopRefs=("100201", "100101"), shapeId="N14-A"),
+    ]
+    assert decodeGTFSPatterns(encodeGTFSPatterns(patterns)) == patterns
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pytest
+from starsep_utils import GeoPoint
+
+from gtfs import gtfsFeed
+from gtfs.feedFixtures import FeedWriter
+from gtfs.gtfsFeed import GTFSFeed
+from gtfs.gtfsShapes import loadGTFSShapes
+
+SHAPES_TXT = """shape_id,shape_pt_sequence,shape_pt_lat,shape_pt_lon
+520-A,1,52.2,21.1
+520-A,0,52.1,21.0
+N14-A,0,52.3,21.2
+"""
+
+
+def testLoadGTFSShapes(tmp_path: Path, mocker, writeFeed: FeedWriter) -> None:  # noqa: ANN001
+    zipPath = writeFeed({"shapes.txt": SHAPES_TXT})
+    mocker.patch.object(gtfsFeed, "gtfsCacheDirectory", tmp_path / "cache")
+    gtfsFeedConfig = GTFSFeed(name="test", zipPath=zipPath, stopRefLength=6)
+
+    for _ in range(2):
+        shapes = loadGTFSShapes(gtfsFeedConfig)
+        assert shapes.shape("520-A") == [
+            GeoPoint(lat=52.1, lon=21.0),
+            GeoPoint(lat=52.2, lon=21.1),
+        ]
+        assert shapes.shape("N14-A") == [GeoPoint(lat=52.3, lon=21.2)]
+        assert shapes.shape("missing") is None
+
+
+def testLoadGTFSShapesRejectsSplitShapes(
+    tmp_path: Path,
+    mocker,  # noqa: ANN001
+    writeFeed: FeedWriter,
+) -> None:
+    zipPath = writeFeed({"shapes.txt": SHAPES_TXT + "520-A,2,52.3,21.3\n"})
+    mocker.patch.object(gtfsFeed, "gtfsCacheDirectory", tmp_path / "cache")
+    gtfsFeedConfig = GTFSFeed(name="test", zipPath=zipPath, stopRefLength=6)
+    with pytest.raises(ValueError, match="520-A"):
+        loadGTFSShapes(gtfsFeedConfig)
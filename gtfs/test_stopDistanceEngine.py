@@ -0,0 +1,54 @@
+from array import array
+
+from starsep_utils import GeoPoint, haversine
+
+from gtfs.stopDistanceEngine import (
+    distanceDistribution,
+    haversineDistances,
+    nearestStops,
+)
+from model.gtfs import StopDistanceDistribution
+
+POINTS = [
+    GeoPoint(lat=52.2297, lon=21.0122),
+    GeoPoint(lat=52.2300, lon=21.0130),
+    GeoPoint(lat=52.2500, lon=21.0500),
+    GeoPoint(lat=52.1000, lon=20.9000),
+]
+
+
+def testHaversineDistancesMatchesHaversine() -> None:
+    distances = haversineDistances(POINTS, POINTS[1:] + POINTS[:1])
+    expected = [
+        haversine(point, other)
+        for point, other in zip(POINTS, POINTS[1:] + POINTS[:1], strict=True)
+    ]
+    assert [int(distance) for distance in distances] == expected
+
+
+def testDistanceDistribution() -> None:
+    distances = array("d", [5.0, 30.5, 100.0, 100.9, 101.0, 600.0])
+    assert distanceDistribution(distances, [100.0, 25.0, 500.0]) == (
+        StopDistanceDistribution(
+            count=6,
+            percentiles={50: 100, 90: 600, 99: 600},
+            maximum=600,
+            aboveThreshold={25: 5, 100: 2, 500: 1},
+        )
+    )
+    assert distanceDistribution(array("d"), [100.0]) == StopDistanceDistribution(
+        count=0,
+        percentiles={},
+        maximum=0,
+        aboveThreshold={100: 0},
+    )
+
+
+def testNearestStops() -> None:
+    sourceStops = {"100101": POINTS[0], "100102": POINTS[3]}
+    targetStops = {"200201": POINTS[1], "200202": POINTS[2]}
+    result = nearestStops(["100101", "100102"], sourceStops, targetStops)
+    assert result.keys() == {"100101"}
+    nearestRef, distance = result["100101"]
+    assert nearestRef == "200201"
+    assert abs(distance - haversine(POINTS[0], POINTS[1])) <= 1
@@ -1,138 +1,471 @@
 #!/usr/bin/env -S uv run python
+import dataclasses
 import logging
+import subprocess
+import sys
+from collections.abc import Callable
 from datetime import UTC, datetime
 from pathlib import Path
+from typing import Any
 
-from jinja2 import (
-    Environment,
-    FileSystemLoader,
-    StrictUndefined,
-    select_autoescape,
-)
+from httpx import BaseTransport, Client
+from starsep_utils import OverpassResult
 from starsep_utils.healthchecks import healthchecks
 
-from compare.comparator import compareStops
-from configuration import ENABLE_TRAIN, MISSING_REF, outputDirectory
-from gtfs.osmGTFSStopsComparer import (
-    STOP_DISTANCE_THRESHOLD,
-    compareOSMAndGTFSStops,
-    loadGTFSStops,
+from configuration import (
+    STAGE_DEADLINE_SECONDS,
+    cacheDirectory,
 )
+from gtfs.gtfsPatterns import loadGTFSPatterns
+from gtfs.gtfsShapes import loadGTFSShapes
+from gtfs.osmGTFSStopsComparer import loadGTFSStops
+from model.runContext import RunContext
+from network.registry import NETWORKS
+from network.transitNetwork import TransitNetwork
 from osm.OSMRelationAnalyzer import (
-    allOSMRefs,
     analyzeOSMRelations,
-    disusedStop,
-    invalidOperatorVariants,
-    manyLastStops,
-    mismatchOSMNameRefNonRailway,
-    mismatchOSMNameRefRailway,
-    missingName,
-    missingRouteUrl,
-    missingStopRef,
-    osmOperatorLinks,
-    osmRefToName,
-    unexpectedLink,
-    unexpectedNetwork,
-    unexpectedStopRef,
-    wtpLinkDuplicates,
+    downloadNetworkRelations,
+    networkRelations,
+    scrapeOSMRoutes,
+)
+from pipeline.cli import parseArguments, printHistory
+from pipeline.metrics import healthchecksWithSummary, writeMetrics
+from pipeline.profiling import PipelineProfiler
+from pipeline.report import addReportStages, templateEnvironment
+from pipeline.routeCheck import (
+    checkRelations,
+    downloadRouteRelationIds,
+    loadReferenceData,
+)
+from pipeline.routeCheckReport import (
+    formatCheckResult,
+    renderCheckFragment,
+)
+from pipeline.runState import RunState, startRun
+from pipeline.shards import (
+    mergeShards,
+    prepareShards,
+    runAnalyzeShard,
+    runScrapeShard,
 )
-from warsaw.fetchApiRoutes import fetchApiRoutes
-from warsaw.wtpScraper import (
-    WTPLink,
-    scrapeHomepage,
-    wtpMissingLastStop,
-    wtpMissingLastStopRefNames,
-    wtpSeenLinks,
-    wtpStopRefs,
+from pipeline.snapshot import (
+    checkGTFSFeeds,
+    openSnapshot,
+    recordingSnapshot,
+    writeSnapshot,
 )
-from warsaw.wtpStopMapping import wtpStopMapping
-
-startTime = datetime.now(UTC)
-
-
-def processData() -> None:
-    scrapeHomepage()
-    apiResults = fetchApiRoutes()
-    gtfsStops = loadGTFSStops()
-    osmResults = analyzeOSMRelations(apiResults, gtfsStops)
-    # currently unused: compareApiRoutesWithOSM(apiResults, osmResults)
-    compareResults = compareStops(osmResults=osmResults)
-    notLinkedWtpUrls: set[str] = set()
-    for link in wtpSeenLinks - osmOperatorLinks:
-        wtpLinkParams = WTPLink.fromTuple(link)
-        if wtpLinkParams.line not in ["M1", "M2"] or (
-            not ENABLE_TRAIN and not wtpLinkParams.line.startswith("S")
-        ):
-            notLinkedWtpUrls.add(wtpLinkParams.url())
-    osmAndGTFSComparisonResult = compareOSMAndGTFSStops(gtfsStops)
-    env = Environment(
-        loader=FileSystemLoader(searchpath="./templates"),
-        autoescape=select_autoescape(),
-        trim_blocks=True,
-        lstrip_blocks=True,
-        undefined=StrictUndefined,
-    )
-    endTime = datetime.now(UTC)
-    generationSeconds = int((endTime - startTime).total_seconds())
-    sharedContext = {
-        "startTime": startTime.isoformat(timespec="seconds"),
-        "generationSeconds": generationSeconds,
-    }
-    with Path(outputDirectory, "index.html").open("w") as f:
-        template = env.get_template("index.j2")
-        f.write(
-            template.render(
-                refs=compareResults.refs,
-                renderResults=compareResults.renderResults,
-                disusedStop=disusedStop,
-                invalidWtpVariants=invalidOperatorVariants,
-                wtpManyLastStops=manyLastStops,
-                wtpMissingLastStop=wtpMissingLastStop,
-                missingRouteUrl=missingRouteUrl,
-                notLinkedWtpUrls=sorted(notLinkedWtpUrls),
-                unexpectedLink=unexpectedLink,
-                unexpectedNetwork=unexpectedNetwork,
-                wtpLinkDuplicates=wtpLinkDuplicates,
-                ENABLE_TRAIN=ENABLE_TRAIN,
-                **sharedContext,
+from pipeline.stageGraph import StageGraph
+from pipeline.staticOutput import OutputOptions
+from scraper.httpx_client import httpxClient
+
+
+def addReferenceStages(graph: StageGraph, network: TransitNetwork) -> None:
+    stage = network.stageName
+    graph.add(
+        stage("apiResults"),
+        network.fetchOperatorRoutes,
+        deadline=STAGE_DEADLINE_SECONDS["apiResults"],
+    )
+    graph.add(stage("gtfsStops"), lambda: loadGTFSStops(network.gtfsFeed))
+    graph.add(stage("gtfsPatterns"), lambda: loadGTFSPatterns(network.gtfsFeed))
+    graph.add(stage("gtfsShapes"), lambda: loadGTFSShapes(network.gtfsFeed))
+
+
+def addNetworkStages(
+    graph: StageGraph,
+    network: TransitNetwork,
+    httpClient: Client,
+    *,
+    outputOptions: OutputOptions,
+) -> None:
+    stage = network.stageName
+    # every stage writes its findings into the run context instead of module globals
+    graph.add(stage("context"), RunContext)
+    graph.add(
+        stage("homepage"),
+        network.scrapeOperatorHomepage,
+        inputs={"context": stage("context")},
+        deadline=STAGE_DEADLINE_SECONDS["homepage"],
+    )
+    addReferenceStages(graph, network)
+    graph.add(
+        stage("relations"),
+        lambda overpassResult: networkRelations(
+            overpassResult,
+            network.rootRelationId,
+        ),
+        inputs=["overpassResult"],
+    )
+    graph.add(
+        stage("scrapedOSMRoutes"),
+        lambda relations, context: scrapeOSMRoutes(
+            relations,
+            network,
+            httpClient,
+            context,
+        ),
+        inputs={"relations": stage("relations"), "context": stage("context")},
+        deadline=STAGE_DEADLINE_SECONDS["scrapedOSMRoutes"],
+    )
+    graph.add(
+        stage("lastStopRefs"),
+        network.generateLastStopRefs,
+        inputs={"scrapedRoutes": stage("scrapedOSMRoutes")},
+    )
+    graph.add(
+        stage("osmResults"),
+        lambda **inputs: analyzeOSMRelations(**inputs, network=network),
+        inputs={
+            "overpassResult": "overpassResult",
+            "scrapedOSMRoutes": stage("scrapedOSMRoutes"),
+            "apiResults": stage("apiResults"),
+            "gtfsStops": stage("gtfsStops"),
+            "gtfsPatterns": stage("gtfsPatterns"),
+            "gtfsShapes": stage("gtfsShapes"),
+            "lastStopRefs": stage("lastStopRefs"),
+            "context": stage("context"),
+        },
+    )
+    addReportStages(
+        graph,
+        network,
+        wtpLinksAfter=["homepage", "scrapedOSMRoutes"],
+        outputOptions=outputOptions,
+    )
+
+
+def processData(
+    networks: list[TransitNetwork],
+    *,
+    outputOptions: OutputOptions,
+    profiler: PipelineProfiler | None = None,
+    # local stand-in for Overpass, e.g. in the synthetic network benchmark
+    downloadRelations: Callable[[list[int]], OverpassResult] | None = None,
+    # replays keep the time of the recorded run
+    startTime: datetime | None = None,
+    # snapshots record or replay every response of the run
+    transport: BaseTransport | None = None,
+    offline: bool = False,
+) -> dict[str, Any]:
+    graph = StageGraph(profiler.stage if profiler is not None else None)
+    # per run, the daemon calls processData many times in one process
+    graph.add("startTime", lambda: startTime or datetime.now(UTC))
+    graph.add(
+        "env",
+        lambda: templateEnvironment(Path(outputOptions.cacheDirectory, "jinja")),
+    )
+    # one Overpass download for all networks, their stages are prefixed
+    # with the network name and run concurrently,
+    # wall-clock time is the critical path through Overpass and operator scraping
+    graph.add(
+        "overpassResult",
+        lambda: (downloadRelations or downloadNetworkRelations)(
+            [network.rootRelationId for network in networks],
+        ),
+        deadline=STAGE_DEADLINE_SECONDS["overpassResult"],
+    )
+    # metrics and fallbacks of this run only, stages get it through the graph
+    with (
+        startRun(RunState(transport, offline=offline)) as run,
+        # shared connection pool for scraping all networks
+        httpxClient(run) as httpClient,
+    ):
+        for network in networks:
+            addNetworkStages(graph, network, httpClient, outputOptions=outputOptions)
+        # cProfile can't profile several threads at once on Python 3.12+
+        results = graph.run(
+            maxWorkers=1 if profiler is not None and profiler.deterministic else 8,
+        )
+    for stageName, seconds in graph.durations.items():
+        run.metrics.setGauge("stage_duration_seconds", seconds, stage=stageName)
+    results["metricsSummary"] = writeMetrics(
+        run.metrics, outputOptions.metricsDirectory
+    )
+    return results
+
+
+def recordSnapshotRun(
+    networks: list[TransitNetwork],
+    snapshotPath: Path,
+    *,
+    outputOptions: OutputOptions,
+) -> dict[str, Any]:
+    # every HTTP response of the run, including Overpass and API UM, goes to the snapshot
+    with recordingSnapshot() as transport:
+        results = processData(
+            networks,
+            outputOptions=outputOptions,
+            transport=transport,
+        )
+    writeSnapshot(snapshotPath, transport, networks, results["startTime"])
+    return results
+
+
+def replaySnapshotRun(
+    snapshotPath: Path,
+    *,
+    outputOptions: OutputOptions,
+) -> dict[str, Any]:
+    # output and history of replays go next to the snapshot, not over the real ones
+    replayDirectory = snapshotPath.with_suffix("")
+    with openSnapshot(snapshotPath) as snapshot:
+        networks = [
+            dataclasses.replace(
+                NETWORKS[name],
+                outputDirectory=replayDirectory / NETWORKS[name].outputDirectory.name,
+            )
+            for name in snapshot.networkNames
+        ]
+        checkGTFSFeeds(snapshot, networks)
+        return processData(
+            networks,
+            outputOptions=dataclasses.replace(
+                outputOptions,
+                historyDatabasePath=replayDirectory / "history.sqlite",
+                metricsDirectory=replayDirectory / "metrics",
             ),
+            startTime=snapshot.startTime,
+            transport=snapshot.transport,
+            offline=True,
         )
-    with Path(outputDirectory, "stops.html").open("w") as f:
-        template = env.get_template("stops.j2")
-        f.write(
-            template.render(
-                farAwayStops=osmAndGTFSComparisonResult.farAwayStops,
-                stopDistanceThreshold=int(STOP_DISTANCE_THRESHOLD),
-                notUniqueOSMNames={
-                    ref: names for ref, names in osmRefToName.items() if len(names) > 1
-                },
-                notUniqueWTPNames={
-                    ref: names
-                    for ref, names in compareResults.operatorRefToName.items()
-                    if len(names) > 1
-                },
-                mismatchOSMNameRefRailway=sorted(mismatchOSMNameRefRailway),
-                mismatchOSMNameRefNonRailway=sorted(mismatchOSMNameRefNonRailway),
-                missingLastStopRefNames=sorted(wtpMissingLastStopRefNames),
-                missingName=missingName,
-                missingStopRef=missingStopRef,
-                missingRefsInOSM=[
-                    (ref, next(iter(compareResults.operatorRefToName[ref])))
-                    for ref in sorted(wtpStopRefs - allOSMRefs - set(MISSING_REF))
-                ],
-                unexpectedStopRef=unexpectedStopRef,
-                wtpStopMapping=wtpStopMapping,
-                osmStops=osmAndGTFSComparisonResult.osmStops,
-                gtfsStops=osmAndGTFSComparisonResult.gtfsStops,
-                osmStopRefsNotInGTFS=osmAndGTFSComparisonResult.osmStopRefsNotInGTFS,
-                gtfsStopRefsNotInOSM=osmAndGTFSComparisonResult.gtfsStopRefsNotInOSM,
-                **sharedContext,
+
+
+def checkSubset(
+    network: TransitNetwork,
+    routeRefs: list[str],
+    relationIds: list[int],
+    fragmentPath: Path,
+    *,
+    # the single route benchmark answers requests from fixtures
+    transport: BaseTransport | None = None,
+    offline: bool = False,
+) -> None:
+    with startRun(RunState(transport, offline=offline)):
+        startTime = datetime.now(UTC)
+        relationIds = sorted(
+            {
+                *relationIds,
+                *(
+                    relationId
+                    for routeRef in routeRefs
+                    for relationId in downloadRouteRelationIds(routeRef, network)
+                ),
+            },
+        )
+        if len(relationIds) == 0:
+            logging.error(f"❌ No relations found for {routeRefs}")
+            return
+        referenceData = loadReferenceData(network)
+        compareResult, context = checkRelations(relationIds, referenceData)
+        sys.stdout.write(
+            formatCheckResult(compareResult, context, partial=referenceData.partial),
+        )
+        fragmentPath.write_text(
+            renderCheckFragment(
+                templateEnvironment(Path(cacheDirectory, "jinja")),
+                compareResult,
+                context,
+                startTime=startTime.isoformat(timespec="seconds"),
+                partial=referenceData.partial,
             ),
         )
+        logging.info(f"📄 HTML fragment written to {fragmentPath}")
+
+
+def mergeShardResults(
+    network: TransitNetwork,
+    directory: Path,
+    shardCount: int,
+    startTime: datetime,
+    *,
+    outputOptions: OutputOptions,
+) -> dict[str, Any]:
+    stage = network.stageName
+    graph = StageGraph()
+    graph.add("startTime", lambda: startTime)
+    graph.add(
+        "env",
+        lambda: templateEnvironment(Path(outputOptions.cacheDirectory, "jinja")),
+    )
+    graph.add("merged", lambda: mergeShards(directory, shardCount))
+    graph.add(stage("osmResults"), lambda merged: merged[0], inputs=["merged"])
+    graph.add(stage("context"), lambda merged: merged[1], inputs=["merged"])
+    graph.add(
+        stage("homepage"),
+        network.scrapeOperatorHomepage,
+        inputs={"context": stage("context")},
+        deadline=STAGE_DEADLINE_SECONDS["homepage"],
+    )
+    graph.add(stage("gtfsStops"), lambda: loadGTFSStops(network.gtfsFeed))
+    addReportStages(
+        graph,
+        network,
+        wtpLinksAfter=["homepage"],
+        outputOptions=outputOptions,
+    )
+    return graph.run()
+
+
+def runShardStep(
+    network: TransitNetwork,
+    step: str,
+    directory: Path,
+    shardCount: int,
+    shardIndex: int | None,
+    *,
+    outputOptions: OutputOptions,
+) -> None:
+    with startRun(RunState()):
+        if step == "prepare":
+            graph = StageGraph()
+            graph.add(
+                "overpassResult",
+                lambda: downloadNetworkRelations([network.rootRelationId]),
+                deadline=STAGE_DEADLINE_SECONDS["overpassResult"],
+            )
+            # fill GTFS caches once, before shard workers read them concurrently
+            addReferenceStages(graph, network)
+            results = graph.run()
+            prepareShards(
+                directory,
+                results["overpassResult"],
+                results[network.stageName("apiResults")],
+            )
+        elif step == "merge":
+            mergeShardResults(
+                network,
+                directory,
+                shardCount,
+                datetime.now(UTC),
+                outputOptions=outputOptions,
+            )
+        elif shardIndex is None:
+            message = f"--shard-index is required for step {step}"
+            raise ValueError(message)
+        elif step == "scrape":
+            runScrapeShard(directory, shardIndex, shardCount, network)
+        else:
+            runAnalyzeShard(
+                directory,
+                shardIndex,
+                shardCount,
+                network,
+                gtfsStops=loadGTFSStops(network.gtfsFeed),
+                gtfsPatterns=loadGTFSPatterns(network.gtfsFeed),
+                gtfsShapes=loadGTFSShapes(network.gtfsFeed),
+            )
+
+
+def runShardsLocally(
+    network: TransitNetwork,
+    directory: Path,
+    shardCount: int,
+    *,
+    outputOptions: OutputOptions,
+) -> None:
+    startTime = datetime.now(UTC)
+    runShardStep(
+        network,
+        "prepare",
+        directory,
+        shardCount,
+        shardIndex=None,
+        outputOptions=outputOptions,
+    )
+    for step in ["scrape", "analyze"]:
+        # separate processes stand in for nodes, a cluster runs the same commands
+        processes = [
+            subprocess.Popen(  # noqa: S603
+                [
+                    sys.executable,
+                    __file__,
+                    f"--network={network.name}",
+                    f"--shards={shardCount}",
+                    f"--shard-directory={directory}",
+                    f"--shard-step={step}",
+                    f"--shard-index={shardIndex}",
+                ],
+            )
+            for shardIndex in range(shardCount)
+        ]
+        for process in processes:
+            if process.wait() != 0:
+                message = f"Shard step {step} failed with code {process.returncode}"
+                raise RuntimeError(message)
+    mergeShardResults(
+        network,
+        directory,
+        shardCount,
+        startTime,
+        outputOptions=outputOptions,
+    )
 
 
 if __name__ == "__main__":
-    healthchecks("/start")
-    logging.info("🎬 Starting osm-wtp")
-    processData()
-    healthchecks()
+    arguments = parseArguments()
+    networks = [NETWORKS[name] for name in arguments.network or list(NETWORKS)]
+    outputOptions = OutputOptions(
+        splitOutput=arguments.split_output,
+        compressExports=arguments.compress_exports,
+        metricsDirectory=arguments.metrics_directory,
+    )
+    if arguments.changes is not None or arguments.timeline is not None:
+        printHistory(networks[0], arguments.changes, arguments.timeline)
+    elif len(arguments.route) > 0 or len(arguments.relation) > 0:
+        checkSubset(
+            networks[0],
+            arguments.route,
+            arguments.relation,
+            arguments.fragment,
+        )
+    elif arguments.shard_step is not None:
+        runShardStep(
+            networks[0],
+            arguments.shard_step,
+            arguments.shard_directory,
+            arguments.shards,
+            arguments.shard_index,
+            outputOptions=outputOptions,
+        )
+    elif arguments.shards > 1:
+        runShardsLocally(
+            networks[0],
+            arguments.shard_directory,
+            arguments.shards,
+            outputOptions=outputOptions,
+        )
+    elif arguments.replay_snapshot is not None:
+        logging.info(f"📼 Replaying {arguments.replay_snapshot}")
+        replaySnapshotRun(arguments.replay_snapshot, outputOptions=outputOptions)
+    elif arguments.serve:
+        from service.daemon import serve
+
+        logging.info("🎬 Starting osm-wtp service")
+        serve(
+            arguments.port,
+            networks[0],
+            refresh=lambda: processData(networks[:1], outputOptions=outputOptions),
+        )
+    else:
+        healthchecks("/start")
+        logging.info("🎬 Starting osm-wtp")
+        if arguments.profile is not None:
+            profiler = PipelineProfiler(
+                arguments.profile_directory,
+                deterministic=arguments.profile == "deterministic",
+            )
+            with profiler.profiling():
+                results = processData(
+                    networks,
+                    outputOptions=outputOptions,
+                    profiler=profiler,
+                )
+        elif arguments.record_snapshot is not None:
+            results = recordSnapshotRun(
+                networks,
+                arguments.record_snapshot,
+                outputOptions=outputOptions,
+            )
+        else:
+            results = processData(networks, outputOptions=outputOptions)
+        healthchecksWithSummary(results["metricsSummary"])
@@ -12,6 +12,14 @@ class GTFSStop(GeoPoint):
     name: StopName
 
 
+@dataclass(frozen=True)
+class StopDistanceDistribution:
+    count: int
+    percentiles: dict[int, int]
+    maximum: int
+    aboveThreshold: dict[int, int]
+
+
 @dataclass(frozen=True)
 class OSMAndGTFSComparisonResult:
     osmStops: dict[StopRef, OSMStop]
@@ -19,3 +27,6 @@ class OSMAndGTFSComparisonResult:
     osmStopRefsNotInGTFS: list[StopRef]
     gtfsStopRefsNotInOSM: list[StopRef]
     farAwayStops: list[tuple[StopRef, int]]
+    distanceDistribution: StopDistanceDistribution
+    nearestGTFSStops: dict[StopRef, tuple[StopRef, int]]
+    nearestOSMStops: dict[StopRef, tuple[StopRef, int]]
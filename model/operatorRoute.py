@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+
+from starsep_utils import Relation
+
+from gtfs.gtfsPatterns import GTFSPatternIndex
+from model.gtfs import GTFSStop
+from model.stopData import StopData
+from model.types import RouteRef, StopName, StopRef
+
+
+@dataclass(frozen=True)
+class OperatorRouteVariant:
+    # e.g. a variant from API UM Warszawa
+    routeRef: RouteRef
+    variantId: str
+    stopRefs: list[StopRef]
+
+
+OperatorRoutes = dict[RouteRef, list[OperatorRouteVariant]]
+
+
+@dataclass(frozen=True)
+class OperatorRouteResult:
+    # timetable page of a route variant linked from OSM
+    unavailable: bool
+    detour: bool
+    new: bool
+    short: bool
+    stops: list[StopData]
+    stopsDetour: list[bool]
+    stopsNew: list[bool]
+
+
+@dataclass(frozen=True)
+class ScrapedOSMRoute:
+    route: Relation
+    operatorResult: OperatorRouteResult
+    routeRef: str
+    link: str
+
+
+@dataclass(frozen=True)
+class LastStopRefsResult:
+    lastStopsRefsAfter: dict[tuple[str, str], str]
+    uniqueRefForName: dict[str, str]
+
+
+@dataclass(frozen=True)
+class LastStopQuery:
+    # operator pages don't link the last stop, only its name is known
+    routeRef: RouteRef
+    stops: list[StopData]
+    lastStopRefs: LastStopRefsResult
+    operatorRoutes: OperatorRoutes
+    gtfsStops: dict[StopRef, GTFSStop]
+    gtfsPatterns: GTFSPatternIndex
+
+    @property
+    def lastStopName(self) -> StopName:
+        return self.stops[-1].name
+
+    @property
+    def previousRef(self) -> StopRef:
+        return self.stops[-2].ref
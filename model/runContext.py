@@ -0,0 +1,83 @@
+from dataclasses import dataclass, field, fields
+
+from model.osm import OSMStop
+from model.types import StopName, StopRef
+
+WTPLinkTuple = tuple[str, str, str]
+
+
+@dataclass
+class RunContext:
+    # OSM relation analysis
+    allOSMRefs: set[StopRef] = field(default_factory=set)
+    disusedStop: set[str] = field(default_factory=set)
+    missingName: set[str] = field(default_factory=set)
+    missingRouteUrl: set[tuple[str, str]] = field(default_factory=set)
+    missingStopRef: set[tuple[str, str]] = field(default_factory=set)
+    unexpectedLink: set[tuple[str, str]] = field(default_factory=set)
+    unexpectedNetwork: set[tuple[str, str]] = field(default_factory=set)
+    unexpectedStopRef: set[tuple[str, str]] = field(default_factory=set)
+    invalidOperatorVariants: set[tuple[str, str]] = field(default_factory=set)
+    osmOperatorLinks: set[WTPLinkTuple] = field(default_factory=set)
+    wtpLinkDuplicates: set[WTPLinkTuple] = field(default_factory=set)
+    mismatchOSMNameRefNonRailway: set[tuple[str, str, str]] = field(
+        default_factory=set,
+    )
+    mismatchOSMNameRefRailway: set[tuple[str, str, str]] = field(default_factory=set)
+    osmRefToName: dict[StopRef, set[StopName]] = field(default_factory=dict)
+    osmStopsWithLocation: dict[StopRef, OSMStop] = field(default_factory=dict)
+    # refs whose location comes from a stop member, those win over platforms
+    osmStopRefsLocatedByStop: set[StopRef] = field(default_factory=set)
+    # WTP scraping
+    wtpSeenLinks: set[WTPLinkTuple] = field(default_factory=set)
+    wtpStopRefs: set[StopRef] = field(default_factory=set)
+    wtpMissingLastStop: set[str] = field(default_factory=set)
+    wtpManyLastStops: set[tuple[str, str]] = field(default_factory=set)
+    wtpMissingLastStopRefNames: set[tuple[str, str]] = field(default_factory=set)
+
+    def addOSMRefName(self, ref: StopRef, name: StopName) -> None:
+        if ref not in self.osmRefToName:
+            self.osmRefToName[ref] = set()
+        self.osmRefToName[ref].add(name)
+
+    def addOSMStopLocation(self, stop: OSMStop, *, fromStop: bool) -> None:
+        # prefer stop to platform, then the lowest id, so the choice
+        # doesn't depend on the order in which relations are processed
+        current = self.osmStopsWithLocation.get(stop.ref)
+        if current is not None and (not fromStop, stop.osmType, stop.osmId) >= (
+            stop.ref not in self.osmStopRefsLocatedByStop,
+            current.osmType,
+            current.osmId,
+        ):
+            return
+        self.osmStopsWithLocation[stop.ref] = stop
+        if fromStop:
+            self.osmStopRefsLocatedByStop.add(stop.ref)
+
+    def addOSMOperatorLink(self, link: WTPLinkTuple) -> None:
+        if link in self.osmOperatorLinks:
+            self.wtpLinkDuplicates.add(link)
+        self.osmOperatorLinks.add(link)
+
+    def merge(self, other: "RunContext") -> None:
+        # shards see disjoint relations, so a link present in both is a duplicate
+        self.wtpLinkDuplicates.update(self.osmOperatorLinks & other.osmOperatorLinks)
+        for ref, names in other.osmRefToName.items():
+            for name in names:
+                self.addOSMRefName(ref, name)
+        for ref, otherStop in other.osmStopsWithLocation.items():
+            self.addOSMStopLocation(
+                otherStop,
+                fromStop=ref in other.osmStopRefsLocatedByStop,
+            )
+        for contextField in fields(self):
+            value = getattr(self, contextField.name)
+            if isinstance(value, set):
+                value.update(getattr(other, contextField.name))
+
+
+def mergeRunContexts(contexts: list[RunContext]) -> RunContext:
+    result = RunContext()
+    for context in contexts:
+        result.merge(context)
+    return result
@@ -0,0 +1,49 @@
+from model.osm import OSMStop
+from model.runContext import RunContext, mergeRunContexts
+
+
+def _osmStop(osmId: int, osmType: str = "node") -> OSMStop:
+    return OSMStop(
+        ref="100101",
+        name="Kijowska 01",
+        lat=52.25,
+        lon=21.04,
+        osmId=osmId,
+        osmType=osmType,
+    )
+
+
+def testAddOSMStopLocationPrefersStops() -> None:
+    context = RunContext()
+    context.addOSMStopLocation(_osmStop(1, "way"), fromStop=False)
+    context.addOSMStopLocation(_osmStop(2), fromStop=True)
+    context.addOSMStopLocation(_osmStop(3, "way"), fromStop=False)
+    assert context.osmStopsWithLocation["100101"] == _osmStop(2)
+
+
+def testMergeRunContexts() -> None:
+    link = ("520", "A", "0")
+    first = RunContext()
+    first.addOSMOperatorLink(link)
+    first.addOSMRefName("100101", "Kijowska 01")
+    first.addOSMStopLocation(_osmStop(5), fromStop=True)
+    first.missingName.add("https://osm.org/node/1")
+    second = RunContext()
+    second.addOSMOperatorLink(link)
+    second.addOSMOperatorLink(("N14", "B", "1"))
+    second.addOSMRefName("100101", "Dworzec Wileński 01")
+    second.addOSMStopLocation(_osmStop(4), fromStop=True)
+    second.wtpSeenLinks.add(link)
+
+    for merged in [
+        mergeRunContexts([first, second]),
+        mergeRunContexts([second, first]),
+    ]:
+        assert merged.wtpLinkDuplicates == {link}
+        assert merged.osmOperatorLinks == {link, ("N14", "B", "1")}
+        assert merged.osmRefToName == {"100101": {"Kijowska 01", "Dworzec Wileński 01"}}
+        assert merged.osmStopsWithLocation == {"100101": _osmStop(4)}
+        assert merged.missingName == {"https://osm.org/node/1"}
+        assert merged.wtpSeenLinks == {link}
+    # inputs are left untouched
+    assert first.wtpLinkDuplicates == set()
@@ -0,0 +1,7 @@
+from network.transitNetwork import TransitNetwork
+from warsaw.network import warsawNetwork
+
+# new networks register their plugin here, the first one is the default
+NETWORKS: dict[str, TransitNetwork] = {
+    network.name: network for network in [warsawNetwork]
+}
@@ -0,0 +1,51 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from httpx import Client
+
+from gtfs.gtfsFeed import GTFSFeed
+from model.operatorRoute import (
+    LastStopQuery,
+    LastStopRefsResult,
+    OperatorRouteResult,
+    OperatorRoutes,
+    ScrapedOSMRoute,
+)
+from model.runContext import RunContext, WTPLinkTuple
+from model.stopData import StopData
+from model.types import StopRef
+
+
+@dataclass(frozen=True)
+class TransitNetwork:
+    # used in stage names, cache names and --network
+    name: str
+    rootRelationId: int
+    # network tag of routes and stops checked by this plugin
+    osmNetwork: str
+    # other operators' routes which are members of the root relation
+    ignoredOSMNetworks: list[str]
+    ignoredOperatorWikidata: list[str]
+    gtfsFeed: GTFSFeed
+    outputDirectory: Path
+    operatorDomain: str
+    # operator timetable link <=> hashable tuple stored in the run context
+    parseOperatorLink: Callable[[str], WTPLinkTuple | None]
+    operatorLinkUrl: Callable[[WTPLinkTuple], str]
+    # operator links which should be linked from some OSM relation
+    isOperatorLinkExpected: Callable[[WTPLinkTuple], bool]
+    scrapeOperatorRoute: Callable[[str, Client, RunContext], OperatorRouteResult | None]
+    scrapeOperatorHomepage: Callable[[RunContext], None]
+    fetchOperatorRoutes: Callable[[], OperatorRoutes]
+    operatorStopMapping: dict[StopData, StopData]
+    mapOperatorStop: Callable[[StopData], StopData]
+    generateLastStopRefs: Callable[[list[ScrapedOSMRoute]], LastStopRefsResult]
+    lastStopRef: Callable[[LastStopQuery], StopRef]
+
+    @property
+    def stopRefLength(self) -> int:
+        return self.gtfsFeed.stopRefLength
+
+    def stageName(self, stage: str) -> str:
+        return f"{self.name}.{stage}"
@@ -1,26 +1,35 @@
-import asyncio
 import dataclasses
 import logging
 from dataclasses import dataclass
 from typing import cast
 
+import httpx
 from httpx import Client
 from starsep_utils import (
     Element,
+    GeoPoint,
     Node,
     OverpassResult,
     Relation,
     Way,
-    downloadOverpassData,
     logDuration,
 )
-from tqdm import tqdm
 
-from configuration import ENABLE_TRAIN, OVERPASS_URL
+from configuration import ENABLE_TRAIN
+from gtfs.gtfsPatterns import GTFSPatternIndex
+from gtfs.gtfsShapes import GTFSShapes
 from model.gtfs import GTFSStop
+from model.operatorRoute import (
+    LastStopQuery,
+    LastStopRefsResult,
+    OperatorRoutes,
+    ScrapedOSMRoute,
+)
 from model.osm import OSMStop
+from model.runContext import RunContext
 from model.stopData import StopData
 from model.types import RouteRef, StopName, StopRef
+from network.transitNetwork import TransitNetwork
 from osm.osmErrors import (
     osmErrorAccessNo,
     osmErrorElementWithoutRoleWhichIsNotWay,
@@ -32,19 +41,16 @@ from osm.osmErrors import (
     osmErrorUnsplitRoundabout,
     osmErrorWayWithoutHighwayRailwayTag,
 )
-from scraper.httpx_client import httpxClient
-from warsaw.fetchApiRoutes import APIUMWarszawaRouteResult
-from warsaw.scrapedOSMRoute import ScrapedOSMRoute
-from warsaw.warsawConstants import KM_WIKIDATA, WARSAW_PUBLIC_TRANSPORT_ID, WKD_WIKIDATA
-from warsaw.wtpLastStopRefs import (
-    LastStopRefsResult,
-    generateLastStopRefs,
-    lastStopRef,
+from osm.overpass import (
+    downloadOverpassJson,
+    downloadOverpassResult,
+    parseOverpassJson,
+    relationsWithMembersQuery,
 )
-from warsaw.wtpScraper import WTPLink, mapWtpStop, scrapeLink, wtpDomain
-
-mismatchOSMNameRefNonRailway: set[tuple[str, str, str]] = set()
-mismatchOSMNameRefRailway: set[tuple[str, str, str]] = set()
+from osm.routeShape import validateRouteShape
+from osm.stopProximity import buildRouteSegmentIndex, checkStopsNearRoute
+from pipeline.lastKnownGood import OVERPASS_SOURCE, WTP_SOURCE, withLastKnownGood
+from pipeline.runState import currentRun
 
 
 def parseRef(tags: dict[str, str]) -> str | None:
@@ -63,15 +69,21 @@ def parseName(tags: dict[str, str]) -> StopName | None:
     return None
 
 
-def checkOSMNameMatchesRef(stop: StopData, url: str, *, railway: bool) -> None:
+def checkOSMNameMatchesRef(
+    stop: StopData,
+    url: str,
+    context: RunContext,
+    *,
+    railway: bool,
+) -> None:
     localRef = stop.ref[-2]
     nameSuffix = stop.name[-2]
     if localRef != nameSuffix:
         error = (stop.ref, stop.name, url)
         if railway:
-            mismatchOSMNameRefRailway.add(error)
+            context.mismatchOSMNameRefRailway.add(error)
         else:
-            mismatchOSMNameRefNonRailway.add(error)
+            context.mismatchOSMNameRefNonRailway.add(error)
 
 
 @dataclass(frozen=True)
@@ -92,27 +104,15 @@ class VariantResult:
     routeType: str
 
 
-allOSMRefs = set()
-disusedStop = set()
-manyLastStops = set()
-missingName = set()
-missingRouteUrl = set()
-missingStopRef = set()
-unexpectedLink = set()
-unexpectedNetwork = set()
-unexpectedStopRef = set()
-osmStopsWithLocation: dict[StopRef, OSMStop] = {}
-
-invalidOperatorVariants = set()
-osmOperatorLinks: set[tuple[str, str, str]] = set()
-wtpLinkDuplicates = set()
-
-osmRefToName: dict[StopRef, set[StopName]] = {}
-
 OSMResults = dict[RouteRef, list[VariantResult]]
 
 
-def _scrapeOSMRoute(route: Relation, httpClient: Client) -> ScrapedOSMRoute | None:
+def _scrapeOSMRoute(
+    route: Relation,
+    network: TransitNetwork,
+    httpClient: Client,
+    context: RunContext,
+) -> ScrapedOSMRoute | None:
     tags = route.tags
     routeRef = parseRef(tags)
     if (
@@ -125,58 +125,69 @@ def _scrapeOSMRoute(route: Relation, httpClient: Client) -> ScrapedOSMRoute | No
     ):
         return None
     if "network" in tags:
-        if tags["network"] in [
-            "Warszawska Kolej Dojazdowa",
-            "WKD",
-            "KM",
-            "Koleje Mazowieckie",
-        ]:
+        if tags["network"] in network.ignoredOSMNetworks:
             return None
-        if tags["network"] != "ZTM Warszawa":
-            unexpectedNetwork.add((route.url, tags["network"]))
+        if tags["network"] != network.osmNetwork:
+            context.unexpectedNetwork.add((route.url, tags["network"]))
     if "url" not in tags:
         if not (
             "operator:wikidata" in tags
-            and tags["operator:wikidata"] in [KM_WIKIDATA, WKD_WIKIDATA]
+            and tags["operator:wikidata"] in network.ignoredOperatorWikidata
         ):
-            missingRouteUrl.add((route.url, tags.get("name", "")))
+            context.missingRouteUrl.add((route.url, tags.get("name", "")))
         return None
     link = tags["url"]
-    if wtpDomain not in link:
-        unexpectedLink.add((route.url, link))
+    if network.operatorDomain not in link:
+        context.unexpectedLink.add((route.url, link))
         return None
-    parsedLink = WTPLink.parseWTPRouteLink(link)
+    parsedLink = network.parseOperatorLink(link)
     if parsedLink is not None:
-        parsedLinkTuple = parsedLink.toTuple()
-        if parsedLinkTuple in osmOperatorLinks:
-            wtpLinkDuplicates.add(WTPLink.fromTuple(parsedLinkTuple).url())
-        osmOperatorLinks.add(parsedLinkTuple)
-    scrapingResult = scrapeLink(link, httpClient=httpClient)
+        context.addOSMOperatorLink(parsedLink)
+    scrapingResult = network.scrapeOperatorRoute(link, httpClient, context)
     if (
         scrapingResult is None
         or scrapingResult.unavailable
         or len(scrapingResult.stops) == 0
     ):
-        invalidOperatorVariants.add((link, route.url))
+        context.invalidOperatorVariants.add((link, route.url))
         return None
     return ScrapedOSMRoute(
         route=route,
-        wtpResult=scrapingResult,
+        operatorResult=scrapingResult,
         routeRef=routeRef,
         link=link,
     )
 
 
 @logDuration
-def scrapeOSMRoutes(overpassResult: OverpassResult) -> list[ScrapedOSMRoute]:
-    logging.info("🔧 Scraping WTP Routes")
+def scrapeOSMRoutes(
+    relations: list[Relation],
+    network: TransitNetwork,
+    httpClient: Client,
+    context: RunContext,
+) -> list[ScrapedOSMRoute]:
+    from tqdm import tqdm  # noqa: PLC0415
+
+    logging.info(f"🔧 Scraping {network.name} operator routes")
     result = []
-
-    with httpxClient() as httpClient:
-        for route in tqdm(overpassResult.relations.values()):
-            scrapedOSMRoute = _scrapeOSMRoute(route, httpClient=httpClient)
-            if scrapedOSMRoute is not None:
-                result.append(scrapedOSMRoute)
+    for route in tqdm(relations):
+        try:
+            scrapedOSMRoute = _scrapeOSMRoute(
+                route,
+                network=network,
+                httpClient=httpClient,
+                context=context,
+            )
+        except httpx.HTTPError as error:
+            # neither a fresh nor a cached page, the route is left out of this run,
+            # with an open circuit every remaining route fails the same way
+            logging.warning(f"⚠️ Skipping {route.url}: {error}")
+            currentRun().staleData.addMissing(
+                WTP_SOURCE, parseRef(route.tags) or route.url
+            )
+            continue
+        if scrapedOSMRoute is not None:
+            result.append(scrapedOSMRoute)
     return result
 
 
@@ -184,67 +195,134 @@ def scrapeOSMRoutes(overpassResult: OverpassResult) -> list[ScrapedOSMRoute]:
 def addLastStopRefs(
     scrapedRoutes: list[ScrapedOSMRoute],
     lastStopRefsResult: LastStopRefsResult,
-    apiResults: dict[RouteRef, list[APIUMWarszawaRouteResult]],
+    apiResults: OperatorRoutes,
     gtfsStops: dict[StopRef, GTFSStop],
+    gtfsPatterns: GTFSPatternIndex,
+    network: TransitNetwork,
 ) -> None:
     for route in scrapedRoutes:
-        route.wtpResult.stops[-1] = StopData(
-            ref=lastStopRef(
-                route.wtpResult.stops[-1].name,
-                route.wtpResult.stops[-2].ref,
-                lastStopRefsResult,
-                route.routeRef,
-                route.wtpResult.stops,
-                apiResults,
-                gtfsStops,
+        stops = route.operatorResult.stops
+        stops[-1] = StopData(
+            ref=network.lastStopRef(
+                LastStopQuery(
+                    routeRef=route.routeRef,
+                    stops=stops,
+                    lastStopRefs=lastStopRefsResult,
+                    operatorRoutes=apiResults,
+                    gtfsStops=gtfsStops,
+                    gtfsPatterns=gtfsPatterns,
+                ),
             ),
-            name=route.wtpResult.stops[-1].name,
+            name=stops[-1].name,
         )
 
 
-def mapWtpStops(routes: list[ScrapedOSMRoute]) -> list[ScrapedOSMRoute]:
+def mapOperatorStops(
+    routes: list[ScrapedOSMRoute],
+    network: TransitNetwork,
+) -> list[ScrapedOSMRoute]:
     return [
         dataclasses.replace(
             route,
-            wtpResult=dataclasses.replace(
-                route.wtpResult,
-                stops=[mapWtpStop(stop) for stop in route.wtpResult.stops],
+            operatorResult=dataclasses.replace(
+                route.operatorResult,
+                stops=[
+                    network.mapOperatorStop(stop) for stop in route.operatorResult.stops
+                ],
             ),
         )
         for route in routes
     ]
 
 
+def downloadOSMRelations(relationIds: list[int]) -> OverpassResult:
+    return downloadOverpassResult(relationsWithMembersQuery(relationIds))
+
+
+def downloadNetworkRelations(rootRelationIds: list[int]) -> OverpassResult:
+    # whole networks, the last successful download stands in when Overpass fails
+    return withLastKnownGood(
+        currentRun(),
+        OVERPASS_SOURCE,
+        f"overpass-{'-'.join(map(str, sorted(rootRelationIds)))}.json",
+        lambda: downloadOverpassJson(relationsWithMembersQuery(rootRelationIds)),
+        parseOverpassJson,
+    )
+
+
+def networkRelations(
+    overpassResult: OverpassResult,
+    rootRelationId: int,
+) -> list[Relation]:
+    # relations reachable from the root, one download can hold several networks
+    reachable = set()
+    pending = [rootRelationId]
+    while len(pending) > 0:
+        relationId = pending.pop()
+        if relationId in reachable or relationId not in overpassResult.relations:
+            continue
+        reachable.add(relationId)
+        pending.extend(
+            member.id
+            for member in overpassResult.relations[relationId].members
+            if member.type == "relation"
+        )
+    return [
+        relation
+        for relation in overpassResult.relations.values()
+        if relation.id in reachable
+    ]
+
+
 @logDuration
 def analyzeOSMRelations(
-    apiResults: dict[RouteRef, list[APIUMWarszawaRouteResult]],
+    overpassResult: OverpassResult,
+    scrapedOSMRoutes: list[ScrapedOSMRoute],
+    apiResults: OperatorRoutes,
     gtfsStops: dict[StopRef, GTFSStop],
+    gtfsPatterns: GTFSPatternIndex,
+    gtfsShapes: GTFSShapes,
+    lastStopRefs: LastStopRefsResult,
+    network: TransitNetwork,
+    context: RunContext,
 ) -> OSMResults:
+    from tqdm import tqdm  # noqa: PLC0415
+
     logging.info("🔍 Starting analyzeOSMRelations")
+    currentRun().metrics.increment(
+        "relations_analyzed_total",
+        len(scrapedOSMRoutes),
+        network=network.name,
+    )
     results: OSMResults = {}
-    query = f"""
-    (
-        relation(id:{WARSAW_PUBLIC_TRANSPORT_ID});
-    );
-    (._;>>;);
-    out body;
-    """
-    overpassResult = asyncio.run(
-        downloadOverpassData(query=query, overpassUrl=OVERPASS_URL),
+    addLastStopRefs(
+        scrapedOSMRoutes,
+        lastStopRefs,
+        apiResults,
+        gtfsStops,
+        gtfsPatterns,
+        network,
+    )
+    scrapedOSMRoutes = mapOperatorStops(scrapedOSMRoutes, network)
+    routeSegmentIndex = buildRouteSegmentIndex(
+        overpassResult,
+        wayIds={
+            member.id
+            for scrapedRoute in scrapedOSMRoutes
+            for member in scrapedRoute.route.members
+            if member.type == "way" and len(member.role) == 0
+        },
     )
-    scrapedOSMRoutes = scrapeOSMRoutes(overpassResult)
-    lastStopRefs = generateLastStopRefs(scrapedRoutes=scrapedOSMRoutes)
-    addLastStopRefs(scrapedOSMRoutes, lastStopRefs, apiResults, gtfsStops)
-    scrapedOSMRoutes = mapWtpStops(scrapedOSMRoutes)
     for scrapedRoute in tqdm(scrapedOSMRoutes):
         route = scrapedRoute.route
         routeRef = scrapedRoute.routeRef
         link = scrapedRoute.link
-        scrapingResult = scrapedRoute.wtpResult
+        scrapingResult = scrapedRoute.operatorResult
         osmStops = []
         unknownRoles = set()
         otherErrors: set[str] = set()
         stopNodes: set[Node] = set()
+        stopCenters: list[tuple[StopData, GeoPoint]] = []
         routeWays: list[Element] = []
         for member in route.members:
             role: str = member.role
@@ -256,46 +334,51 @@ def analyzeOSMRelations(
                 element = overpassResult.resolve(member)
                 for tag in element.tags:
                     if "disused" in tag:
-                        disusedStop.add(element.url)
+                        context.disusedStop.add(element.url)
                 osmStopRef = parseRef(tags)
                 osmStopName = parseName(tags)
                 if osmStopName is None:
                     if not ("railway" in tags and tags["railway"] == "platform"):
-                        missingName.add(element.url)
+                        context.missingName.add(element.url)
                     if osmStopRef is None:
-                        missingStopRef.add((element.url, ""))
+                        context.missingStopRef.add((element.url, ""))
                     continue
                 if osmStopRef is None:
-                    missingStopRef.add((element.url, osmStopName))
+                    context.missingStopRef.add((element.url, osmStopName))
                     continue
-                if len(osmStopRef) != 6:
-                    if "network" in tags and tags["network"] == "ZTM Warszawa":
-                        unexpectedStopRef.add((element.url, osmStopRef))
+                if len(osmStopRef) != network.stopRefLength:
+                    if "network" in tags and tags["network"] == network.osmNetwork:
+                        context.unexpectedStopRef.add((element.url, osmStopRef))
                     continue
-                if osmStopRef not in osmRefToName:
-                    osmRefToName[osmStopRef] = set()
-                osmRefToName[osmStopRef].add(osmStopName)
+                context.addOSMRefName(osmStopRef, osmStopName)
                 stop = StopData(name=osmStopName, ref=osmStopRef)
-                checkOSMNameMatchesRef(stop, element.url, railway="railway" in tags)
-                # prefer stop to platform
-                if osmStopRef not in osmStopsWithLocation or role == "stop":
-                    if isinstance(element, Relation):
-                        logging.warning(f"Unsupported stop relation: {element.id}")
-                        center = None
-                    else:
-                        center = element.center(overpassResult)
-                    if center is not None:
-                        osmStopsWithLocation[osmStopRef] = OSMStop(
+                checkOSMNameMatchesRef(
+                    stop,
+                    element.url,
+                    context,
+                    railway="railway" in tags,
+                )
+                if isinstance(element, Relation):
+                    logging.warning(f"Unsupported stop relation: {element.id}")
+                    center = None
+                else:
+                    center = element.center(overpassResult)
+                    stopCenters.append((stop, center))
+                if center is not None:
+                    context.addOSMStopLocation(
+                        OSMStop(
                             ref=osmStopRef,
                             name=osmStopName,
                             lat=center.lat,
                             lon=center.lon,
                             osmId=element.id,
                             osmType=member.type,
-                        )
+                        ),
+                        fromStop=role == "stop",
+                    )
                 if len(osmStops) == 0 or osmStops[-1].ref != stop.ref:
                     osmStops.append(stop)
-                    allOSMRefs.add(stop.ref)
+                    context.allOSMRefs.add(stop.ref)
                 if role.startswith("stop"):
                     if element.type != "node":
                         otherErrors.add(osmErrorStopNotBeingNode())
@@ -304,6 +387,24 @@ def analyzeOSMRelations(
             elif len(role) > 0:
                 unknownRoles.add(role)
         validateRoute(routeWays, stopNodes, otherErrors, overpassResult)
+        checkStopsNearRoute(
+            stops=stopCenters,
+            wayIds={way.id for way in routeWays if way.type == "way"},
+            routeSegmentIndex=routeSegmentIndex,
+            otherErrors=otherErrors,
+        )
+        validateRouteShape(
+            ways=[cast("Way", way) for way in routeWays if way.type == "way"],
+            routeRef=routeRef,
+            stopRefCandidates=[
+                [stop.ref for stop in scrapingResult.stops],
+                [stop.ref for stop in osmStops],
+            ],
+            otherErrors=otherErrors,
+            overpassResult=overpassResult,
+            gtfsPatterns=gtfsPatterns,
+            gtfsShapes=gtfsShapes,
+        )
         if routeRef not in results:
             results[routeRef] = []
         results[routeRef].append(
@@ -35,3 +35,17 @@ def osmErrorRouteHasGaps() -> OSMError:
 
 def osmErrorOnewayUsedWrongDirection(wayId: int) -> OSMError:
     return f"Jednokierunkowa droga używana pod prąd {wayId}"
+
+
+def osmErrorRouteFarFromGTFSShape(distance: int, *, capped: bool) -> OSMError:
+    if capped:
+        return f"Trasa odbiega od kształtu GTFS o ponad {distance} m"
+    return f"Trasa odbiega od kształtu GTFS o {distance} m"
+
+
+def osmErrorRouteOrderDiffersFromGTFSShape() -> OSMError:
+    return "Kolejność przejazdu trasy niezgodna z kształtem GTFS"
+
+
+def osmErrorStopFarFromRoute(name: str, ref: str, threshold: int) -> OSMError:
+    return f"{name} ({ref}) jest dalej niż {threshold} m od trasy"
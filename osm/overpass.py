@@ -0,0 +1,98 @@
+import json
+
+from starsep_utils import (
+    Node,
+    OverpassResult,
+    Relation,
+    RelationMember,
+    Way,
+    logDuration,
+)
+from starsep_utils.overpass import KeyDict
+
+from configuration import OVERPASS_URL, OVERPASS_USER_AGENT
+from pipeline.runState import currentRun
+from scraper.httpx_client import httpxClient
+
+OVERPASS_TIMEOUT_SECONDS = 250
+
+
+def relationsWithMembersQuery(relationIds: list[int]) -> str:
+    return f"""
+    (
+        relation(id:{",".join(map(str, relationIds))});
+    );
+    (._;>>;);
+    out body;
+    """
+
+
+def downloadOverpassJson(query: str) -> str:
+    # own client per download, starsep_utils shares one AsyncClient bound to
+    # the first event loop, which breaks repeated downloads in a long-running process
+    with (
+        logDuration("Downloading data from Overpass"),
+        httpxClient(currentRun()) as httpClient,
+    ):
+        response = httpClient.post(
+            OVERPASS_URL,
+            data={"data": f"[out:json][timeout:{OVERPASS_TIMEOUT_SECONDS}];\n{query}"},
+            timeout=OVERPASS_TIMEOUT_SECONDS + 30,
+            headers={"User-Agent": OVERPASS_USER_AGENT},
+        )
+        response.raise_for_status()
+    return response.text
+
+
+def _parseOverpassElements(elements: list[dict]) -> OverpassResult:
+    nodes, ways, relations = {}, {}, {}
+    for element in elements:
+        elementId = element["id"]
+        elementType = element["type"]
+        tags = KeyDict(element.get("tags", {}))
+        if elementType == "node":
+            nodes[elementId] = Node(
+                id=elementId,
+                type=elementType,
+                lat=element["lat"],
+                lon=element["lon"],
+                tags=tags,
+            )
+        elif elementType == "way":
+            ways[elementId] = Way(
+                id=elementId,
+                type=elementType,
+                nodes=element["nodes"],
+                tags=tags,
+            )
+        elif elementType == "relation":
+            relations[elementId] = Relation(
+                id=elementId,
+                type=elementType,
+                members=[
+                    RelationMember(
+                        type=member["type"],
+                        id=member["ref"],
+                        role=member["role"],
+                    )
+                    for member in element["members"]
+                ],
+                tags=tags,
+            )
+    return OverpassResult(nodes=nodes, ways=ways, relations=relations)
+
+
+def parseOverpassJson(text: str) -> OverpassResult:
+    with logDuration("Parsing Overpass JSON"):
+        data = json.loads(text)
+    # a query which timed out on the server is a successful response with partial data
+    remark = data.get("remark", "")
+    if remark.startswith("runtime error"):
+        message = f"Overpass query failed: {remark}"
+        raise ValueError(message)
+    with logDuration("Building Overpass elements"):
+        return _parseOverpassElements(data["elements"])
+
+
+def downloadOverpassResult(query: str) -> OverpassResult:
+    return parseOverpassJson(downloadOverpassJson(query))
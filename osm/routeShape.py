@@ -0,0 +1,106 @@
+from math import hypot
+
+from starsep_utils import GeoPoint, OverpassResult, Way
+
+from configuration import ROUTE_SHAPE_TOLERANCE
+from geometry.polyline import (
+    Point,
+    densify,
+    discreteFrechetWithin,
+    hausdorffDistance,
+)
+from geometry.projection import localProjection
+from gtfs.gtfsPatterns import GTFSPatternIndex
+from gtfs.gtfsShapes import GTFSShapes
+from model.types import RouteRef, StopRef
+from osm.osmErrors import (
+    osmErrorRouteFarFromGTFSShape,
+    osmErrorRouteOrderDiffersFromGTFSShape,
+)
+
+ROUTE_SHAPE_STEP = 25.0  # metres between densified points
+ROUTE_SHAPE_MAX_DISTANCE = 1000.0  # metres, larger deviations aren't measured exactly
+
+
+def routePolyline(ways: list[Way], overpassResult: OverpassResult) -> list[GeoPoint]:
+    nodeIds: list[int] = []
+    for i, way in enumerate(ways):
+        wayNodeIds = way.nodes
+        if i == 0:
+            if len(ways) > 1 and wayNodeIds[0] in (ways[1].nodes[0], ways[1].nodes[-1]):
+                wayNodeIds = wayNodeIds[::-1]
+        elif wayNodeIds[-1] == nodeIds[-1]:
+            wayNodeIds = wayNodeIds[::-1]
+        if len(nodeIds) > 0 and wayNodeIds[0] == nodeIds[-1]:
+            wayNodeIds = wayNodeIds[1:]
+        nodeIds.extend(wayNodeIds)
+    return [overpassResult.nodes[nodeId] for nodeId in nodeIds]
+
+
+def trimToShapeEnds(routePoints: list[Point], shapePoints: list[Point]) -> list[Point]:
+    # GTFS shapes run between first and last stop, while route ways usually go further
+    def closeIndices(point: Point) -> list[int]:
+        return [
+            i
+            for i, (x, y) in enumerate(routePoints)
+            if hypot(x - point[0], y - point[1]) <= ROUTE_SHAPE_TOLERANCE
+        ]
+
+    startIndices = closeIndices(shapePoints[0])
+    endIndices = closeIndices(shapePoints[-1])
+    start = startIndices[0] if len(startIndices) > 0 else 0
+    end = endIndices[-1] if len(endIndices) > 0 else len(routePoints) - 1
+    if end <= start:
+        return routePoints
+    return routePoints[start : end + 1]
+
+
+def validateRouteShape(
+    ways: list[Way],
+    routeRef: RouteRef,
+    stopRefCandidates: list[list[StopRef]],
+    otherErrors: set[str],
+    overpassResult: OverpassResult,
+    gtfsPatterns: GTFSPatternIndex,
+    gtfsShapes: GTFSShapes,
+) -> None:
+    shape = None
+    for stopRefs in stopRefCandidates:
+        pattern = gtfsPatterns.findPattern(routeRef, stopRefs)
+        if pattern is not None:
+            shape = gtfsShapes.shape(pattern.shapeId)
+            break
+    if shape is None or len(shape) == 0 or len(ways) == 0:
+        return
+    projection = localProjection(originLat=shape[0].lat, originLon=shape[0].lon)
+    shapePoints = [projection.project(point) for point in shape]
+    routePoints = trimToShapeEnds(
+        densify(
+            [
+                projection.project(point)
+                for point in routePolyline(ways, overpassResult)
+            ],
+            ROUTE_SHAPE_STEP,
+        ),
+        shapePoints,
+    )
+    distance = hausdorffDistance(
+        routePoints,
+        shapePoints,
+        step=ROUTE_SHAPE_STEP,
+        maxDistance=ROUTE_SHAPE_MAX_DISTANCE,
+    )
+    if distance > ROUTE_SHAPE_TOLERANCE:
+        otherErrors.add(
+            osmErrorRouteFarFromGTFSShape(
+                round(distance),
+                capped=distance >= ROUTE_SHAPE_MAX_DISTANCE,
+            ),
+        )
+    # Hausdorff doesn't see the order, e.g. a loop driven in the opposite direction
+    elif not discreteFrechetWithin(
+        routePoints,
+        densify(shapePoints, ROUTE_SHAPE_STEP),
+        ROUTE_SHAPE_TOLERANCE + ROUTE_SHAPE_STEP,
+    ):
+        otherErrors.add(osmErrorRouteOrderDiffersFromGTFSShape())
@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from itertools import pairwise
+
+from starsep_utils import GeoPoint, OverpassResult
+
+from configuration import STOP_ROUTE_DISTANCE_THRESHOLD
+from geometry.gridIndex import SegmentGridIndex
+from geometry.projection import LocalProjection, projectionFor
+from model.stopData import StopData
+from osm.osmErrors import osmErrorStopFarFromRoute
+
+ROUTE_SEGMENT_CELL_SIZE = 100.0  # metres
+
+
+@dataclass(frozen=True)
+class RouteSegmentIndex:
+    projection: LocalProjection
+    segments: SegmentGridIndex[int]
+
+
+def buildRouteSegmentIndex(
+    overpassResult: OverpassResult,
+    wayIds: set[int],
+) -> RouteSegmentIndex:
+    # every way is indexed once, variants sharing it only filter by way id
+    ways = [overpassResult.ways[wayId] for wayId in wayIds]
+    projection = projectionFor(
+        [overpassResult.nodes[way.nodes[0]] for way in ways if len(way.nodes) > 0],
+    )
+    segments: SegmentGridIndex[int] = SegmentGridIndex(
+        cellSize=ROUTE_SEGMENT_CELL_SIZE,
+    )
+    for way in ways:
+        points = [projection.project(overpassResult.nodes[node]) for node in way.nodes]
+        for start, end in pairwise(points):
+            segments.insert((*start, *end), way.id)
+    return RouteSegmentIndex(projection=projection, segments=segments)
+
+
+def checkStopsNearRoute(
+    stops: list[tuple[StopData, GeoPoint]],
+    wayIds: set[int],
+    routeSegmentIndex: RouteSegmentIndex,
+    otherErrors: set[str],
+) -> None:
+    if len(wayIds) == 0:
+        return
+    for stop, center in stops:
+        nearest = routeSegmentIndex.segments.nearest(
+            *routeSegmentIndex.projection.project(center),
+            maxDistance=STOP_ROUTE_DISTANCE_THRESHOLD,
+            accept=wayIds.__contains__,
+        )
+        if nearest is None:
+            otherErrors.add(
+                osmErrorStopFarFromRoute(
+                    stop.name,
+                    stop.ref,
+                    int(STOP_ROUTE_DISTANCE_THRESHOLD),
+                ),
+            )
@@ -0,0 +1,59 @@
+import json
+
+import httpx
+import pytest
+
+from configuration import OVERPASS_USER_AGENT
+from osm.overpass import downloadOverpassJson, parseOverpassJson
+from pipeline.runState import RunState, startRun
+
+OVERPASS_JSON = json.dumps(
+    {
+        "elements": [
+            {"type": "node", "id": 1, "lat": 52.2, "lon": 21.0},
+            {"type": "way", "id": 2, "nodes": [1], "tags": {"highway": "primary"}},
+            {
+                "type": "relation",
+                "id": 3,
+                "members": [
+                    {"type": "node", "ref": 1, "role": "stop"},
+                    {"type": "way", "ref": 2, "role": ""},
+                ],
+                "tags": {"type": "route", "ref": "520"},
+            },
+        ],
+    },
+)
+
+
+def testParseOverpassJson() -> None:
+    result = parseOverpassJson(OVERPASS_JSON)
+    assert result.nodes[1].lat == 52.2
+    assert result.ways[2].nodes == [1]
+    relation = result.relations[3]
+    assert relation.tags["ref"] == "520"
+    assert [(member.type, member.id) for member in relation.members] == [
+        ("node", 1),
+        ("way", 2),
+    ]
+    assert result.resolve(relation.members[0]) == result.nodes[1]
+    # tags of nodes are hashable, nodes are used as set members
+    assert len({result.nodes[1]}) == 1
+
+
+def testParseOverpassJsonRuntimeError() -> None:
+    text = json.dumps({"elements": [], "remark": "runtime error: Query timed out"})
+    with pytest.raises(ValueError, match="Query timed out"):
+        parseOverpassJson(text)
+
+
+def testDownloadOverpassJsonIdentifiesItself() -> None:
+    userAgents = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        userAgents.append(request.headers["User-Agent"])
+        return httpx.Response(200, text=OVERPASS_JSON)
+
+    with startRun(RunState(httpx.MockTransport(handler))):
+        assert downloadOverpassJson("out body;") == OVERPASS_JSON
+    assert userAgents == [OVERPASS_USER_AGENT]
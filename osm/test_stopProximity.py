@@ -0,0 +1,46 @@
+from starsep_utils import GeoPoint, Node, OverpassResult, Way
+
+from model.stopData import StopData
+from osm.stopProximity import buildRouteSegmentIndex, checkStopsNearRoute
+
+
+def _node(nodeId: int, lat: float, lon: float) -> Node:
+    return Node(id=nodeId, type="node", tags={}, lat=lat, lon=lon)
+
+
+OVERPASS_RESULT = OverpassResult(
+    nodes={
+        1: _node(1, 52.2300, 21.0000),
+        2: _node(2, 52.2300, 21.0100),
+        3: _node(3, 52.2400, 21.0100),
+    },
+    ways={
+        10: Way(id=10, type="way", tags={}, nodes=[1, 2]),
+        11: Way(id=11, type="way", tags={}, nodes=[2, 3]),
+    },
+    relations={},
+)
+NEAR_WAY_10 = (
+    StopData(name="Przystanek 01", ref="100101"),
+    GeoPoint(lat=52.2301, lon=21.0050),
+)
+NEAR_WAY_11 = (
+    StopData(name="Przystanek 02", ref="100102"),
+    GeoPoint(lat=52.2350, lon=21.0101),
+)
+
+
+def testCheckStopsNearRoute() -> None:
+    routeSegmentIndex = buildRouteSegmentIndex(OVERPASS_RESULT, wayIds={10, 11})
+
+    otherErrors: set[str] = set()
+    checkStopsNearRoute(
+        [NEAR_WAY_10, NEAR_WAY_11], {10, 11}, routeSegmentIndex, otherErrors
+    )
+    assert otherErrors == set()
+
+    # way 11 is indexed, but it isn't part of this variant
+    checkStopsNearRoute(
+        [NEAR_WAY_10, NEAR_WAY_11], {10}, routeSegmentIndex, otherErrors
+    )
+    assert otherErrors == {"Przystanek 02 (100102) jest dalej niż 30 m od trasy"}
@@ -0,0 +1,183 @@
+import argparse
+import sys
+from contextlib import closing
+from pathlib import Path
+
+from configuration import (
+    SERVICE_PORT,
+    cacheDirectory,
+    historyDatabasePath,
+    metricsDirectory,
+    outputDirectory,
+    profileDirectory,
+)
+from network.registry import NETWORKS
+from network.transitNetwork import TransitNetwork
+from pipeline.history import (
+    connectHistory,
+    problemChanges,
+    routeTimeline,
+)
+from pipeline.profiling import PROFILE_MODES
+from pipeline.shards import SHARD_STEPS
+
+
+def printHistory(
+    network: TransitNetwork,
+    changesBetween: list[int] | None,
+    timelineRef: str | None,
+) -> None:
+    with closing(connectHistory(historyDatabasePath)) as connection:
+        if changesBetween is not None:
+            changes = problemChanges(connection, *changesBetween)
+            for marker, problems in [("+", changes.new), ("-", changes.resolved)]:
+                for problem in problems:
+                    sys.stdout.write(
+                        f"{marker} {problem.kind} {problem.routeRef} "
+                        f"{problem.description}\n",
+                    )
+        if timelineRef is not None:
+            for entry in routeTimeline(connection, network.name, timelineRef):
+                sys.stdout.write(
+                    f"{entry.runId} {entry.startTime} "
+                    f"{entry.failingVariants}/{entry.variants}\n",
+                )
+
+
+def parseArguments(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare WTP routes with OSM")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="keep state in memory, refresh periodically and serve a local HTTP API",
+    )
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument(
+        "--metrics-directory",
+        type=Path,
+        default=metricsDirectory,
+        help="directory for metrics.prom and metrics.json, kept out of the output",
+    )
+    parser.add_argument(
+        "--network",
+        action="append",
+        choices=list(NETWORKS),
+        default=[],
+        help="check only this network, can be repeated, all networks when missing, "
+        "--serve, --route, --relation, --shards, --changes and --timeline "
+        "need exactly one",
+    )
+    parser.add_argument(
+        "--route",
+        action="append",
+        default=[],
+        help="check only relations of this route ref, can be repeated",
+    )
+    parser.add_argument(
+        "--relation",
+        action="append",
+        type=int,
+        default=[],
+        help="check only this relation id, can be repeated",
+    )
+    parser.add_argument(
+        "--fragment",
+        type=Path,
+        default=Path(outputDirectory, "check.html"),
+        help="HTML fragment written by --route/--relation",
+    )
+    parser.add_argument(
+        "--split-output",
+        action="store_true",
+        help="write a page per route with errors and link them from index.html",
+    )
+    parser.add_argument(
+        "--compress-exports",
+        action="store_true",
+        help="also write gzip compressed results.json.gz and stop-problems.geojson.gz",
+    )
+    parser.add_argument(
+        "--changes",
+        nargs=2,
+        type=int,
+        metavar=("FROM_RUN", "TO_RUN"),
+        help="print problems which are new or resolved between two runs from history",
+    )
+    parser.add_argument(
+        "--timeline",
+        metavar="ROUTE_REF",
+        help="print failing/all variants of a route in every run from history",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="sampling",
+        choices=PROFILE_MODES,
+        help="write per-stage collapsed stacks and hot functions to --profile-directory, "
+        "deterministic also runs stages one by one under cProfile",
+    )
+    parser.add_argument("--profile-directory", type=Path, default=profileDirectory)
+    parser.add_argument(
+        "--record-snapshot",
+        type=Path,
+        metavar="ARCHIVE",
+        help="also write every external input of the run to a zip archive",
+    )
+    parser.add_argument(
+        "--replay-snapshot",
+        type=Path,
+        metavar="ARCHIVE",
+        help="run without network access from a recorded archive, "
+        "output is written to a directory named like the archive",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="partition route relations by ref hash into this many shards",
+    )
+    parser.add_argument(
+        "--shard-step",
+        choices=SHARD_STEPS,
+        help="run one step of a sharded run, all steps run locally when missing",
+    )
+    parser.add_argument("--shard-index", type=int)
+    parser.add_argument(
+        "--shard-directory",
+        type=Path,
+        default=Path(cacheDirectory, "shards"),
+        help="directory shared by all shards for partial results",
+    )
+    arguments = parser.parse_args(argv)
+    # options of one kind of run can be combined, kinds of runs can't
+    runModes = {
+        "--route/--relation": len(arguments.route) > 0 or len(arguments.relation) > 0,
+        "--changes/--timeline": (
+            arguments.changes is not None or arguments.timeline is not None
+        ),
+        "--shards/--shard-step": (
+            arguments.shards > 1 or arguments.shard_step is not None
+        ),
+        "--serve": arguments.serve,
+        "--profile": arguments.profile is not None,
+        "--record-snapshot": arguments.record_snapshot is not None,
+        "--replay-snapshot": arguments.replay_snapshot is not None,
+    }
+    selectedModes = [name for name, selected in runModes.items() if selected]
+    if len(selectedModes) > 1:
+        parser.error(f"{', '.join(selectedModes)} can't be used together")
+    singleNetworkMode = any(
+        runModes[name]
+        for name in [
+            "--route/--relation",
+            "--changes/--timeline",
+            "--shards/--shard-step",
+            "--serve",
+        ]
+    )
+    if singleNetworkMode and len(set(arguments.network or NETWORKS)) > 1:
+        parser.error(
+            "--serve, --route, --relation, --shards, --changes and --timeline "
+            "need exactly one --network",
+        )
+    return arguments
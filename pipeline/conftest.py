@@ -0,0 +1,8 @@
+import pytest
+
+from pipeline.variantFixtures import VariantFactory, makeVariantResult
+
+
+@pytest.fixture
+def makeVariant() -> VariantFactory:
+    return makeVariantResult
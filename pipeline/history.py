@@ -0,0 +1,251 @@
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+
+from compare.comparator import CompareResult
+from model.gtfs import OSMAndGTFSComparisonResult
+from model.runContext import RunContext
+from pipeline.routeCheckReport import CONTEXT_ISSUES, contextIssues, missingRefsInOSM
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    network TEXT NOT NULL,
+    startTime TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runsByNetwork ON runs (network, id);
+CREATE TABLE IF NOT EXISTS variantResults (
+    runId INTEGER NOT NULL REFERENCES runs (id),
+    routeRef TEXT NOT NULL,
+    osmId INTEGER NOT NULL,
+    osmName TEXT NOT NULL,
+    mismatchedStops INTEGER NOT NULL,
+    otherErrors INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS variantResultsByRoute ON variantResults (routeRef, runId);
+CREATE TABLE IF NOT EXISTS problems (
+    runId INTEGER NOT NULL REFERENCES runs (id),
+    kind TEXT NOT NULL,
+    routeRef TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    description TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS problemsByRun ON problems (runId, kind, routeRef, subject);
+"""
+
+PROBLEM_KIND_TITLES = {
+    "stops": "Niezgodna lista przystanków",
+    "routeError": "Błąd trasy",
+    "farAway": "Przystanek oddalony od GTFS",
+    "notInGTFS": "Przystanek OSM brakujący w GTFS",
+    "notInOSM": "Przystanek GTFS brakujący w OSM",
+    "missingRefInOSM": "Ref WTP brakujący w OSM",
+    "notLinkedOperatorUrl": "Link WTP nielinkowany z żadnej relacji",
+    **{fieldName: title for title, fieldName in CONTEXT_ISSUES},
+}
+
+
+@dataclass(frozen=True, order=True)
+class Problem:
+    kind: str
+    routeRef: str
+    # identifies the problem between runs together with kind and routeRef
+    subject: str
+    description: str
+
+
+@dataclass(frozen=True)
+class ProblemChanges:
+    fromRunId: int | None
+    fromStartTime: str | None
+    toRunId: int
+    new: list[Problem]
+    resolved: list[Problem]
+
+
+@dataclass(frozen=True)
+class RouteTimelineEntry:
+    runId: int
+    startTime: str
+    variants: int
+    failingVariants: int
+
+
+def connectHistory(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # several networks record their runs concurrently
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.executescript(HISTORY_SCHEMA)
+    return connection
+
+
+def runProblems(
+    compareResults: CompareResult,
+    osmAndGTFSComparisonResult: OSMAndGTFSComparisonResult,
+    notLinkedWtpUrls: list[str],
+    context: RunContext,
+) -> list[Problem]:
+    problems = []
+    for ref, routeResult in compareResults.renderResults.items():
+        for variantResult in routeResult.variantResults:
+            variant = variantResult.variant
+            if any(row.color != "inherit" for row in variantResult.diffRows):
+                problems.append(
+                    Problem("stops", ref, str(variant.osmId), variant.osmName),
+                )
+            problems.extend(
+                Problem("routeError", ref, f"{variant.osmId} {error}", error)
+                for error in variantResult.otherErrors
+            )
+    osmStops = osmAndGTFSComparisonResult.osmStops
+    gtfsStops = osmAndGTFSComparisonResult.gtfsStops
+    problems.extend(
+        Problem("farAway", "", ref, f"{osmStops[ref].name} {distance} m")
+        for ref, distance in osmAndGTFSComparisonResult.farAwayStops
+    )
+    problems.extend(
+        Problem("notInGTFS", "", ref, osmStops[ref].name)
+        for ref in osmAndGTFSComparisonResult.osmStopRefsNotInGTFS
+    )
+    problems.extend(
+        Problem("notInOSM", "", ref, gtfsStops[ref].name)
+        for ref in osmAndGTFSComparisonResult.gtfsStopRefsNotInOSM
+    )
+    problems.extend(
+        Problem("missingRefInOSM", "", ref, name)
+        for ref, name in missingRefsInOSM(compareResults, context)
+    )
+    problems.extend(
+        Problem("notLinkedOperatorUrl", "", url, url) for url in notLinkedWtpUrls
+    )
+    fieldNames = dict(CONTEXT_ISSUES)
+    problems.extend(
+        Problem(fieldNames[title], "", value, value)
+        for title, values in contextIssues(context)
+        for value in values
+    )
+    # the same finding may be reported twice, e.g. by two variants
+    return sorted(set(problems))
+
+
+def recordRun(
+    connection: sqlite3.Connection,
+    network: str,
+    startTime: str,
+    compareResults: CompareResult,
+    problems: list[Problem],
+) -> int:
+    # one transaction per run, a few thousand rows with executemany
+    with connection:
+        cursor = connection.execute(
+            "INSERT INTO runs (network, startTime) VALUES (?, ?)",
+            (network, startTime),
+        )
+        runId = cursor.lastrowid
+        connection.executemany(
+            "INSERT INTO variantResults VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    runId,
+                    ref,
+                    variantResult.variant.osmId,
+                    variantResult.variant.osmName,
+                    sum(row.color != "inherit" for row in variantResult.diffRows),
+                    len(variantResult.otherErrors),
+                )
+                for ref, routeResult in compareResults.renderResults.items()
+                for variantResult in routeResult.variantResults
+            ],
+        )
+        connection.executemany(
+            "INSERT INTO problems VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    runId,
+                    problem.kind,
+                    problem.routeRef,
+                    problem.subject,
+                    problem.description,
+                )
+                for problem in problems
+            ],
+        )
+    return runId
+
+
+def previousRunId(
+    connection: sqlite3.Connection,
+    network: str,
+    runId: int,
+) -> int | None:
+    row = connection.execute(
+        "SELECT MAX(id) FROM runs WHERE network = ? AND id < ?",
+        (network, runId),
+    ).fetchone()
+    return row[0]
+
+
+def _problemsOnlyIn(
+    connection: sqlite3.Connection,
+    runId: int,
+    otherRunId: int | None,
+) -> list[Problem]:
+    rows = connection.execute(
+        """
+        SELECT kind, routeRef, subject, description FROM problems AS current
+        WHERE current.runId = ? AND NOT EXISTS (
+            SELECT 1 FROM problems AS other
+            WHERE other.runId = ?
+            AND other.kind = current.kind
+            AND other.routeRef = current.routeRef
+            AND other.subject = current.subject
+        )
+        ORDER BY kind, routeRef, subject
+        """,
+        (runId, otherRunId),
+    )
+    return [Problem(*row) for row in rows]
+
+
+def problemChanges(
+    connection: sqlite3.Connection,
+    fromRunId: int | None,
+    toRunId: int,
+) -> ProblemChanges:
+    # without a previous run every problem is new
+    row = connection.execute(
+        "SELECT startTime FROM runs WHERE id = ?",
+        (fromRunId,),
+    ).fetchone()
+    return ProblemChanges(
+        fromRunId=fromRunId,
+        fromStartTime=row[0] if row is not None else None,
+        toRunId=toRunId,
+        new=_problemsOnlyIn(connection, toRunId, fromRunId),
+        resolved=(
+            _problemsOnlyIn(connection, fromRunId, toRunId)
+            if fromRunId is not None
+            else []
+        ),
+    )
+
+
+def routeTimeline(
+    connection: sqlite3.Connection,
+    network: str,
+    routeRef: str,
+) -> list[RouteTimelineEntry]:
+    rows = connection.execute(
+        """
+        SELECT runs.id, runs.startTime, COUNT(*),
+            SUM(variantResults.mismatchedStops > 0 OR variantResults.otherErrors > 0)
+        FROM variantResults JOIN runs ON runs.id = variantResults.runId
+        WHERE variantResults.routeRef = ? AND runs.network = ?
+        GROUP BY runs.id
+        ORDER BY runs.id
+        """,
+        (routeRef, network),
+    )
+    return [RouteTimelineEntry(*row) for row in rows]
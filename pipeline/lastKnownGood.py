@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, TypeVar
+
+from configuration import cacheDirectory
+from pipeline.metrics import RunMetrics
+
+if TYPE_CHECKING:
+    from pipeline.runState import RunState
+
+T = TypeVar("T")
+
+lastKnownGoodDirectory = cacheDirectory / "lastKnownGood"
+OVERPASS_SOURCE = "overpass"
+API_UM_SOURCE = "apiUM"
+WTP_SOURCE = "wtp"
+STALE_SOURCE_TITLES = {
+    OVERPASS_SOURCE: "Dane OSM z Overpass API",
+    API_UM_SOURCE: "Trasy z API UM Warszawa",
+    WTP_SOURCE: "Rozkłady WTP",
+}
+
+
+@dataclass(frozen=True)
+class StaleSource:
+    title: str
+    # the oldest data used instead of a failed download, None when nothing was available
+    fetchedAt: datetime | None
+    # e.g. lines whose WTP pages come from the cache
+    items: list[str]
+    # left out of this run, there was no earlier data to use
+    missingItems: list[str]
+
+
+@dataclass
+class _SourceState:
+    fetchedAt: datetime | None = None
+    items: set[str] = field(default_factory=set)
+    missingItems: set[str] = field(default_factory=set)
+
+
+class StaleData:
+    """Parts of the current run which don't come from a successful download."""
+
+    def __init__(self, metrics: RunMetrics) -> None:
+        self.metrics = metrics
+        self.sources: dict[str, _SourceState] = {}
+        self.lock = threading.Lock()
+
+    def _source(self, source: str) -> _SourceState:
+        if source not in self.sources:
+            logging.warning(f"⏪ Some {source} data comes from earlier downloads")
+            self.sources[source] = _SourceState()
+        return self.sources[source]
+
+    def addStale(
+        self,
+        source: str,
+        fetchedAt: datetime,
+        item: str | None = None,
+    ) -> None:
+        self.metrics.increment(
+            "upstream_fallbacks_total", source=source, result="stale"
+        )
+        with self.lock:
+            state = self._source(source)
+            if state.fetchedAt is None or fetchedAt < state.fetchedAt:
+                state.fetchedAt = fetchedAt
+            if item is not None:
+                state.items.add(item)
+
+    def addMissing(self, source: str, item: str) -> None:
+        self.metrics.increment(
+            "upstream_fallbacks_total", source=source, result="missing"
+        )
+        with self.lock:
+            self._source(source).missingItems.add(item)
+
+    def summary(self) -> list[StaleSource]:
+        with self.lock:
+            return [
+                StaleSource(
+                    title=STALE_SOURCE_TITLES[source],
+                    fetchedAt=state.fetchedAt,
+                    items=sorted(state.items),
+                    missingItems=sorted(state.missingItems),
+                )
+                for source, state in sorted(self.sources.items())
+            ]
+
+
+def withLastKnownGood(
+    run: "RunState",
+    source: str,
+    fileName: str,
+    download: Callable[[], str],
+    parse: Callable[[str], T],
+) -> T:
+    # the last response which parsed is kept, it stands in when a download fails
+    if run.cacheBypassed:
+        # snapshot runs depend only on recorded responses
+        return parse(download())
+    path = lastKnownGoodDirectory / fileName
+    try:
+        text = download()
+        result = parse(text)
+    except Exception:
+        if not path.exists():
+            raise
+        logging.exception(f"⏪ Using last known good {fileName}")
+        run.staleData.addStale(
+            source,
+            datetime.fromtimestamp(path.stat().st_mtime, UTC),
+        )
+        return parse(path.read_text())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporaryPath = path.with_name(f"{fileName}.{os.getpid()}.tmp")
+    temporaryPath.write_text(text)
+    temporaryPath.replace(path)
+    return result
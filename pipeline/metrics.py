@@ -0,0 +1,238 @@
+import bisect
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+
+METRIC_PREFIX = "osm_wtp_"
+HTTP_LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_UNIT_BYTES = 1 if sys.platform == "darwin" else 1024
+WTP_CACHE_TIERS = ["memory", "disk"]
+
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class Histogram:
+    buckets: list[float]
+    # observations per bucket, the last one is +Inf
+    counts: list[int]
+    total: float = 0.0
+    count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+@dataclass
+class RunMetrics:
+    # counters and gauges of a single run
+    counters: dict[tuple[str, Labels], float] = field(default_factory=dict)
+    gauges: dict[tuple[str, Labels], float] = field(default_factory=dict)
+    histograms: dict[tuple[str, Labels], Histogram] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def setGauge(self, name: str, value: float, **labels: str) -> None:
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: list[float],
+        **labels: str,
+    ) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets, [0] * (len(buckets) + 1))
+            self.histograms[key].observe(value)
+
+    def counter(self, name: str, **labels: str) -> float:
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+
+def _labelText(labels: Labels, extra: Labels = ()) -> str:
+    allLabels = labels + extra
+    if len(allLabels) == 0:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in allLabels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def prometheusText(metrics: RunMetrics) -> str:
+    lines = []
+    with metrics.lock:
+        for metricType, values in [
+            ("counter", metrics.counters),
+            ("gauge", metrics.gauges),
+        ]:
+            for name in sorted({name for name, _ in values}):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} {metricType}")
+                lines.extend(
+                    f"{METRIC_PREFIX}{name}{_labelText(labels)} {value}"
+                    for (metricName, labels), value in sorted(values.items())
+                    if metricName == name
+                )
+        for name in sorted({name for name, _ in metrics.histograms}):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+            for (metricName, labels), histogram in sorted(metrics.histograms.items()):
+                if metricName != name:
+                    continue
+                cumulative = 0
+                for bucket, count in zip(
+                    [*map(str, histogram.buckets), "+Inf"],
+                    histogram.counts,
+                    strict=True,
+                ):
+                    cumulative += count
+                    lines.append(
+                        f"{METRIC_PREFIX}{name}_bucket"
+                        f"{_labelText(labels, (('le', bucket),))} {cumulative}",
+                    )
+                lines.append(
+                    f"{METRIC_PREFIX}{name}_sum{_labelText(labels)} {histogram.total}",
+                )
+                lines.append(
+                    f"{METRIC_PREFIX}{name}_count{_labelText(labels)} {histogram.count}",
+                )
+    return "\n".join(lines) + "\n"
+
+
+def _ratio(part: float, whole: float) -> float | None:
+    return round(part / whole, 4) if whole > 0 else None
+
+
+def _labelledCounters(
+    metrics: RunMetrics,
+    metricName: str,
+    outerLabel: str,
+    innerLabel: str,
+) -> dict[str, dict[str, float]]:
+    result: dict[str, dict[str, float]] = {}
+    for (name, labels), value in sorted(metrics.counters.items()):
+        if name == metricName:
+            labelValues = dict(labels)
+            result.setdefault(labelValues[outerLabel], {})[labelValues[innerLabel]] = (
+                value
+            )
+    return result
+
+
+def metricsSummary(metrics: RunMetrics) -> dict:
+    with metrics.lock:
+        hits = metrics.counter("wtp_cache_lookups_total", result="hit")
+        misses = metrics.counter("wtp_cache_lookups_total", result="miss")
+        stale = metrics.counter("wtp_cache_stale_total")
+        tierHits = {
+            tier: metrics.counter(
+                "wtp_cache_tier_lookups_total", tier=tier, result="hit"
+            )
+            for tier in WTP_CACHE_TIERS
+        }
+        tierLookups = {
+            tier: tierHits[tier]
+            + metrics.counter("wtp_cache_tier_lookups_total", tier=tier, result="miss")
+            for tier in WTP_CACHE_TIERS
+        }
+        return {
+            "stageDurationSeconds": {
+                dict(labels)["stage"]: round(value, 3)
+                for (name, labels), value in sorted(metrics.gauges.items())
+                if name == "stage_duration_seconds"
+            },
+            "http": {
+                dict(labels)["host"]: {
+                    "requests": histogram.count,
+                    "meanSeconds": round(histogram.total / histogram.count, 3),
+                }
+                for (name, labels), histogram in sorted(metrics.histograms.items())
+                if name == "http_request_duration_seconds"
+            },
+            "wtpCache": {
+                "hits": hits,
+                "misses": misses,
+                "stale": stale,
+                "hitRatio": _ratio(hits, hits + misses),
+                "staleRatio": _ratio(stale, hits + misses),
+                # the disk tier is looked up only when the memory tier misses
+                "tierHitRatio": {
+                    tier: _ratio(tierHits[tier], tierLookups[tier])
+                    for tier in WTP_CACHE_TIERS
+                },
+            },
+            # parts of the run which come from earlier downloads or are missing
+            "fallbacks": _labelledCounters(
+                metrics, "upstream_fallbacks_total", "source", "result"
+            ),
+            "circuitBreakerTrips": {
+                dict(labels)["host"]: value
+                for (name, labels), value in sorted(metrics.counters.items())
+                if name == "http_circuit_breaker_trips_total"
+            },
+            "rejectedRequests": _labelledCounters(
+                metrics, "http_requests_rejected_total", "host", "reason"
+            ),
+            "wtpPagesParsed": metrics.counter("wtp_pages_parsed_total"),
+            "relationsAnalyzed": {
+                dict(labels)["network"]: value
+                for (name, labels), value in sorted(metrics.counters.items())
+                if name == "relations_analyzed_total"
+            },
+            "peakRssBytes": metrics.gauges.get(("peak_rss_bytes", ()), 0),
+        }
+
+
+def recordPeakRss(metrics: RunMetrics) -> None:
+    # peak of the whole process, in the daemon it covers earlier runs too
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    metrics.setGauge("peak_rss_bytes", maxRss * RSS_UNIT_BYTES)
+
+
+def _writeAtomically(path: Path, text: str) -> None:
+    temporaryPath = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    temporaryPath.write_text(text)
+    temporaryPath.replace(path)
+
+
+def writeMetrics(metrics: RunMetrics, directory: Path) -> dict:
+    metrics.setGauge("last_run_timestamp_seconds", time.time())
+    recordPeakRss(metrics)
+    summary = metricsSummary(metrics)
+    directory.mkdir(parents=True, exist_ok=True)
+    # node_exporter textfile collector reads *.prom while runs write it
+    _writeAtomically(directory / "metrics.prom", prometheusText(metrics))
+    _writeAtomically(directory / "metrics.json", json.dumps(summary, indent=2))
+    return summary
+
+
+def healthchecksWithSummary(summary: dict) -> None:
+    # like starsep_utils healthchecks, but the ping body is shown in the dashboard
+    url = os.environ.get("HEALTHCHECKS_URL")
+    if url is None:
+        logging.warning("Missing HEALTHCHECKS_URL. Skipping healthchecks")
+        return
+    try:
+        httpx.post(url, content=json.dumps(summary))
+    except httpx.HTTPError:
+        # a failing ping mustn't fail a run which has already published
+        logging.exception("❌ Healthchecks ping failed")
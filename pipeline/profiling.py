@@ -0,0 +1,224 @@
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from types import CodeType, FrameType
+
+from starsep_utils import logDuration
+
+PROFILE_MODES = ["sampling", "deterministic"]
+SAMPLING_INTERVAL_SECONDS = 0.005
+TOP_FUNCTIONS = 25
+# funcy's log_durations, starsep_utils exposes only its instance
+LogDuration = type(logDuration)
+
+
+def _frameDepth(frame: FrameType | None) -> int:
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+def _functionName(code: CodeType) -> str:
+    path = Path(code.co_filename)
+    if path.is_relative_to(Path.cwd()):
+        path = path.relative_to(Path.cwd())
+    else:
+        path = Path(*path.parts[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class PipelineProfiler:
+    """
+    Attributes samples of stack traces to pipeline stages and logDuration sections.
+
+    Sampling has a low overhead and writes collapsed stacks for flamegraphs,
+    deterministic mode also runs cProfile in every stage.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        deterministic: bool,
+        interval: float = SAMPLING_INTERVAL_SECONDS,
+        topFunctions: int = TOP_FUNCTIONS,
+    ) -> None:
+        self.directory = directory
+        self.deterministic = deterministic
+        self.interval = interval
+        self.topFunctions = topFunctions
+        # thread id => running stage and stack depth of the frame which runs it
+        self.stages: dict[int, tuple[str, int]] = {}
+        # thread id => open logDuration sections with stack depth they were opened at
+        self.sections: dict[int, list[tuple[int, str]]] = {}
+        self.samples: Counter[tuple[str, ...]] = Counter()
+        self.profiledStages: list[str] = []
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self._sampleLoop, daemon=True)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        threadId = threading.get_ident()
+        # skip frames of this generator and contextmanager's __enter__
+        self.stages[threadId] = (name, _frameDepth(sys._getframe(2)))  # noqa: SLF001
+        profile = cProfile.Profile() if self.deterministic else None
+        try:
+            if profile is not None:
+                profile.enable()
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            del self.stages[threadId]
+            if profile is not None:
+                profile.dump_stats(self.directory / f"{name}.prof")
+                self.profiledStages.append(name)
+
+    def _enterSection(self, label: str) -> None:
+        # depth of the frame which opened the section, it is inserted after it
+        depth = _frameDepth(sys._getframe(2))  # noqa: SLF001
+        self.sections.setdefault(threading.get_ident(), []).append(
+            (depth, label.split("(", maxsplit=1)[0]),
+        )
+
+    def _exitSection(self) -> None:
+        self.sections[threading.get_ident()].pop()
+
+    @contextmanager
+    def _trackSections(self) -> Iterator[None]:
+        profiler = self
+        originalEnter = LogDuration.__enter__
+        originalExit = LogDuration.__exit__
+
+        def enter(self: LogDuration) -> LogDuration:
+            profiler._enterSection(self.label or "")
+            return originalEnter(self)
+
+        def exit_(self: LogDuration, *exc: object) -> None:
+            profiler._exitSection()
+            originalExit(self, *exc)
+
+        LogDuration.__enter__ = enter
+        LogDuration.__exit__ = exit_
+        try:
+            yield
+        finally:
+            LogDuration.__enter__ = originalEnter
+            LogDuration.__exit__ = originalExit
+
+    def _sample(self) -> None:
+        frames = sys._current_frames()  # noqa: SLF001
+        for threadId, (stageName, stageDepth) in list(self.stages.items()):
+            frame = frames.get(threadId)
+            if frame is None:
+                continue
+            stack: list[str] = []
+            while frame is not None:
+                stack.append(_functionName(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            for depth, label in reversed(self.sections.get(threadId, [])):
+                stack.insert(min(depth, len(stack)), f"⌛ {label}")
+            # thread pool and stage graph frames below the stage function
+            self.samples[(stageName, *stack[stageDepth:])] += 1
+
+    def _sampleLoop(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self._sample()
+
+    @contextmanager
+    def profiling(self) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in [
+            *self.directory.glob("*.prof"),
+            *self.directory.glob("*.collapsed"),
+        ]:
+            path.unlink()
+        self.sampler.start()
+        try:
+            with self._trackSections():
+                yield
+        finally:
+            self.stopped.set()
+            self.sampler.join()
+            self.writeResults()
+
+    def _collapsedLines(self, stageName: str | None = None) -> list[str]:
+        return sorted(
+            f"{';'.join(stack)} {count}"
+            for stack, count in self.samples.items()
+            if stageName is None or stack[0] == stageName
+        )
+
+    def hotFunctions(
+        self,
+        stageName: str | None = None,
+    ) -> list[tuple[str, int, int]]:
+        # (function, samples on top of the stack, samples anywhere in the stack)
+        selfSamples: Counter[str] = Counter()
+        totalSamples: Counter[str] = Counter()
+        for stack, count in self.samples.items():
+            if stageName is not None and stack[0] != stageName:
+                continue
+            functions = [name for name in stack[1:] if not name.startswith("⌛")]
+            if len(functions) > 0:
+                selfSamples[functions[-1]] += count
+            for name in set(functions):
+                totalSamples[name] += count
+        return [
+            (name, selfSamples[name], totalSamples[name])
+            for name in sorted(
+                totalSamples,
+                key=lambda name: (selfSamples[name], totalSamples[name]),
+                reverse=True,
+            )[: self.topFunctions]
+        ]
+
+    def summary(self) -> str:
+        total = sum(self.samples.values())
+        lines = [f"{total} samples every {self.interval * 1000:g} ms"]
+        stageNames = sorted({stack[0] for stack in self.samples})
+        for stageName in [None, *stageNames]:
+            stageSamples = sum(
+                count
+                for stack, count in self.samples.items()
+                if stageName is None or stack[0] == stageName
+            )
+            lines.append("")
+            lines.append(f"== {stageName or 'all stages'}: {stageSamples} samples")
+            lines.extend(
+                f"{selfCount:8} {totalCount:8}  {name}"
+                for name, selfCount, totalCount in self.hotFunctions(stageName)
+            )
+        for stageName in sorted(self.profiledStages):
+            output = io.StringIO()
+            pstats.Stats(
+                str(self.directory / f"{stageName}.prof"),
+                stream=output,
+            ).sort_stats(pstats.SortKey.TIME).print_stats(self.topFunctions)
+            lines.append("")
+            lines.append(f"== {stageName}: cProfile")
+            lines.append(output.getvalue().strip())
+        return "\n".join(lines) + "\n"
+
+    def writeResults(self) -> None:
+        for stageName in sorted({stack[0] for stack in self.samples}):
+            (self.directory / f"{stageName}.collapsed").write_text(
+                "\n".join(self._collapsedLines(stageName)) + "\n",
+            )
+        (self.directory / "stacks.collapsed").write_text(
+            "\n".join(self._collapsedLines()) + "\n",
+        )
+        (self.directory / "summary.txt").write_text(self.summary())
+        for name, selfCount, _ in self.hotFunctions()[:10]:
+            logging.info(f"🔥 {selfCount} samples in {name}")
+        logging.info(f"🔥 Profile written to {self.directory}")
@@ -0,0 +1,373 @@
+from contextlib import closing
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from compare.comparator import CompareResult, compareStops
+from configuration import ENABLE_TRAIN
+from gtfs.osmGTFSStopsComparer import (
+    STOP_DISTANCE_THRESHOLD,
+    compareOSMAndGTFSStops,
+)
+from model.gtfs import OSMAndGTFSComparisonResult
+from model.runContext import RunContext
+from network.transitNetwork import TransitNetwork
+from pipeline.history import (
+    PROBLEM_KIND_TITLES,
+    ProblemChanges,
+    connectHistory,
+    previousRunId,
+    problemChanges,
+    recordRun,
+    runProblems,
+)
+from pipeline.resultExport import (
+    lastRunJson,
+    resultJsonChunks,
+    stopProblemsGeoJsonChunks,
+)
+from pipeline.routeCheckReport import missingRefsInOSM
+from pipeline.runState import currentRun
+from pipeline.stageGraph import StageGraph
+from pipeline.staticOutput import (
+    OutputOptions,
+    renderRoutePages,
+    routePageName,
+    writeIfChanged,
+)
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
+
+def findNotLinkedWtpUrls(context: RunContext, network: TransitNetwork) -> list[str]:
+    return sorted(
+        {
+            network.operatorLinkUrl(link)
+            for link in context.wtpSeenLinks - context.osmOperatorLinks
+            if network.isOperatorLinkExpected(link)
+        },
+    )
+
+
+def templateEnvironment(bytecodeDirectory: Path | None = None) -> "Environment":
+    from jinja2 import (  # noqa: PLC0415
+        Environment,
+        FileSystemBytecodeCache,
+        FileSystemLoader,
+        StrictUndefined,
+        select_autoescape,
+    )
+
+    bytecodeCache = None
+    if bytecodeDirectory is not None:
+        # compiled templates survive between runs, recompiled when sources change
+        bytecodeDirectory.mkdir(parents=True, exist_ok=True)
+        bytecodeCache = FileSystemBytecodeCache(str(bytecodeDirectory))
+    return Environment(
+        loader=FileSystemLoader(searchpath="./templates"),
+        bytecode_cache=bytecodeCache,
+        autoescape=select_autoescape(),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        undefined=StrictUndefined,
+    )
+
+
+def sharedTemplateContext(startTime: datetime) -> dict:
+    endTime = datetime.now(UTC)
+    generationSeconds = int((endTime - startTime).total_seconds())
+    return {
+        "startTime": startTime.isoformat(timespec="seconds"),
+        "generationSeconds": generationSeconds,
+        # every stage which downloads data has finished before this one
+        "staleSources": currentRun().staleData.summary(),
+    }
+
+
+def renderIndex(
+    env: "Environment",
+    compareResults: CompareResult,
+    notLinkedWtpUrls: list[str],
+    context: RunContext,
+    sharedContext: dict,
+    network: TransitNetwork,
+    *,
+    outputOptions: OutputOptions,
+) -> bool:
+    template = env.get_template("index.j2")
+    # sets are sorted, their order would change the page between identical runs
+    return writeIfChanged(
+        Path(network.outputDirectory, "index.html"),
+        template.generate(
+            splitOutput=outputOptions.splitOutput,
+            routePageName=routePageName,
+            refs=compareResults.refs,
+            renderResults=compareResults.renderResults,
+            disusedStop=sorted(context.disusedStop),
+            invalidWtpVariants=sorted(context.invalidOperatorVariants),
+            wtpManyLastStops=sorted(context.wtpManyLastStops),
+            wtpMissingLastStop=sorted(context.wtpMissingLastStop),
+            missingRouteUrl=sorted(context.missingRouteUrl),
+            notLinkedWtpUrls=notLinkedWtpUrls,
+            unexpectedLink=sorted(context.unexpectedLink),
+            unexpectedNetwork=sorted(context.unexpectedNetwork),
+            wtpLinkDuplicates=sorted(
+                network.operatorLinkUrl(link) for link in context.wtpLinkDuplicates
+            ),
+            ENABLE_TRAIN=ENABLE_TRAIN,
+            **sharedContext,
+        ),
+    )
+
+
+def renderStops(
+    env: "Environment",
+    compareResults: CompareResult,
+    osmAndGTFSComparisonResult: OSMAndGTFSComparisonResult,
+    context: RunContext,
+    sharedContext: dict,
+    network: TransitNetwork,
+) -> bool:
+    template = env.get_template("stops.j2")
+    return writeIfChanged(
+        Path(network.outputDirectory, "stops.html"),
+        template.generate(
+            farAwayStops=osmAndGTFSComparisonResult.farAwayStops,
+            stopDistanceThreshold=int(STOP_DISTANCE_THRESHOLD),
+            notUniqueOSMNames={
+                ref: sorted(names)
+                for ref, names in sorted(context.osmRefToName.items())
+                if len(names) > 1
+            },
+            notUniqueWTPNames={
+                ref: sorted(names)
+                for ref, names in sorted(compareResults.operatorRefToName.items())
+                if len(names) > 1
+            },
+            mismatchOSMNameRefRailway=sorted(context.mismatchOSMNameRefRailway),
+            mismatchOSMNameRefNonRailway=sorted(
+                context.mismatchOSMNameRefNonRailway,
+            ),
+            missingLastStopRefNames=sorted(context.wtpMissingLastStopRefNames),
+            missingName=sorted(context.missingName),
+            missingStopRef=sorted(context.missingStopRef),
+            missingRefsInOSM=missingRefsInOSM(compareResults, context),
+            unexpectedStopRef=sorted(context.unexpectedStopRef),
+            wtpStopMapping=network.operatorStopMapping,
+            osmStops=osmAndGTFSComparisonResult.osmStops,
+            gtfsStops=osmAndGTFSComparisonResult.gtfsStops,
+            osmStopRefsNotInGTFS=osmAndGTFSComparisonResult.osmStopRefsNotInGTFS,
+            gtfsStopRefsNotInOSM=osmAndGTFSComparisonResult.gtfsStopRefsNotInOSM,
+            distanceDistribution=osmAndGTFSComparisonResult.distanceDistribution,
+            nearestGTFSStops=osmAndGTFSComparisonResult.nearestGTFSStops,
+            nearestOSMStops=osmAndGTFSComparisonResult.nearestOSMStops,
+            **sharedContext,
+        ),
+    )
+
+
+def exportResults(
+    compareResults: CompareResult,
+    osmAndGTFSComparisonResult: OSMAndGTFSComparisonResult,
+    notLinkedWtpUrls: list[str],
+    context: RunContext,
+    sharedContext: dict,
+    network: TransitNetwork,
+    *,
+    outputOptions: OutputOptions,
+) -> None:
+    exports = {
+        "results.json": lambda: resultJsonChunks(
+            network.name,
+            compareResults,
+            osmAndGTFSComparisonResult,
+            notLinkedWtpUrls,
+            context,
+        ),
+        "stop-problems.geojson": lambda: stopProblemsGeoJsonChunks(
+            network.name,
+            osmAndGTFSComparisonResult,
+        ),
+    }
+    for fileName, chunks in exports.items():
+        path = Path(network.outputDirectory, fileName)
+        writeIfChanged(path, chunks())
+        if outputOptions.compressExports:
+            writeIfChanged(path.with_name(f"{fileName}.gz"), chunks(), compress=True)
+    writeIfChanged(
+        Path(network.outputDirectory, "lastRun.json"),
+        [
+            lastRunJson(
+                network.name,
+                sharedContext["startTime"],
+                sharedContext["generationSeconds"],
+            ),
+        ],
+    )
+
+
+def recordHistory(
+    compareResults: CompareResult,
+    osmAndGTFSComparisonResult: OSMAndGTFSComparisonResult,
+    notLinkedWtpUrls: list[str],
+    context: RunContext,
+    sharedContext: dict,
+    network: TransitNetwork,
+    historyPath: Path,
+) -> ProblemChanges:
+    with closing(connectHistory(historyPath)) as connection:
+        runId = recordRun(
+            connection,
+            network.name,
+            sharedContext["startTime"],
+            compareResults,
+            runProblems(
+                compareResults,
+                osmAndGTFSComparisonResult,
+                notLinkedWtpUrls,
+                context,
+            ),
+        )
+        return problemChanges(
+            connection,
+            previousRunId(connection, network.name, runId),
+            runId,
+        )
+
+
+def renderChanges(
+    env: "Environment",
+    changes: ProblemChanges,
+    sharedContext: dict,
+    network: TransitNetwork,
+) -> None:
+    template = env.get_template("changes.j2")
+    writeIfChanged(
+        Path(network.outputDirectory, "changes.html"),
+        template.generate(
+            changes=changes,
+            kindTitles=PROBLEM_KIND_TITLES,
+            **sharedContext,
+        ),
+    )
+
+
+def addReportStages(
+    graph: StageGraph,
+    network: TransitNetwork,
+    wtpLinksAfter: list[str],
+    *,
+    outputOptions: OutputOptions,
+) -> None:
+    # needs startTime, env and network context, gtfsStops and osmResults stages,
+    # wtpLinksAfter are stages which finish collecting WTP links in the context
+    # currently unused: compareApiRoutesWithOSM(apiResults, osmResults)
+    stage = network.stageName
+    graph.add(
+        stage("compareResults"),
+        lambda osmResults, context: compareStops(osmResults, context.osmRefToName),
+        inputs={"osmResults": stage("osmResults"), "context": stage("context")},
+    )
+    graph.add(
+        stage("notLinkedWtpUrls"),
+        lambda context: findNotLinkedWtpUrls(context, network),
+        inputs={"context": stage("context")},
+        after=[stage(name) for name in wtpLinksAfter],
+    )
+    graph.add(
+        stage("osmAndGTFSComparisonResult"),
+        compareOSMAndGTFSStops,
+        inputs={"gtfsStops": stage("gtfsStops"), "context": stage("context")},
+        after=[stage("osmResults")],
+    )
+    graph.add(
+        stage("sharedContext"),
+        sharedTemplateContext,
+        inputs=["startTime"],
+        after=[
+            stage("compareResults"),
+            stage("notLinkedWtpUrls"),
+            stage("osmAndGTFSComparisonResult"),
+        ],
+    )
+    graph.add(
+        stage("renderIndex"),
+        lambda **inputs: renderIndex(
+            **inputs,
+            network=network,
+            outputOptions=outputOptions,
+        ),
+        inputs={
+            "env": "env",
+            "compareResults": stage("compareResults"),
+            "notLinkedWtpUrls": stage("notLinkedWtpUrls"),
+            "context": stage("context"),
+            "sharedContext": stage("sharedContext"),
+        },
+    )
+    graph.add(
+        stage("renderStops"),
+        lambda **inputs: renderStops(**inputs, network=network),
+        inputs={
+            "env": "env",
+            "compareResults": stage("compareResults"),
+            "osmAndGTFSComparisonResult": stage("osmAndGTFSComparisonResult"),
+            "context": stage("context"),
+            "sharedContext": stage("sharedContext"),
+        },
+    )
+    graph.add(
+        stage("history"),
+        lambda **inputs: recordHistory(
+            **inputs,
+            network=network,
+            historyPath=outputOptions.historyDatabasePath,
+        ),
+        inputs={
+            "compareResults": stage("compareResults"),
+            "osmAndGTFSComparisonResult": stage("osmAndGTFSComparisonResult"),
+            "notLinkedWtpUrls": stage("notLinkedWtpUrls"),
+            "context": stage("context"),
+            "sharedContext": stage("sharedContext"),
+        },
+    )
+    graph.add(
+        stage("renderChanges"),
+        lambda **inputs: renderChanges(**inputs, network=network),
+        inputs={
+            "env": "env",
+            "changes": stage("history"),
+            "sharedContext": stage("sharedContext"),
+        },
+    )
+    graph.add(
+        stage("exportResults"),
+        lambda **inputs: exportResults(
+            **inputs,
+            network=network,
+            outputOptions=outputOptions,
+        ),
+        inputs={
+            "compareResults": stage("compareResults"),
+            "osmAndGTFSComparisonResult": stage("osmAndGTFSComparisonResult"),
+            "notLinkedWtpUrls": stage("notLinkedWtpUrls"),
+            "context": stage("context"),
+            "sharedContext": stage("sharedContext"),
+        },
+    )
+    if outputOptions.splitOutput:
+        graph.add(
+            stage("renderRoutes"),
+            lambda env, compareResults, sharedContext: renderRoutePages(
+                env,
+                compareResults,
+                network.outputDirectory,
+                staleSources=sharedContext["staleSources"],
+            ),
+            inputs={
+                "env": "env",
+                "compareResults": stage("compareResults"),
+                "sharedContext": stage("sharedContext"),
+            },
+        )
@@ -0,0 +1,186 @@
+import json
+from collections.abc import Iterator
+from dataclasses import asdict
+from typing import Any
+
+from compare.comparator import CompareResult, RouteResult
+from model.gtfs import OSMAndGTFSComparisonResult
+from model.runContext import RunContext
+from pipeline.routeCheckReport import (
+    DIFF_ROW_MARKERS,
+    contextIssues,
+    missingRefsInOSM,
+)
+
+# bump when a field changes meaning or disappears, new fields keep the version
+EXPORT_SCHEMA_VERSION = 2
+# columns of diff rows, rows are arrays to keep the export small
+DIFF_ROW_FIELDS = ["marker", "refOSM", "nameOSM", "refOperator", "nameOperator"]
+# ~10 cm, more digits only make the export bigger
+COORDINATE_PRECISION = 6
+
+
+def jsonDefault(value: Any) -> Any:  # noqa: ANN401
+    if isinstance(value, set | frozenset):
+        return sorted(value)
+    message = f"Unsupported JSON value {type(value)}"
+    raise TypeError(message)
+
+
+def compactJson(value: object) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def routeJson(result: RouteResult) -> dict:
+    return {
+        "routeMismatch": result.routeMismatch,
+        "error": result.error,
+        "detourOnlyErrors": result.detourOnlyErrors,
+        "variants": [
+            {
+                "osmId": variantResult.variant.osmId,
+                "osmName": variantResult.variant.osmName,
+                "operatorLink": variantResult.variant.operatorLink,
+                "routeType": variantResult.variant.routeType,
+                "detour": variantResult.variant.detour,
+                "new": variantResult.variant.new,
+                "short": variantResult.variant.short,
+                "diffRows": [
+                    [
+                        DIFF_ROW_MARKERS.get(row.color, "?"),
+                        row.refOSM,
+                        row.nameOSM,
+                        row.refOperator,
+                        row.nameOperator,
+                    ]
+                    for row in variantResult.diffRows
+                ],
+                "otherErrors": sorted(variantResult.otherErrors),
+            }
+            for variantResult in result.variantResults
+        ],
+    }
+
+
+def lastRunJson(networkName: str, startTime: str, generationSeconds: int) -> str:
+    # kept apart from results.json, which changes only when the results do
+    return compactJson(
+        {
+            "version": EXPORT_SCHEMA_VERSION,
+            "network": networkName,
+            "startTime": startTime,
+            "generationSeconds": generationSeconds,
+        },
+    )
+
+
+def resultJsonChunks(
+    networkName: str,
+    compareResults: CompareResult,
+    osmAndGTFSComparisonResult: OSMAndGTFSComparisonResult,
+    notLinkedWtpUrls: list[str],
+    context: RunContext,
+) -> Iterator[str]:
+    # route by route, the whole document is never built in memory
+    header = {
+        "version": EXPORT_SCHEMA_VERSION,
+        "network": networkName,
+        "diffRowFields": DIFF_ROW_FIELDS,
+    }
+    yield compactJson(header)[:-1]
+    yield ',"routes":{'
+    for index, ref in enumerate(compareResults.refs):
+        separator = "," if index > 0 else ""
+        routeResult = compareResults.renderResults[ref]
+        yield f"{separator}{compactJson(ref)}:{compactJson(routeJson(routeResult))}"
+    yield "},"
+    stops = {
+        "farAwayStops": osmAndGTFSComparisonResult.farAwayStops,
+        "osmStopRefsNotInGTFS": osmAndGTFSComparisonResult.osmStopRefsNotInGTFS,
+        "gtfsStopRefsNotInOSM": osmAndGTFSComparisonResult.gtfsStopRefsNotInOSM,
+        "missingRefsInOSM": missingRefsInOSM(compareResults, context),
+        "distanceDistribution": asdict(osmAndGTFSComparisonResult.distanceDistribution),
+    }
+    yield f'"stops":{compactJson(stops)},'
+    yield f'"notLinkedOperatorUrls":{compactJson(notLinkedWtpUrls)},'
+    yield f'"issues":{compactJson(dict(contextIssues(context)))}}}'
+
+
+def _point(lat: float, lon: float) -> list[float]:
+    return [round(lon, COORDINATE_PRECISION), round(lat, COORDINATE_PRECISION)]
+
+
+def stopProblemFeatures(
+    osmAndGTFSComparisonResult: OSMAndGTFSComparisonResult,
+) -> Iterator[dict]:
+    osmStops = osmAndGTFSComparisonResult.osmStops
+    gtfsStops = osmAndGTFSComparisonResult.gtfsStops
+    for ref, distance in osmAndGTFSComparisonResult.farAwayStops:
+        osmStop, gtfsStop = osmStops[ref], gtfsStops[ref]
+        # from the OSM stop to where GTFS expects it
+        yield {
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [
+                    _point(osmStop.lat, osmStop.lon),
+                    _point(gtfsStop.lat, gtfsStop.lon),
+                ],
+            },
+            "properties": {
+                "problem": "farAway",
+                "ref": ref,
+                "name": osmStop.name,
+                "osmUrl": osmStop.url,
+                "distance": distance,
+            },
+        }
+    for ref in osmAndGTFSComparisonResult.osmStopRefsNotInGTFS:
+        osmStop = osmStops[ref]
+        nearest = osmAndGTFSComparisonResult.nearestGTFSStops.get(ref)
+        yield {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": _point(osmStop.lat, osmStop.lon),
+            },
+            "properties": {
+                "problem": "notInGTFS",
+                "ref": ref,
+                "name": osmStop.name,
+                "osmUrl": osmStop.url,
+                "nearest": nearest,
+            },
+        }
+    for ref in osmAndGTFSComparisonResult.gtfsStopRefsNotInOSM:
+        gtfsStop = gtfsStops[ref]
+        nearest = osmAndGTFSComparisonResult.nearestOSMStops.get(ref)
+        yield {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": _point(gtfsStop.lat, gtfsStop.lon),
+            },
+            "properties": {
+                "problem": "notInOSM",
+                "ref": ref,
+                "name": gtfsStop.name,
+                "nearest": nearest,
+            },
+        }
+
+
+def stopProblemsGeoJsonChunks(
+    networkName: str,
+    osmAndGTFSComparisonResult: OSMAndGTFSComparisonResult,
+) -> Iterator[str]:
+    header = {
+        "type": "FeatureCollection",
+        "version": EXPORT_SCHEMA_VERSION,
+        "network": networkName,
+    }
+    yield compactJson(header)[:-1]
+    yield ',"features":['
+    for index, feature in enumerate(stopProblemFeatures(osmAndGTFSComparisonResult)):
+        yield ("," if index > 0 else "") + compactJson(feature)
+    yield "]}"
@@ -0,0 +1,134 @@
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from starsep_utils import OverpassResult, Relation
+
+from compare.comparator import CompareResult, compareStops
+from gtfs.gtfsPatterns import GTFSPatternIndex, loadGTFSPatterns
+from gtfs.gtfsShapes import GTFSShapes, loadGTFSShapes
+from gtfs.osmGTFSStopsComparer import loadGTFSStops
+from model.gtfs import GTFSStop
+from model.operatorRoute import LastStopRefsResult, OperatorRoutes
+from model.runContext import RunContext
+from model.types import RouteRef, StopRef
+from network.transitNetwork import TransitNetwork
+from osm.OSMRelationAnalyzer import (
+    analyzeOSMRelations,
+    downloadOSMRelations,
+    parseRef,
+    scrapeOSMRoutes,
+)
+from osm.overpass import downloadOverpassResult
+from pipeline.runState import currentRun
+from pipeline.stageGraph import StageGraph
+from scraper.httpx_client import httpxClient
+
+PARTIAL_CHECK_NOTE = (
+    "Wynik częściowy: pominięto sprawdzenia wymagające całej sieci "
+    "(nielinkowane rozkłady WTP, duplikaty linków, porównanie z GTFS), "
+    "przystanki końcowe ustalono tylko na podstawie sprawdzanych tras."
+)
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    network: TransitNetwork
+    apiResults: OperatorRoutes
+    gtfsStops: dict[StopRef, GTFSStop]
+    gtfsPatterns: GTFSPatternIndex
+    gtfsShapes: GTFSShapes
+    # learned from the whole network, None when only checked relations are known
+    lastStopRefs: LastStopRefsResult | None
+
+    @property
+    def partial(self) -> bool:
+        return self.lastStopRefs is None
+
+
+@dataclass(frozen=True)
+class WarmState:
+    overpassResult: OverpassResult
+    referenceData: ReferenceData
+    refreshedAt: datetime
+
+    @staticmethod
+    def fromStageResults(
+        results: dict[str, Any],
+        network: TransitNetwork,
+        refreshedAt: datetime,
+    ) -> "WarmState":
+        return WarmState(
+            overpassResult=results["overpassResult"],
+            referenceData=ReferenceData(
+                network=network,
+                apiResults=results[network.stageName("apiResults")],
+                gtfsStops=results[network.stageName("gtfsStops")],
+                gtfsPatterns=results[network.stageName("gtfsPatterns")],
+                gtfsShapes=results[network.stageName("gtfsShapes")],
+                lastStopRefs=results[network.stageName("lastStopRefs")],
+            ),
+            refreshedAt=refreshedAt,
+        )
+
+
+def loadReferenceData(network: TransitNetwork) -> ReferenceData:
+    graph = StageGraph()
+    graph.add("apiResults", network.fetchOperatorRoutes)
+    graph.add("gtfsStops", lambda: loadGTFSStops(network.gtfsFeed))
+    graph.add("gtfsPatterns", lambda: loadGTFSPatterns(network.gtfsFeed))
+    graph.add("gtfsShapes", lambda: loadGTFSShapes(network.gtfsFeed))
+    return ReferenceData(network=network, **graph.run(), lastStopRefs=None)
+
+
+def routeRelationIds(relations: Iterable[Relation], routeRef: RouteRef) -> list[int]:
+    return sorted(
+        relation.id
+        for relation in relations
+        if relation.tags.get("type") == "route" and parseRef(relation.tags) == routeRef
+    )
+
+
+def downloadRouteRelationIds(routeRef: RouteRef, network: TransitNetwork) -> list[int]:
+    escapedRef = routeRef.replace("\\", "\\\\").replace('"', '\\"')
+    selectors = "\n".join(
+        f'relation["type"="route"]["network"="{network.osmNetwork}"]["{refKey}"="{escapedRef}"];'
+        for refKey in ("ref:wtp", "ref:ztm", "ref")
+    )
+    overpassResult = downloadOverpassResult(f"({selectors});\nout body;")
+    return routeRelationIds(overpassResult.relations.values(), routeRef)
+
+
+def checkRelations(
+    relationIds: list[int],
+    referenceData: ReferenceData,
+) -> tuple[CompareResult, RunContext]:
+    # fresh OSM data for the requested relations only, everything else stays warm
+    overpassResult = downloadOSMRelations(relationIds)
+    network = referenceData.network
+    context = RunContext()
+    with httpxClient(currentRun()) as httpClient:
+        scrapedOSMRoutes = scrapeOSMRoutes(
+            list(overpassResult.relations.values()),
+            network,
+            httpClient,
+            context,
+        )
+    lastStopRefs = (
+        referenceData.lastStopRefs
+        if referenceData.lastStopRefs is not None
+        else network.generateLastStopRefs(scrapedOSMRoutes)
+    )
+    osmResults = analyzeOSMRelations(
+        overpassResult=overpassResult,
+        scrapedOSMRoutes=scrapedOSMRoutes,
+        apiResults=referenceData.apiResults,
+        gtfsStops=referenceData.gtfsStops,
+        gtfsPatterns=referenceData.gtfsPatterns,
+        gtfsShapes=referenceData.gtfsShapes,
+        lastStopRefs=lastStopRefs,
+        network=network,
+        context=context,
+    )
+    return compareStops(osmResults, context.osmRefToName), context
@@ -0,0 +1,97 @@
+from typing import TYPE_CHECKING
+
+from compare.comparator import CompareResult
+from configuration import MISSING_REF
+from model.runContext import RunContext
+from pipeline.routeCheck import PARTIAL_CHECK_NOTE
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
+# run context findings which are meaningful for a subset of relations
+CONTEXT_ISSUES = [
+    ("Przystanek z disused w tagu używana w trasie", "disusedStop"),
+    ("WTP: Wiele przystanków końcowych", "wtpManyLastStops"),
+    ("WTP: Brakujący przystanek końcowy", "wtpMissingLastStop"),
+    ("Brakujący url dla trasy", "missingRouteUrl"),
+    ("Niespodziewany link dla trasy", "unexpectedLink"),
+    ("Niespodziewany network dla trasy", "unexpectedNetwork"),
+    ("Niedostępne warianty linii na WTP", "invalidOperatorVariants"),
+    ("Brakująca nazwa", "missingName"),
+    ("Brakujący ref", "missingStopRef"),
+    ("Niespodziewany ref", "unexpectedStopRef"),
+    ("Nazwy ostatnich przystanków bez ref", "wtpMissingLastStopRefNames"),
+]
+
+DIFF_ROW_MARKERS = {"inherit": " ", "green": "+", "red": "-", "orange": "~"}
+
+
+def contextIssues(context: RunContext) -> list[tuple[str, list[str]]]:
+    issues = []
+    for title, fieldName in CONTEXT_ISSUES:
+        values = getattr(context, fieldName)
+        if len(values) > 0:
+            issues.append(
+                (
+                    title,
+                    sorted(
+                        " ".join(value) if isinstance(value, tuple) else value
+                        for value in values
+                    ),
+                ),
+            )
+    return issues
+
+
+def missingRefsInOSM(
+    compareResult: CompareResult,
+    context: RunContext,
+) -> list[tuple[str, str]]:
+    # operator stop refs which no OSM stop has, with the first of their operator names
+    return [
+        (ref, min(compareResult.operatorRefToName[ref]))
+        for ref in sorted(context.wtpStopRefs - context.allOSMRefs - {MISSING_REF})
+    ]
+
+
+def formatCheckResult(
+    compareResult: CompareResult,
+    context: RunContext,
+    *,
+    partial: bool,
+) -> str:
+    lines = [f"⚠ {PARTIAL_CHECK_NOTE}"] if partial else []
+    for ref in compareResult.refs:
+        result = compareResult.renderResults[ref]
+        lines.append(f"{ref}: {'błędy' if result.error else 'OK'}")
+        for variantResult in result.variantResults:
+            variant = variantResult.variant
+            lines.append(
+                f"  {variant.osmName} https://osm.org/relation/{variant.osmId} {variant.operatorLink}",
+            )
+            lines.extend(
+                f"    {DIFF_ROW_MARKERS.get(row.color, '?')} "
+                f"{row.refOSM} {row.nameOSM} | {row.refOperator} {row.nameOperator}"
+                for row in variantResult.diffRows
+            )
+            lines.extend(f"    ⚠ {error}" for error in variantResult.otherErrors)
+    for title, values in contextIssues(context):
+        lines.append(f"{title}:")
+        lines.extend(f"  {value}" for value in values)
+    return "\n".join(lines) + "\n"
+
+
+def renderCheckFragment(
+    env: "Environment",
+    compareResult: CompareResult,
+    context: RunContext,
+    startTime: str,
+    *,
+    partial: bool,
+) -> str:
+    return env.get_template("routeFragment.j2").render(
+        renderResults=compareResult.renderResults,
+        issues=contextIssues(context),
+        partialNote=PARTIAL_CHECK_NOTE if partial else None,
+        startTime=startTime,
+    )
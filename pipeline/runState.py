@@ -0,0 +1,57 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+from configuration import CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_RESET_SECONDS
+from pipeline.lastKnownGood import StaleData
+from pipeline.metrics import RunMetrics
+from scraper.resilience import CircuitBreakers
+
+
+class RunState:
+    """Metrics, fallbacks and circuit breakers of one run and the transport of its clients."""
+
+    def __init__(
+        self,
+        # snapshot runs record or replay every response with it
+        transport: httpx.BaseTransport | None = None,
+        *,
+        # replays don't reach the network, credentials aren't needed
+        offline: bool = False,
+    ) -> None:
+        self.metrics = RunMetrics()
+        self.staleData = StaleData(self.metrics)
+        self.circuitBreakers = CircuitBreakers(
+            CIRCUIT_BREAKER_FAILURES,
+            CIRCUIT_BREAKER_RESET_SECONDS,
+            self.metrics,
+        )
+        self.transport = transport
+        self.offline = offline
+
+    @property
+    def cacheBypassed(self) -> bool:
+        # snapshot runs fetch every page, so recordings are complete
+        # and replays don't depend on the local cache
+        return self.transport is not None
+
+
+# the daemon refreshes and checks routes side by side, each in its own run,
+# stage graphs carry the run into the threads of their stages
+CURRENT_RUN: ContextVar[RunState | None] = ContextVar("currentRun", default=None)
+
+
+@contextmanager
+def startRun(run: RunState) -> Iterator[RunState]:
+    token = CURRENT_RUN.set(run)
+    try:
+        yield run
+    finally:
+        CURRENT_RUN.reset(token)
+
+
+def currentRun() -> RunState:
+    # outside of a run, e.g. benchmarks of single functions, nothing reads the metrics
+    return CURRENT_RUN.get() or RunState()
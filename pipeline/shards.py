@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import os
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from starsep_utils import OverpassResult, Relation
+
+from gtfs.gtfsPatterns import GTFSPatternIndex
+from gtfs.gtfsShapes import GTFSShapes
+from model.gtfs import GTFSStop
+from model.operatorRoute import OperatorRoutes, ScrapedOSMRoute
+from model.runContext import RunContext, mergeRunContexts
+from model.types import StopRef
+from network.transitNetwork import TransitNetwork
+from osm.OSMRelationAnalyzer import (
+    OSMResults,
+    analyzeOSMRelations,
+    networkRelations,
+    parseRef,
+    scrapeOSMRoutes,
+)
+from pipeline.runState import currentRun
+from scraper.httpx_client import httpxClient
+
+SHARD_STEPS = ["prepare", "scrape", "analyze", "merge"]
+
+
+@dataclass(frozen=True)
+class ShardInput:
+    # one snapshot for all shards, each node downloading its own could differ
+    overpassResult: OverpassResult
+    apiResults: OperatorRoutes
+
+
+@dataclass(frozen=True)
+class ScrapeShardResult:
+    scrapedOSMRoutes: list[ScrapedOSMRoute]
+    context: RunContext
+
+
+@dataclass(frozen=True)
+class AnalyzeShardResult:
+    osmResults: OSMResults
+    context: RunContext
+
+
+def shardOf(key: str, shardCount: int) -> int:
+    # stable across processes and machines, unlike hash()
+    digest = hashlib.sha256(key.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shardCount
+
+
+def relationShardKey(relation: Relation) -> str:
+    # all variants of a route land in the same shard
+    ref = parseRef(relation.tags)
+    return ref if ref is not None else f"relation/{relation.id}"
+
+
+def shardPath(directory: Path, step: str, shardIndex: int | None = None) -> Path:
+    return directory / (
+        f"{step}.pickle" if shardIndex is None else f"{step}-{shardIndex}.pickle"
+    )
+
+
+def writePartial(path: Path, value: Any) -> None:  # noqa: ANN401
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # readers on other nodes never see a half written file
+    temporaryPath = path.with_suffix(f".{os.getpid()}.tmp")
+    with temporaryPath.open("wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    temporaryPath.replace(path)
+
+
+def readPartial(path: Path) -> Any:  # noqa: ANN401
+    with path.open("rb") as f:
+        return pickle.load(f)  # noqa: S301
+
+
+def prepareShards(
+    directory: Path,
+    overpassResult: OverpassResult,
+    apiResults: OperatorRoutes,
+) -> None:
+    writePartial(
+        shardPath(directory, "prepare"),
+        ShardInput(overpassResult=overpassResult, apiResults=apiResults),
+    )
+
+
+def runScrapeShard(
+    directory: Path,
+    shardIndex: int,
+    shardCount: int,
+    network: TransitNetwork,
+) -> None:
+    shardInput: ShardInput = readPartial(shardPath(directory, "prepare"))
+    relations = [
+        relation
+        for relation in networkRelations(
+            shardInput.overpassResult,
+            network.rootRelationId,
+        )
+        if shardOf(relationShardKey(relation), shardCount) == shardIndex
+    ]
+    logging.info(f"🧩 Shard {shardIndex}/{shardCount}: {len(relations)} relations")
+    context = RunContext()
+    with httpxClient(currentRun()) as httpClient:
+        scrapedOSMRoutes = scrapeOSMRoutes(relations, network, httpClient, context)
+    writePartial(
+        shardPath(directory, "scrape", shardIndex),
+        ScrapeShardResult(scrapedOSMRoutes=scrapedOSMRoutes, context=context),
+    )
+
+
+def runAnalyzeShard(
+    directory: Path,
+    shardIndex: int,
+    shardCount: int,
+    network: TransitNetwork,
+    gtfsStops: dict[StopRef, GTFSStop],
+    gtfsPatterns: GTFSPatternIndex,
+    gtfsShapes: GTFSShapes,
+) -> None:
+    shardInput: ShardInput = readPartial(shardPath(directory, "prepare"))
+    scrapeResults: list[ScrapeShardResult] = [
+        readPartial(shardPath(directory, "scrape", index))
+        for index in range(shardCount)
+    ]
+    # last stop refs are learned from all shards in the single-process order
+    relationOrder = {
+        relationId: position
+        for position, relationId in enumerate(shardInput.overpassResult.relations)
+    }
+    lastStopRefs = network.generateLastStopRefs(
+        sorted(
+            (
+                scrapedRoute
+                for scrapeResult in scrapeResults
+                for scrapedRoute in scrapeResult.scrapedOSMRoutes
+            ),
+            key=lambda scrapedRoute: relationOrder[scrapedRoute.route.id],
+        ),
+    )
+    context = RunContext()
+    osmResults = analyzeOSMRelations(
+        overpassResult=shardInput.overpassResult,
+        scrapedOSMRoutes=scrapeResults[shardIndex].scrapedOSMRoutes,
+        apiResults=shardInput.apiResults,
+        gtfsStops=gtfsStops,
+        gtfsPatterns=gtfsPatterns,
+        gtfsShapes=gtfsShapes,
+        lastStopRefs=lastStopRefs,
+        network=network,
+        context=context,
+    )
+    writePartial(
+        shardPath(directory, "analyze", shardIndex),
+        AnalyzeShardResult(osmResults=osmResults, context=context),
+    )
+
+
+def mergeShards(directory: Path, shardCount: int) -> tuple[OSMResults, RunContext]:
+    osmResults: OSMResults = {}
+    contexts = []
+    for shardIndex in range(shardCount):
+        scrapeResult: ScrapeShardResult = readPartial(
+            shardPath(directory, "scrape", shardIndex),
+        )
+        analyzeResult: AnalyzeShardResult = readPartial(
+            shardPath(directory, "analyze", shardIndex),
+        )
+        contexts.extend([scrapeResult.context, analyzeResult.context])
+        # refs are partitioned, so shards never return the same ref
+        osmResults.update(analyzeResult.osmResults)
+    return osmResults, mergeRunContexts(contexts)
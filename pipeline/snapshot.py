@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import threading
+import zipfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from network.transitNetwork import TransitNetwork
+from scraper.httpx_client import REDACTED_SECRET
+
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+# query parameters which are never written to a snapshot
+SECRET_QUERY_PARAMETERS = ["apikey"]
+# decoded bodies are stored, their transfer headers don't apply anymore
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+@dataclass(frozen=True)
+class RecordedResponse:
+    statusCode: int
+    headers: list[tuple[str, str]]
+    content: bytes
+
+
+def requestKey(request: httpx.Request) -> str:
+    url = request.url
+    for name in SECRET_QUERY_PARAMETERS:
+        if name in url.params:
+            url = url.copy_set_param(name, REDACTED_SECRET)
+    key = f"{request.method} {url}"
+    # Overpass queries are POSTed, the same url has different responses
+    content = request.read()
+    if len(content) > 0:
+        key += f" {hashlib.sha256(content).hexdigest()}"
+    return key
+
+
+def fileSha256(path: Path) -> str | None:
+    if not path.exists():
+        return None
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RecordingTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.BaseTransport | None = None) -> None:
+        self.transport = transport or httpx.HTTPTransport()
+        self.responses: dict[str, RecordedResponse] = {}
+        # stages scrape concurrently
+        self.lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = self.transport.handle_request(request)
+        content = response.read()
+        recorded = RecordedResponse(
+            statusCode=response.status_code,
+            headers=[
+                (name, value)
+                for name, value in response.headers.multi_items()
+                if name.lower() not in DROPPED_HEADERS
+            ],
+            content=content,
+        )
+        with self.lock:
+            self.responses[requestKey(request)] = recorded
+        return response
+
+    def close(self) -> None:
+        # shared by all clients of a run, closed once the recording ends
+        pass
+
+    def closeConnections(self) -> None:
+        self.transport.close()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    def __init__(
+        self, snapshotFile: zipfile.ZipFile, responses: dict[str, dict]
+    ) -> None:
+        self.snapshotFile = snapshotFile
+        self.responses = responses
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = requestKey(request)
+        if key not in self.responses:
+            message = f"{key} isn't in the snapshot"
+            raise httpx.ConnectError(message, request=request)
+        entry = self.responses[key]
+        return httpx.Response(
+            status_code=entry["statusCode"],
+            headers=[tuple(header) for header in entry["headers"]],
+            content=self.snapshotFile.read(entry["file"]),
+            request=request,
+        )
+
+    def close(self) -> None:
+        pass
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    networkNames: list[str]
+    startTime: datetime
+    # network name => sha256 of the GTFS zip used by the recorded run
+    gtfsSha256: dict[str, str | None]
+    transport: ReplayTransport
+
+
+@contextmanager
+def recordingSnapshot() -> Iterator[RecordingTransport]:
+    transport = RecordingTransport()
+    try:
+        yield transport
+    finally:
+        transport.closeConnections()
+
+
+def writeSnapshot(
+    path: Path,
+    transport: RecordingTransport,
+    networks: list[TransitNetwork],
+    startTime: datetime,
+) -> None:
+    responses = {}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as snapshotFile:
+        for index, key in enumerate(sorted(transport.responses)):
+            recorded = transport.responses[key]
+            fileName = f"responses/{index:06d}"
+            snapshotFile.writestr(fileName, recorded.content)
+            responses[key] = {
+                "statusCode": recorded.statusCode,
+                "headers": recorded.headers,
+                "file": fileName,
+            }
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "startTime": startTime.isoformat(),
+            "networks": [network.name for network in networks],
+            "gtfsSha256": {
+                network.name: fileSha256(network.gtfsFeed.zipPath)
+                for network in networks
+            },
+            "responses": responses,
+        }
+        snapshotFile.writestr(MANIFEST_NAME, json.dumps(manifest, indent=1))
+    logging.info(f"📼 Snapshot of {len(responses)} responses written to {path}")
+
+
+@contextmanager
+def openSnapshot(path: Path) -> Iterator[Snapshot]:
+    with zipfile.ZipFile(path) as snapshotFile:
+        manifest = json.loads(snapshotFile.read(MANIFEST_NAME))
+        if manifest["version"] != SNAPSHOT_VERSION:
+            message = f"Snapshot {path} has version {manifest['version']}, expected {SNAPSHOT_VERSION}"
+            raise ValueError(message)
+        yield Snapshot(
+            networkNames=manifest["networks"],
+            startTime=datetime.fromisoformat(manifest["startTime"]),
+            gtfsSha256=manifest["gtfsSha256"],
+            transport=ReplayTransport(snapshotFile, manifest["responses"]),
+        )
+
+
+def checkGTFSFeeds(snapshot: Snapshot, networks: list[TransitNetwork]) -> None:
+    # GTFS feeds are too large for snapshots, a replay needs the same local file
+    for network in networks:
+        expected = snapshot.gtfsSha256.get(network.name)
+        if fileSha256(network.gtfsFeed.zipPath) != expected:
+            message = (
+                f"GTFS feed {network.gtfsFeed.zipPath} differs from the one "
+                f"recorded in the snapshot (sha256 {expected})"
+            )
+            raise ValueError(message)
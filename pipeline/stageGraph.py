@@ -0,0 +1,139 @@
+import logging
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar, copy_context
+from dataclasses import dataclass, field
+from typing import Any
+
+# monotonic time when the running stage should give up waiting for upstreams,
+# each stage runs in its own worker thread with its own value
+STAGE_DEADLINE: ContextVar[float | None] = ContextVar("stageDeadline", default=None)
+
+
+@contextmanager
+def stageDeadline(seconds: float | None) -> Iterator[None]:
+    token = STAGE_DEADLINE.set(
+        None if seconds is None else time.monotonic() + seconds,
+    )
+    try:
+        yield
+    finally:
+        STAGE_DEADLINE.reset(token)
+
+
+def remainingStageSeconds() -> float | None:
+    deadline = STAGE_DEADLINE.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    function: Callable[..., Any]
+    # argument name => stage whose result is passed as that keyword argument
+    inputs: dict[str, str] = field(default_factory=dict)
+    # stages communicating through shared state, only ordering matters
+    after: list[str] = field(default_factory=list)
+    # seconds, afterwards requests of the stage fail fast and it falls back
+    # to last known good data, running work isn't interrupted
+    deadline: float | None = None
+
+    @property
+    def dependencies(self) -> set[str]:
+        return set(self.inputs.values()) | set(self.after)
+
+
+class StageGraph:
+    def __init__(
+        self,
+        # wraps every stage, e.g. a profiler attributing samples to stages
+        stageContext: Callable[[str], AbstractContextManager[None]] | None = None,
+    ) -> None:
+        self.stages: dict[str, Stage] = {}
+        self.durations: dict[str, float] = {}
+        self.stageContext = stageContext or (lambda _name: nullcontext())
+
+    def add(
+        self,
+        name: str,
+        function: Callable[..., Any],
+        # a list passes stage results under their own names,
+        # a dict renames them, e.g. per-network stages "warsaw.context"
+        inputs: list[str] | dict[str, str] | None = None,
+        after: list[str] | None = None,
+        deadline: float | None = None,
+    ) -> None:
+        if name in self.stages:
+            message = f"Duplicated stage {name}"
+            raise ValueError(message)
+        self.stages[name] = Stage(
+            name=name,
+            function=function,
+            inputs=(
+                dict(inputs)
+                if isinstance(inputs, dict)
+                else {name: name for name in inputs or []}
+            ),
+            after=after or [],
+            deadline=deadline,
+        )
+
+    def _runStage(self, stage: Stage, inputs: dict[str, Any]) -> Any:  # noqa: ANN401
+        start = time.perf_counter()
+        try:
+            with self.stageContext(stage.name), stageDeadline(stage.deadline):
+                return stage.function(**inputs)
+        finally:
+            self.durations[stage.name] = time.perf_counter() - start
+
+    def _validate(self) -> None:
+        for stage in self.stages.values():
+            unknown = stage.dependencies - self.stages.keys()
+            if len(unknown) > 0:
+                message = f"Stage {stage.name} depends on unknown stages {unknown}"
+                raise ValueError(message)
+
+    def _runStages(self, executor: ThreadPoolExecutor) -> dict[str, Any]:
+        results: dict[str, Any] = {}
+        pending = dict(self.stages)
+        running: dict[Future, Stage] = {}
+        while len(pending) > 0 or len(running) > 0:
+            for stage in list(pending.values()):
+                if stage.dependencies <= results.keys():
+                    del pending[stage.name]
+                    logging.info(f"▶️ Stage {stage.name}")
+                    # stages see context variables of the caller, e.g. the current run
+                    future = executor.submit(
+                        copy_context().run,
+                        self._runStage,
+                        stage,
+                        {
+                            argument: results[name]
+                            for argument, name in stage.inputs.items()
+                        },
+                    )
+                    running[future] = stage
+            if len(running) == 0:
+                message = f"Stages {list(pending)} have cyclic dependencies"
+                raise ValueError(message)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                results[stage.name] = future.result()
+        return results
+
+    def run(self, maxWorkers: int = 8) -> dict[str, Any]:
+        self._validate()
+        executor = ThreadPoolExecutor(max_workers=maxWorkers)
+        try:
+            results = self._runStages(executor)
+        except BaseException:
+            # the first failure surfaces at once and stages which haven't started
+            # are never submitted, running ones can't be interrupted and finish
+            # in their threads, the interpreter waits for them before exiting
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        return results
@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+from collections.abc import Iterable
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from compare.comparator import CompareResult
+from configuration import cacheDirectory, historyDatabasePath, metricsDirectory
+from pipeline.lastKnownGood import StaleSource
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
+ROUTE_PAGE_PREFIX = "route-"
+UNSAFE_FILE_NAME_CHARACTERS = re.compile(r"[^\w-]")
+
+
+@dataclass(frozen=True)
+class OutputOptions:
+    # a page per route with errors, linked from a lightweight index.html
+    splitOutput: bool = False
+    # .gz copies of exports for servers which serve precompressed files
+    compressExports: bool = False
+    # synthetic and test runs keep their history apart from the real one
+    historyDatabasePath: Path = historyDatabasePath
+    # compiled templates
+    cacheDirectory: Path = cacheDirectory
+    metricsDirectory: Path = metricsDirectory
+
+
+def routePageName(ref: str) -> str:
+    # flat next to index.html, so relative links in nav.j2 keep working
+    return f"{ROUTE_PAGE_PREFIX}{UNSAFE_FILE_NAME_CHARACTERS.sub('_', ref)}.html"
+
+
+def fileHash(path: Path) -> str | None:
+    if not path.exists():
+        return None
+    with path.open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class _HashingWriter:
+    # hashes the bytes which reach the file, compressed ones when gzip is on top
+    def __init__(self, file: BinaryIO) -> None:
+        self.file = file
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+
+def writeIfChanged(
+    path: Path,
+    chunks: Iterable[str],
+    *,
+    compress: bool = False,
+) -> bool:
+    # chunks are streamed to a temporary file and hashed on the way, the page is
+    # never held in memory, unchanged files keep their mtime and don't show up
+    # in the gh-pages diff
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporaryPath = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    with temporaryPath.open("wb") as temporaryFile:
+        f = _HashingWriter(temporaryFile)
+        # no name or timestamp in the gzip header, same content gives the same bytes
+        with (
+            gzip.GzipFile(filename="", fileobj=f, mode="wb", mtime=0)
+            if compress
+            else nullcontext(f)
+        ) as output:
+            for chunk in chunks:
+                output.write(chunk.encode())
+    if fileHash(path) == f.digest.hexdigest():
+        temporaryPath.unlink()
+        return False
+    temporaryPath.replace(path)
+    return True
+
+
+def renderRoutePages(
+    env: "Environment",
+    compareResults: CompareResult,
+    directory: Path,
+    # without the rest of the shared context, unchanged pages aren't rewritten
+    staleSources: list[StaleSource] | None = None,
+) -> int:
+    template = env.get_template("route.j2")
+    pageNames = set()
+    written = 0
+    for ref, result in compareResults.renderResults.items():
+        if not result.error:
+            continue
+        pageName = routePageName(ref)
+        pageNames.add(pageName)
+        written += writeIfChanged(
+            directory / pageName,
+            template.generate(
+                ref=ref,
+                result=result,
+                staleSources=staleSources or [],
+            ),
+        )
+    # pages of routes which are fixed or gone
+    for path in directory.glob(f"{ROUTE_PAGE_PREFIX}*.html"):
+        if path.name not in pageNames:
+            path.unlink()
+    logging.info(f"📄 {written}/{len(pageNames)} route pages changed")
+    return written
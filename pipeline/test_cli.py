@@ -0,0 +1,49 @@
+import pytest
+
+from pipeline.cli import parseArguments
+
+
+def testParseArgumentsDefaults() -> None:
+    arguments = parseArguments([])
+    assert arguments.network == []
+    assert arguments.shards == 1
+    assert not arguments.serve
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["--serve", "--shards=4"],
+        ["--profile", "--record-snapshot=run.zip"],
+        ["--replay-snapshot=run.zip", "--serve"],
+        ["--route=520", "--serve"],
+        ["--relation=123", "--shards=4"],
+        ["--changes", "1", "2", "--profile"],
+        ["--timeline=520", "--route=520"],
+        ["--shard-step=scrape", "--record-snapshot=run.zip"],
+    ],
+)
+def testParseArgumentsRejectsConflictingModes(argv: list[str]) -> None:
+    with pytest.raises(SystemExit):
+        parseArguments(argv)
+
+
+def testParseArgumentsRejectsManyNetworksForSingleNetworkModes(mocker) -> None:  # noqa: ANN001
+    mocker.patch.dict("pipeline.cli.NETWORKS", {"other": mocker.Mock()})
+    assert parseArguments(["--network=warsaw", "--network=other"]).network == [
+        "warsaw",
+        "other",
+    ]
+    assert parseArguments(["--network=warsaw", "--serve"]).serve
+    for argv in [["--serve"], ["--network=warsaw", "--network=other", "--route=520"]]:
+        with pytest.raises(SystemExit):
+            parseArguments(argv)
+
+
+def testParseArgumentsCombinesOptionsOfOneMode() -> None:
+    arguments = parseArguments(["--route=520", "--relation=123"])
+    assert (arguments.route, arguments.relation) == (["520"], [123])
+    assert parseArguments(["--changes", "1", "2", "--timeline=520"]).timeline == "520"
+    # local shard workers get both options
+    arguments = parseArguments(["--shards=4", "--shard-step=scrape", "--shard-index=0"])
+    assert (arguments.shards, arguments.shard_step) == (4, "scrape")
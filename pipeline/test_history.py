@@ -0,0 +1,80 @@
+from contextlib import closing
+from pathlib import Path
+
+from compare.comparator import compareStops
+from gtfs.osmGTFSStopsComparer import compareOSMAndGTFSStops
+from model.runContext import RunContext
+from model.stopData import StopData
+from osm.OSMRelationAnalyzer import VariantResult
+from pipeline.history import (
+    Problem,
+    RouteTimelineEntry,
+    connectHistory,
+    previousRunId,
+    problemChanges,
+    recordRun,
+    routeTimeline,
+    runProblems,
+)
+from pipeline.variantFixtures import VariantFactory
+
+STOPS = [StopData(ref="100101", name="Kijowska 01")]
+# problems of the first run come only from other errors
+MATCHING_STOPS = {
+    "osmStops": STOPS,
+    "operatorStops": STOPS,
+    "stopsDetour": [False],
+    "stopsNew": [False],
+}
+
+
+def _recordRun(connection, startTime: str, variant: VariantResult) -> int:  # noqa: ANN001
+    context = RunContext()
+    context.addOSMRefName("100101", "Kijowska 01")
+    context.addOSMRefName("100201", "Targowa 01")
+    compareResult = compareStops({"520": [variant]}, context.osmRefToName)
+    problems = runProblems(
+        compareResult,
+        compareOSMAndGTFSStops({}, context),
+        notLinkedWtpUrls=[],
+        context=context,
+    )
+    return recordRun(connection, "warsaw", startTime, compareResult, problems)
+
+
+def testHistory(tmp_path: Path, makeVariant: VariantFactory) -> None:
+    with closing(connectHistory(tmp_path / "history.sqlite")) as connection:
+        firstRunId = _recordRun(
+            connection,
+            "2025-01-01T00:00:00+00:00",
+            makeVariant(otherErrors={"Trasa ma przerwy"}, **MATCHING_STOPS),
+        )
+        secondRunId = _recordRun(
+            connection,
+            "2025-01-02T00:00:00+00:00",
+            makeVariant(
+                otherErrors={"Brak przystanku końcowego"},
+                **MATCHING_STOPS
+                | {"osmStops": [StopData(ref="100201", name="Targowa 01")]},
+            ),
+        )
+        assert previousRunId(connection, "warsaw", secondRunId) == firstRunId
+        changes = problemChanges(connection, firstRunId, secondRunId)
+        assert changes.fromStartTime == "2025-01-01T00:00:00+00:00"
+        assert changes.new == [
+            Problem(
+                "routeError",
+                "520",
+                "7 Brak przystanku końcowego",
+                "Brak przystanku końcowego",
+            ),
+            Problem("stops", "520", "7", "Bus 520"),
+        ]
+        assert changes.resolved == [
+            Problem("routeError", "520", "7 Trasa ma przerwy", "Trasa ma przerwy"),
+        ]
+        assert problemChanges(connection, None, firstRunId).resolved == []
+        assert routeTimeline(connection, "warsaw", "520") == [
+            RouteTimelineEntry(firstRunId, "2025-01-01T00:00:00+00:00", 1, 1),
+            RouteTimelineEntry(secondRunId, "2025-01-02T00:00:00+00:00", 1, 1),
+        ]
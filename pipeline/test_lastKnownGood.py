@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+from pipeline.lastKnownGood import API_UM_SOURCE, withLastKnownGood
+from pipeline.runState import RunState
+
+
+def testLastKnownGoodStandsInForFailedDownloads(
+    tmp_path: Path,
+    mocker,  # noqa: ANN001
+) -> None:
+    mocker.patch("pipeline.lastKnownGood.lastKnownGoodDirectory", tmp_path)
+    run = RunState()
+
+    def fail() -> str:
+        message = "API UM is down"
+        raise httpx.ConnectError(message)
+
+    with pytest.raises(httpx.ConnectError):
+        withLastKnownGood(run, API_UM_SOURCE, "apiUM.json", fail, json.loads)
+    assert withLastKnownGood(
+        run, API_UM_SOURCE, "apiUM.json", lambda: "[1]", json.loads
+    ) == [1]
+    # responses which don't parse don't replace the last known good one
+    assert withLastKnownGood(
+        run, API_UM_SOURCE, "apiUM.json", lambda: "[", json.loads
+    ) == [1]
+    assert withLastKnownGood(run, API_UM_SOURCE, "apiUM.json", fail, json.loads) == [1]
+    [staleSource] = run.staleData.summary()
+    assert staleSource.title == "Trasy z API UM Warszawa"
+    assert staleSource.fetchedAt is not None
+    run.staleData.addMissing(API_UM_SOURCE, "520")
+    assert run.staleData.summary()[0].missingItems == ["520"]
+    # the unparsable response and the failed download fell back to the last one
+    fallbacks = run.metrics.counter(
+        "upstream_fallbacks_total", source=API_UM_SOURCE, result="stale"
+    )
+    assert fallbacks == 2
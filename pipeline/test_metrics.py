@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+from pipeline.metrics import (
+    RunMetrics,
+    healthchecksWithSummary,
+    metricsSummary,
+    prometheusText,
+    writeMetrics,
+)
+
+
+def testMetrics(tmp_path: Path) -> None:
+    metrics = RunMetrics()
+    metrics.setGauge("stage_duration_seconds", 1.5, stage="warsaw.osmResults")
+    metrics.observe("http_request_duration_seconds", 0.2, [0.1, 1.0], host="a.pl")
+    metrics.observe("http_request_duration_seconds", 2.0, [0.1, 1.0], host="a.pl")
+    metrics.increment("wtp_cache_lookups_total", result="hit")
+    metrics.increment("wtp_cache_lookups_total", 3, result="miss")
+    metrics.increment("wtp_cache_stale_total")
+    metrics.increment("wtp_cache_tier_lookups_total", 4, tier="memory", result="miss")
+    metrics.increment("wtp_cache_tier_lookups_total", tier="disk", result="hit")
+    metrics.increment("wtp_cache_tier_lookups_total", 3, tier="disk", result="miss")
+    metrics.increment("relations_analyzed_total", 4, network="warsaw")
+    metrics.increment("upstream_fallbacks_total", 2, source="wtp", result="stale")
+    metrics.increment("http_circuit_breaker_trips_total", host="a.pl")
+
+    lines = prometheusText(metrics).splitlines()
+    assert "# TYPE osm_wtp_http_request_duration_seconds histogram" in lines
+    assert [line for line in lines if "_bucket" in line] == [
+        'osm_wtp_http_request_duration_seconds_bucket{host="a.pl",le="0.1"} 0',
+        'osm_wtp_http_request_duration_seconds_bucket{host="a.pl",le="1.0"} 1',
+        'osm_wtp_http_request_duration_seconds_bucket{host="a.pl",le="+Inf"} 2',
+    ]
+    assert 'osm_wtp_wtp_cache_lookups_total{result="miss"} 3' in lines
+
+    summary = metricsSummary(metrics)
+    assert summary["stageDurationSeconds"] == {"warsaw.osmResults": 1.5}
+    assert summary["http"] == {"a.pl": {"requests": 2, "meanSeconds": 1.1}}
+    assert summary["wtpCache"]["hitRatio"] == 0.25
+    assert summary["wtpCache"]["staleRatio"] == 0.25
+    assert summary["wtpCache"]["tierHitRatio"] == {"memory": 0, "disk": 0.25}
+    assert summary["relationsAnalyzed"] == {"warsaw": 4}
+    assert summary["fallbacks"] == {"wtp": {"stale": 2}}
+    assert summary["circuitBreakerTrips"] == {"a.pl": 1}
+
+    writtenSummary = writeMetrics(metrics, tmp_path)
+    assert writtenSummary["peakRssBytes"] > 0
+    assert json.loads((tmp_path / "metrics.json").read_text()) == writtenSummary
+    assert "osm_wtp_peak_rss_bytes" in (tmp_path / "metrics.prom").read_text()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "metrics.json",
+        "metrics.prom",
+    ]
+
+
+def testHealthchecksWithSummaryFailure(mocker, monkeypatch: pytest.MonkeyPatch) -> None:  # noqa: ANN001
+    monkeypatch.setenv("HEALTHCHECKS_URL", "https://hc-ping.com/test")
+    message = "down"
+    post = mocker.patch("httpx.post", side_effect=httpx.ConnectError(message))
+    healthchecksWithSummary({"wtpPagesParsed": 1})
+    post.assert_called_once_with(
+        "https://hc-ping.com/test", content='{"wtpPagesParsed": 1}'
+    )
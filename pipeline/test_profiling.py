@@ -0,0 +1,54 @@
+import time
+from pathlib import Path
+
+from starsep_utils import logDuration
+
+from pipeline.profiling import LogDuration, PipelineProfiler
+from pipeline.stageGraph import StageGraph
+
+
+def busy(seconds: float) -> int:
+    end = time.perf_counter() + seconds
+    iterations = 0
+    while time.perf_counter() < end:
+        iterations += 1
+    return iterations
+
+
+def busySection() -> int:
+    with logDuration("Busy section"):
+        return busy(0.1)
+
+
+def testProfiler(tmp_path: Path) -> None:
+    originalEnter = LogDuration.__enter__
+    profiler = PipelineProfiler(tmp_path, deterministic=True, interval=0.001)
+    graph = StageGraph(profiler.stage)
+    graph.add("section", busySection)
+    graph.add("plain", lambda: busy(0.05), after=["section"])
+    with profiler.profiling():
+        graph.run(maxWorkers=1)
+    assert LogDuration.__enter__ is originalEnter
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "plain.collapsed",
+        "plain.prof",
+        "section.collapsed",
+        "section.prof",
+        "stacks.collapsed",
+        "summary.txt",
+    ]
+    sectionStacks = (tmp_path / "section.collapsed").read_text().splitlines()
+    assert all(line.startswith("section;") for line in sectionStacks)
+    # the section label is placed right below the function which opened it
+    assert any(
+        line.split(";⌛ Busy section;busy (")[0]
+        .split(";")[-1]
+        .startswith("busySection")
+        for line in sectionStacks
+        if ";⌛ Busy section;busy (" in line
+    )
+    assert "⌛" not in (tmp_path / "plain.collapsed").read_text()
+    assert profiler.hotFunctions("plain")[0][0].startswith("busy (")
+    summary = (tmp_path / "summary.txt").read_text()
+    assert "== section: cProfile" in summary
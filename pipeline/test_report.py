@@ -0,0 +1,61 @@
+import dataclasses
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from compare.comparator import compareStops
+from gtfs.osmGTFSStopsComparer import compareOSMAndGTFSStops
+from model.runContext import RunContext
+from pipeline.report import (
+    renderIndex,
+    renderStops,
+    sharedTemplateContext,
+    templateEnvironment,
+)
+from pipeline.staticOutput import OutputOptions, renderRoutePages
+from pipeline.variantFixtures import makeVariantResult
+from warsaw.network import warsawNetwork
+
+LINKS = [f"https://osm.org/relation/{osmId}" for osmId in range(20)]
+
+
+def _writeRun(outputDirectory: Path, startTime: datetime, links: list[str]) -> int:
+    context = RunContext()
+    for link in links:
+        context.disusedStop.add(link)
+        context.missingName.add(link)
+        context.missingRouteUrl.add((link, "Linia 520"))
+        context.addOSMRefName("100101", f"Kijowska {link}")
+    compareResult = compareStops(
+        {"520": [makeVariantResult(unknownRoles={"platform_entry", "stop_exit"})]},
+        context.osmRefToName,
+    )
+    env = templateEnvironment()
+    network = dataclasses.replace(warsawNetwork, outputDirectory=outputDirectory)
+    sharedContext = sharedTemplateContext(startTime)
+    return (
+        renderIndex(
+            env,
+            compareResult,
+            [],
+            context,
+            sharedContext,
+            network,
+            outputOptions=OutputOptions(),
+        )
+        + renderStops(
+            env,
+            compareResult,
+            compareOSMAndGTFSStops({}, context),
+            context,
+            sharedContext,
+            network,
+        )
+        + renderRoutePages(env, compareResult, outputDirectory)
+    )
+
+
+def testIdenticalRunsWriteNoFiles(tmp_path: Path) -> None:
+    startTime = datetime(2025, 1, 1, tzinfo=UTC)
+    assert _writeRun(tmp_path, startTime, LINKS) == 3
+    # a later run finds the same problems in a different order
+    assert _writeRun(tmp_path, startTime + timedelta(days=1), LINKS[::-1]) == 0
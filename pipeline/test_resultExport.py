@@ -0,0 +1,88 @@
+import gzip
+import json
+from pathlib import Path
+
+from compare.comparator import compareStops
+from gtfs.osmGTFSStopsComparer import compareOSMAndGTFSStops
+from model.gtfs import GTFSStop
+from model.osm import OSMStop
+from model.runContext import RunContext
+from pipeline.resultExport import (
+    EXPORT_SCHEMA_VERSION,
+    lastRunJson,
+    resultJsonChunks,
+    stopProblemsGeoJsonChunks,
+)
+from pipeline.staticOutput import writeIfChanged
+from pipeline.variantFixtures import VariantFactory
+
+
+def _osmStop(ref: str, lat: float, lon: float) -> OSMStop:
+    return OSMStop(
+        lat=lat, lon=lon, ref=ref, name=f"Przystanek {ref}", osmId=1, osmType="node"
+    )
+
+
+def testResultExport(makeVariant: VariantFactory) -> None:
+    context = RunContext()
+    context.addOSMRefName("100101", "Kijowska 01")
+    context.wtpStopRefs.update({"100101", "100202"})
+    context.allOSMRefs.add("100101")
+    context.addOSMStopLocation(_osmStop("100101", 52.25, 21.03), fromStop=True)
+    context.addOSMStopLocation(_osmStop("100301", 52.26, 21.04), fromStop=True)
+    gtfsStops = {
+        # 1 km away from the OSM stop
+        "100101": GTFSStop(ref="100101", name="Kijowska 01", lat=52.259, lon=21.03),
+        "100401": GTFSStop(ref="100401", name="Targowa 01", lat=52.27, lon=21.05),
+    }
+    compareResult = compareStops(
+        {"520": [makeVariant(otherErrors={"Trasa ma przerwy"})]},
+        context.osmRefToName,
+    )
+    stopsResult = compareOSMAndGTFSStops(gtfsStops, context)
+
+    export = json.loads(
+        "".join(
+            resultJsonChunks(
+                "warsaw",
+                compareResult,
+                stopsResult,
+                ["https://www.wtp.waw.pl/rozklady-jazdy/?wtp_md=3&wtp_ln=521"],
+                context,
+            ),
+        ),
+    )
+    assert export["version"] == EXPORT_SCHEMA_VERSION
+    # unchanged results keep results.json unchanged between runs
+    assert "startTime" not in export
+    variant = export["routes"]["520"]["variants"][0]
+    assert variant["diffRows"][1] == ["+", "-", "-", "100202", "Dworzec Wileński 02"]
+    assert variant["otherErrors"] == ["Trasa ma przerwy"]
+    assert export["stops"]["missingRefsInOSM"] == [["100202", "Dworzec Wileński 02"]]
+    assert export["stops"]["osmStopRefsNotInGTFS"] == ["100301"]
+
+    geoJson = json.loads("".join(stopProblemsGeoJsonChunks("warsaw", stopsResult)))
+    assert [
+        (feature["properties"]["problem"], feature["properties"]["ref"])
+        for feature in geoJson["features"]
+    ] == [("farAway", "100101"), ("notInGTFS", "100301"), ("notInOSM", "100401")]
+    assert geoJson["features"][0]["geometry"]["coordinates"] == [
+        [21.03, 52.25],
+        [21.03, 52.259],
+    ]
+
+
+def testLastRunJson() -> None:
+    assert json.loads(lastRunJson("warsaw", "2025-01-01T00:00:00+00:00", 42)) == {
+        "version": EXPORT_SCHEMA_VERSION,
+        "network": "warsaw",
+        "startTime": "2025-01-01T00:00:00+00:00",
+        "generationSeconds": 42,
+    }
+
+
+def testCompressedExportIsReproducible(tmp_path: Path) -> None:
+    path = tmp_path / "results.json.gz"
+    assert writeIfChanged(path, ['{"version":', "1}"], compress=True)
+    assert not writeIfChanged(path, ['{"version":1}'], compress=True)
+    assert gzip.decompress(path.read_bytes()) == b'{"version":1}'
@@ -0,0 +1,41 @@
+from compare.comparator import compareStops
+from model.runContext import RunContext
+from pipeline.report import templateEnvironment
+from pipeline.routeCheckReport import formatCheckResult, renderCheckFragment
+from pipeline.variantFixtures import VariantFactory
+
+
+def testFormatCheckResult(makeVariant: VariantFactory) -> None:
+    context = RunContext()
+    context.addOSMRefName("100101", "Kijowska 01")
+    context.missingRouteUrl.add(("https://osm.org/relation/8", "Linia 520"))
+    compareResult = compareStops(
+        {
+            "520": [
+                makeVariant(
+                    osmName="Bus 520: Marysin => Metro Marymont",
+                    otherErrors={"Trasa ma przerwy"},
+                ),
+            ],
+        },
+        context.osmRefToName,
+    )
+    assert formatCheckResult(compareResult, context, partial=False).splitlines() == [
+        "520: błędy",
+        "  Bus 520: Marysin => Metro Marymont https://osm.org/relation/7 https://www.wtp.waw.pl/rozklady-jazdy/?wtp_md=3&wtp_ln=520",
+        "      100101 Kijowska 01 | 100101 Kijowska 01",
+        "    + - - | 100202 Dworzec Wileński 02",
+        "    ⚠ Trasa ma przerwy",
+        "Brakujący url dla trasy:",
+        "  https://osm.org/relation/8 Linia 520",
+    ]
+    fragment = renderCheckFragment(
+        templateEnvironment(),
+        compareResult,
+        context,
+        startTime="2025-01-01T00:00:00+00:00",
+        partial=True,
+    )
+    assert "Wynik częściowy" in fragment
+    assert "Błąd dla Bus 520" in fragment
+    assert "Dworzec Wileński 02" in fragment
@@ -0,0 +1,183 @@
+import dataclasses
+import multiprocessing
+from array import array
+from pathlib import Path
+
+from starsep_utils import Node, OverpassResult, Relation, Way
+from starsep_utils.overpass import KeyDict, RelationMember
+
+from compare.comparator import compareStops
+from configuration import MISSING_REF
+from gtfs.gtfsPatterns import buildPatternIndex
+from gtfs.gtfsShapes import GTFSShapes
+from model.operatorRoute import OperatorRouteResult
+from model.runContext import RunContext
+from model.stopData import StopData
+from osm.OSMRelationAnalyzer import (
+    analyzeOSMRelations,
+    networkRelations,
+    scrapeOSMRoutes,
+)
+from pipeline.shards import (
+    mergeShards,
+    prepareShards,
+    runAnalyzeShard,
+    runScrapeShard,
+    shardOf,
+)
+from warsaw.network import warsawNetwork
+
+SHARD_COUNT = 3
+ROOT_RELATION_ID = 1
+STOPS = [
+    StopData(ref="100101", name="Kijowska 01"),
+    StopData(ref="100201", name="Targowa 01"),
+    StopData(ref="100301", name="Ząbkowska 01"),
+    StopData(ref="100401", name="Zamoyskiego 01"),
+]
+ROUTE_REFS = ["1", "2", "3", "4", "5", "6"]
+
+
+def _overpassResult() -> OverpassResult:
+    nodes = {
+        index + 1: Node(
+            lat=52.25,
+            lon=21.03 + index * 0.005,
+            id=index + 1,
+            type="node",
+            tags=KeyDict(
+                {
+                    "ref": stop.ref,
+                    "name": stop.name,
+                    "public_transport": "stop_position",
+                }
+            ),
+        )
+        for index, stop in enumerate(STOPS)
+    }
+    way = Way(
+        id=100, type="way", tags=KeyDict({"highway": "primary"}), nodes=[1, 2, 3, 4]
+    )
+    relations = {
+        ROOT_RELATION_ID: Relation(
+            id=ROOT_RELATION_ID,
+            type="relation",
+            tags=KeyDict({"type": "network"}),
+            members=[
+                RelationMember(type="relation", id=1000 + int(routeRef), role="")
+                for routeRef in ROUTE_REFS
+            ],
+        ),
+    }
+    for routeRef in ROUTE_REFS:
+        relationId = 1000 + int(routeRef)
+        # every other route misses a stop
+        stopNodes = [1, 2, 3, 4] if int(routeRef) % 2 == 0 else [1, 3, 4]
+        relations[relationId] = Relation(
+            id=relationId,
+            type="relation",
+            tags=KeyDict(
+                {
+                    "type": "route",
+                    "route": "bus",
+                    "ref": routeRef,
+                    "name": f"Autobus {routeRef}",
+                    "network": "ZTM Warszawa",
+                    "url": f"https://www.wtp.waw.pl/rozklady-jazdy/?wtp_md=3&wtp_ln={routeRef}",
+                }
+            ),
+            members=[
+                RelationMember(type="way", id=100, role=""),
+                *(
+                    RelationMember(type="node", id=node, role="stop")
+                    for node in stopNodes
+                ),
+            ],
+        )
+    return OverpassResult(nodes=nodes, ways={100: way}, relations=relations)
+
+
+def _fakeScrapeLink(link: str, httpClient, context: RunContext) -> OperatorRouteResult:  # noqa: ANN001, ARG001
+    routeRef = link.rsplit("=", 1)[1]
+    # route 1 runs backwards, it is the only one which knows the ref of Zamoyskiego
+    stops = list(reversed(STOPS)) if routeRef == "1" else list(STOPS)
+    stops[-1] = StopData(ref=MISSING_REF, name=stops[-1].name)
+    context.wtpSeenLinks.add((routeRef, "A", "0"))
+    return OperatorRouteResult(
+        unavailable=False,
+        detour=False,
+        new=False,
+        short=False,
+        stops=stops,
+        stopsDetour=[False] * len(stops),
+        stopsNew=[False] * len(stops),
+    )
+
+
+def _gtfsInputs() -> dict:
+    return {
+        "gtfsStops": {},
+        "gtfsPatterns": buildPatternIndex([]),
+        "gtfsShapes": GTFSShapes(shapeRanges={}, lats=array("d"), lons=array("d")),
+    }
+
+
+def _runProcesses(target, args: list[tuple]) -> None:  # noqa: ANN001
+    # forked processes stand in for nodes and inherit the fake scraper
+    forkContext = multiprocessing.get_context("fork")
+    processes = [
+        forkContext.Process(target=target, args=shardArgs) for shardArgs in args
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+
+def testShardedRunMatchesSingleProcess(tmp_path: Path) -> None:
+    network = dataclasses.replace(
+        warsawNetwork,
+        rootRelationId=ROOT_RELATION_ID,
+        scrapeOperatorRoute=_fakeScrapeLink,
+    )
+    assert len({shardOf(routeRef, SHARD_COUNT) for routeRef in ROUTE_REFS}) > 1
+
+    context = RunContext()
+    scrapedOSMRoutes = scrapeOSMRoutes(
+        networkRelations(_overpassResult(), ROOT_RELATION_ID),
+        network,
+        httpClient=None,
+        context=context,
+    )
+    osmResults = analyzeOSMRelations(
+        overpassResult=_overpassResult(),
+        scrapedOSMRoutes=scrapedOSMRoutes,
+        apiResults={},
+        lastStopRefs=network.generateLastStopRefs(scrapedOSMRoutes),
+        network=network,
+        context=context,
+        **_gtfsInputs(),
+    )
+    expected = compareStops(osmResults, context.osmRefToName)
+
+    prepareShards(tmp_path, _overpassResult(), apiResults={})
+    _runProcesses(
+        runScrapeShard,
+        [(tmp_path, index, SHARD_COUNT, network) for index in range(SHARD_COUNT)],
+    )
+    gtfsInputs = _gtfsInputs()
+    _runProcesses(
+        runAnalyzeShard,
+        [
+            (tmp_path, index, SHARD_COUNT, network, *gtfsInputs.values())
+            for index in range(SHARD_COUNT)
+        ],
+    )
+    mergedOSMResults, mergedContext = mergeShards(tmp_path, SHARD_COUNT)
+
+    assert mergedContext == context
+    assert compareStops(mergedOSMResults, mergedContext.osmRefToName) == expected
+    # the last stop of route 6 is learned from route 1 in another shard
+    assert shardOf("6", SHARD_COUNT) != shardOf("1", SHARD_COUNT)
+    assert expected.renderResults["6"].variantResults == []
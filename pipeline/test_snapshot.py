@@ -0,0 +1,72 @@
+import dataclasses
+from array import array
+from pathlib import Path
+
+import httpx
+import pytest
+
+from benchmarks.fixtures import fixtureTransport
+from configuration import OVERPASS_URL
+from gtfs.gtfsPatterns import buildPatternIndex
+from gtfs.gtfsShapes import GTFSShapes
+from main import recordSnapshotRun, replaySnapshotRun
+from pipeline.snapshot import openSnapshot, requestKey
+from pipeline.staticOutput import OutputOptions
+from warsaw.network import warsawNetwork
+
+
+def testRequestKeyRedactsSecrets() -> None:
+    key = requestKey(
+        httpx.Request("GET", "https://api.um.warszawa.pl/api/?apikey=secret&id=1"),
+    )
+    assert key == "GET https://api.um.warszawa.pl/api/?apikey=redacted&id=1"
+    first = requestKey(httpx.Request("POST", OVERPASS_URL, data={"data": "1"}))
+    second = requestKey(httpx.Request("POST", OVERPASS_URL, data={"data": "2"}))
+    assert first != second
+
+
+def testReplayProducesRecordedOutput(
+    tmp_path: Path,
+    mocker,  # noqa: ANN001
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    mocker.patch("httpx.HTTPTransport", return_value=fixtureTransport())
+    mocker.patch("main.loadGTFSStops", return_value={})
+    mocker.patch("main.loadGTFSPatterns", return_value=buildPatternIndex([]))
+    mocker.patch(
+        "main.loadGTFSShapes",
+        return_value=GTFSShapes(shapeRanges={}, lats=array("d"), lons=array("d")),
+    )
+    monkeypatch.setenv("API_KEY", "secret")
+    snapshotPath = tmp_path / "snapshot.zip"
+    network = dataclasses.replace(warsawNetwork, outputDirectory=tmp_path / "recorded")
+    recordSnapshotRun(
+        [network],
+        snapshotPath,
+        outputOptions=OutputOptions(
+            historyDatabasePath=tmp_path / "history.sqlite",
+            cacheDirectory=tmp_path / "cache",
+            metricsDirectory=tmp_path / "metrics",
+        ),
+    )
+    assert b"secret" not in snapshotPath.read_bytes()
+    with openSnapshot(snapshotPath) as snapshot:
+        assert snapshot.networkNames == ["warsaw"]
+        assert any("api.um.warszawa.pl" in key for key in snapshot.transport.responses)
+
+    # no network and no API key, every response comes from the snapshot
+    mocker.patch("httpx.HTTPTransport", side_effect=AssertionError)
+    monkeypatch.delenv("API_KEY")
+    results = replaySnapshotRun(
+        snapshotPath,
+        outputOptions=OutputOptions(cacheDirectory=tmp_path / "cache"),
+    )
+    assert len(results["warsaw.apiResults"]) > 0
+    assert results["warsaw.compareResults"].refs == ["17", "520"]
+    for fileName in ["results.json", "index.html", "stop-problems.geojson"]:
+        assert (tmp_path / "snapshot" / "osm-wtp" / fileName).read_text() == (
+            tmp_path / "recorded" / fileName
+        ).read_text()
+    assert (tmp_path / "snapshot" / "history.sqlite").exists()
+    assert (tmp_path / "snapshot" / "metrics" / "metrics.json").exists()
+    assert not (tmp_path / "recorded" / "metrics.json").exists()
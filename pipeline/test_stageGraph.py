@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from pipeline.runState import RunState, currentRun, startRun
+from pipeline.stageGraph import StageGraph, remainingStageSeconds
+
+
+def testStageGraphPassesResults() -> None:
+    graph = StageGraph()
+    graph.add("sum", lambda a, b: a + b, inputs=["a", "b"])
+    graph.add("a", lambda: 1)
+    graph.add("b", lambda: 2)
+    assert graph.run() == {"a": 1, "b": 2, "sum": 3}
+    assert graph.durations.keys() == {"a", "b", "sum"}
+
+
+def testStageGraphRenamesInputs() -> None:
+    graph = StageGraph()
+    graph.add("warsaw.a", lambda: 1)
+    graph.add("warsaw.double", lambda a: 2 * a, inputs={"a": "warsaw.a"})
+    assert graph.run()["warsaw.double"] == 2
+
+
+def testStageGraphRunsIndependentStagesConcurrently() -> None:
+    # both stages have to be running at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    order: list[str] = []
+    graph = StageGraph()
+    graph.add("first", barrier.wait)
+    graph.add("second", barrier.wait)
+    graph.add("last", lambda: order.append("last"), after=["first", "second"])
+    graph.run()
+    assert order == ["last"]
+
+
+def testStageGraphRejectsInvalidGraphs() -> None:
+    graph = StageGraph()
+    graph.add("a", lambda b: b, inputs=["b"])
+    graph.add("b", lambda a: a, inputs=["a"])
+    with pytest.raises(ValueError, match="cyclic"):
+        graph.run()
+    graph = StageGraph()
+    graph.add("a", lambda missing: missing, inputs=["missing"])
+    with pytest.raises(ValueError, match="unknown"):
+        graph.run()
+
+
+def testStageGraphPropagatesFailures() -> None:
+    def fail() -> None:
+        message = "boom"
+        raise RuntimeError(message)
+
+    graph = StageGraph()
+    graph.add("fail", fail)
+    graph.add("next", lambda fail: fail, inputs=["fail"])
+    with pytest.raises(RuntimeError, match="boom"):
+        graph.run()
+
+
+def testStageGraphSetsDeadlinesOfStages() -> None:
+    graph = StageGraph()
+    graph.add("limited", remainingStageSeconds, deadline=60)
+    graph.add("unlimited", remainingStageSeconds)
+    results = graph.run()
+    assert 0 < results["limited"] <= 60
+    assert results["unlimited"] is None
+
+
+def testStageGraphFailsWithoutWaitingForRunningStages() -> None:
+    release = threading.Event()
+    started: list[str] = []
+
+    def fail() -> None:
+        message = "boom"
+        raise RuntimeError(message)
+
+    graph = StageGraph()
+    graph.add("slow", lambda: release.wait(timeout=5))
+    graph.add("fail", fail)
+    graph.add("next", lambda: started.append("next"), after=["slow"])
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError, match="boom"):
+        graph.run()
+    assert time.perf_counter() - start < 1
+    release.set()
+    assert started == []
+
+
+def testStagesRunInTheCallersRun() -> None:
+    graph = StageGraph()
+    graph.add("run", currentRun)
+    with startRun(RunState()) as run:
+        assert graph.run()["run"] is run
+    # another run, e.g. a route check of the daemon during a refresh
+    with startRun(RunState()) as otherRun:
+        assert graph.run()["run"] is otherRun
@@ -0,0 +1,64 @@
+from datetime import UTC, datetime
+from pathlib import Path
+
+from compare.comparator import compareStops
+from model.stopData import StopData
+from pipeline.lastKnownGood import StaleSource
+from pipeline.report import templateEnvironment
+from pipeline.staticOutput import renderRoutePages, routePageName, writeIfChanged
+from pipeline.variantFixtures import VariantFactory
+
+
+def testWriteIfChanged(tmp_path: Path) -> None:
+    path = tmp_path / "index.html"
+    assert writeIfChanged(path, ["a", "b"])
+    assert not writeIfChanged(path, ["ab"])
+    assert writeIfChanged(path, ["b"])
+    assert path.read_text() == "b"
+    assert [child.name for child in tmp_path.iterdir()] == ["index.html"]
+
+
+def testRenderRoutePages(tmp_path: Path, makeVariant: VariantFactory) -> None:
+    env = templateEnvironment()
+    outputDirectory = tmp_path / "output"
+    compareResult = compareStops(
+        {"520": [makeVariant("520")], "N01": [makeVariant("N01")]},
+        {"100101": {"Kijowska 01"}},
+    )
+    assert renderRoutePages(env, compareResult, outputDirectory) == 2
+    page = (outputDirectory / routePageName("520")).read_text()
+    assert "Dworzec Wileński 02" in page
+
+    fixedVariant = makeVariant(
+        "N01",
+        operatorStops=[StopData(ref="100101", name="Kijowska 01")],
+        stopsDetour=[False],
+        stopsNew=[False],
+    )
+    compareResult = compareStops(
+        {"520": [makeVariant("520")], "N01": [fixedVariant]},
+        {"100101": {"Kijowska 01"}},
+    )
+    # 520 is unchanged and N01 is fixed, so its page is removed
+    assert renderRoutePages(env, compareResult, outputDirectory) == 0
+    assert [path.name for path in outputDirectory.iterdir()] == [routePageName("520")]
+    assert (outputDirectory / routePageName("520")).read_text() == page
+
+    assert "Wyniki częściowe" not in page
+
+    staleSource = StaleSource(
+        title="Rozkłady WTP",
+        fetchedAt=datetime(2025, 5, 12, 6, tzinfo=UTC),
+        items=["520"],
+        missingItems=["N01"],
+    )
+    renderRoutePages(
+        env,
+        compareResult,
+        outputDirectory,
+        staleSources=[staleSource],
+    )
+    page = (outputDirectory / routePageName("520")).read_text()
+    assert "Wyniki częściowe" in page
+    assert "z 2025-05-12T06:00:00+00:00 (linie 520)" in page
+    assert "brak wcześniejszych danych: N01" in page
@@ -0,0 +1,34 @@
+import dataclasses
+from collections.abc import Callable
+from typing import Any
+
+from model.stopData import StopData
+from osm.OSMRelationAnalyzer import VariantResult
+
+VariantFactory = Callable[..., VariantResult]
+
+
+def makeVariantResult(ref: str = "520", **changes: Any) -> VariantResult:  # noqa: ANN401
+    # a variant whose operator stops continue past the single OSM stop
+    return dataclasses.replace(
+        VariantResult(
+            ref=ref,
+            osmName=f"Bus {ref}",
+            osmId=7,
+            operatorLink=f"https://www.wtp.waw.pl/rozklady-jazdy/?wtp_md=3&wtp_ln={ref}",
+            osmStops=[StopData(ref="100101", name="Kijowska 01")],
+            operatorStops=[
+                StopData(ref="100101", name="Kijowska 01"),
+                StopData(ref="100202", name="Dworzec Wileński 02"),
+            ],
+            detour=False,
+            new=False,
+            short=False,
+            stopsDetour=[False, False],
+            stopsNew=[False, False],
+            unknownRoles=set(),
+            otherErrors=set(),
+            routeType="bus",
+        ),
+        **changes,
+    )
@@ -1,10 +1,55 @@
+import time
+from typing import TYPE_CHECKING
+
 import httpx
 
 from configuration import httpxTimeout
+from pipeline.metrics import HTTP_LATENCY_BUCKETS, RunMetrics
+from scraper.resilience import ResilientTransport
+
+if TYPE_CHECKING:
+    from pipeline.runState import RunState
+
+REQUEST_START_EXTENSION = "osmWtpRequestStart"
+# replaces credentials in recorded requests
+REDACTED_SECRET = "redacted"  # noqa: S105
+
+
+def _requestStarted(request: httpx.Request) -> None:
+    request.extensions[REQUEST_START_EXTENSION] = time.perf_counter()
+
+
+def _responseReceived(metrics: RunMetrics, response: httpx.Response) -> None:
+    # time until response headers, bodies are read later by the caller
+    request = response.request
+    metrics.observe(
+        "http_request_duration_seconds",
+        time.perf_counter() - request.extensions[REQUEST_START_EXTENSION],
+        HTTP_LATENCY_BUCKETS,
+        host=request.url.host,
+    )
+    metrics.increment(
+        "http_responses_total",
+        host=request.url.host,
+        status=str(response.status_code),
+    )
 
 
-def httpxClient() -> httpx.Client:
+def httpxClient(run: "RunState") -> httpx.Client:
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
     }
-    return httpx.Client(timeout=httpxTimeout, headers=headers)
+    return httpx.Client(
+        timeout=httpxTimeout,
+        headers=headers,
+        event_hooks={
+            "request": [_requestStarted],
+            "response": [lambda response: _responseReceived(run.metrics, response)],
+        },
+        # snapshot transports are wrapped too, replays of a failing run fail the same way
+        transport=ResilientTransport(
+            run.transport or httpx.HTTPTransport(),
+            run.circuitBreakers,
+            run.metrics,
+        ),
+    )
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from pipeline.metrics import RunMetrics
+from pipeline.stageGraph import remainingStageSeconds
+
+# rate limiting and server errors count as failures of the host, other statuses don't
+FAILURE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(httpx.TransportError):
+    pass
+
+
+class StageDeadlineExceeded(httpx.TimeoutException):
+    pass
+
+
+@dataclass
+class CircuitBreaker:
+    consecutiveFailures: int = 0
+    # monotonic time, None while the circuit is closed
+    openedAt: float | None = None
+    trialRunning: bool = False
+
+
+class CircuitBreakers:
+    def __init__(
+        self,
+        failureThreshold: int,
+        resetSeconds: float,
+        metrics: RunMetrics,
+    ) -> None:
+        self.failureThreshold = failureThreshold
+        self.resetSeconds = resetSeconds
+        self.metrics = metrics
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    def allow(self, host: str, now: float) -> bool:
+        with self.lock:
+            breaker = self.breakers.setdefault(host, CircuitBreaker())
+            if breaker.openedAt is None:
+                return True
+            # half-open, a single trial request decides whether the circuit closes
+            if breaker.trialRunning or now - breaker.openedAt < self.resetSeconds:
+                return False
+            breaker.trialRunning = True
+            return True
+
+    def recordSuccess(self, host: str) -> None:
+        with self.lock:
+            self.breakers[host] = CircuitBreaker()
+
+    def recordFailure(self, host: str, now: float) -> None:
+        with self.lock:
+            breaker = self.breakers.setdefault(host, CircuitBreaker())
+            breaker.consecutiveFailures += 1
+            tripped = (
+                breaker.openedAt is None
+                and breaker.consecutiveFailures >= self.failureThreshold
+            )
+            if breaker.openedAt is not None or tripped:
+                # a failed trial keeps the circuit open for another reset time
+                breaker.openedAt = now
+                breaker.trialRunning = False
+        if tripped:
+            logging.warning(f"🔌 Circuit of {host} opened")
+            self.metrics.increment("http_circuit_breaker_trips_total", host=host)
+
+    def openHosts(self) -> list[str]:
+        with self.lock:
+            return sorted(
+                host
+                for host, breaker in self.breakers.items()
+                if breaker.openedAt is not None
+            )
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """Fails fast past the deadline of the current stage or while the circuit of a host is open."""
+
+    def __init__(
+        self,
+        transport: httpx.BaseTransport,
+        circuitBreakers: CircuitBreakers,
+        metrics: RunMetrics,
+    ) -> None:
+        self.transport = transport
+        self.circuitBreakers = circuitBreakers
+        self.metrics = metrics
+
+    def _rejected(self, request: httpx.Request, reason: str) -> None:
+        self.metrics.increment(
+            "http_requests_rejected_total", host=request.url.host, reason=reason
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        remaining = remainingStageSeconds()
+        if remaining is not None and remaining <= 0:
+            self._rejected(request, "deadline")
+            message = f"Stage deadline passed before requesting {host}"
+            raise StageDeadlineExceeded(message, request=request)
+        if not self.circuitBreakers.allow(host, time.monotonic()):
+            self._rejected(request, "circuitOpen")
+            message = f"Circuit of {host} is open"
+            raise CircuitOpenError(message, request=request)
+        if remaining is not None:
+            # a request started before the deadline doesn't wait much past it
+            request.extensions["timeout"] = {
+                name: remaining if timeout is None else min(timeout, remaining)
+                for name, timeout in request.extensions.get("timeout", {}).items()
+            }
+        try:
+            response = self.transport.handle_request(request)
+        except httpx.TransportError:
+            self.circuitBreakers.recordFailure(host, time.monotonic())
+            raise
+        if response.status_code in FAILURE_STATUS_CODES:
+            self.circuitBreakers.recordFailure(host, time.monotonic())
+        else:
+            self.circuitBreakers.recordSuccess(host)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
@@ -2,9 +2,15 @@ from urllib import parse
 
 from httpx import Client
 
+from scraper.resilience import FAILURE_STATUS_CODES
+
 
 def fetchWebsite(link: str, httpClient: Client) -> str:
-    return httpClient.get(link, follow_redirects=True).text
+    response = httpClient.get(link, follow_redirects=True)
+    if response.status_code in FAILURE_STATUS_CODES:
+        # an error page parses as an empty route, it mustn't replace a cached one
+        response.raise_for_status()
+    return response.text
 
 
 def parseLinkArguments(link: str) -> dict[str, list[str]]:
@@ -0,0 +1,56 @@
+import httpx
+import pytest
+
+from pipeline.metrics import RunMetrics
+from pipeline.stageGraph import stageDeadline
+from scraper.resilience import (
+    CircuitBreakers,
+    CircuitOpenError,
+    ResilientTransport,
+    StageDeadlineExceeded,
+)
+
+
+def testCircuitBreakerOpensAndLetsTrialThrough() -> None:
+    metrics = RunMetrics()
+    breakers = CircuitBreakers(failureThreshold=2, resetSeconds=10, metrics=metrics)
+    breakers.recordFailure("a.pl", now=0)
+    assert breakers.allow("a.pl", now=1)
+    breakers.recordFailure("a.pl", now=1)
+    assert breakers.openHosts() == ["a.pl"]
+    assert not breakers.allow("a.pl", now=5)
+    assert breakers.allow("b.pl", now=5)
+    # a single trial after the reset time
+    assert breakers.allow("a.pl", now=11)
+    assert not breakers.allow("a.pl", now=11)
+    breakers.recordFailure("a.pl", now=12)
+    assert not breakers.allow("a.pl", now=21)
+    assert breakers.allow("a.pl", now=22)
+    breakers.recordSuccess("a.pl")
+    assert breakers.openHosts() == []
+    assert metrics.counter("http_circuit_breaker_trips_total", host="a.pl") == 1
+
+
+def testResilientTransportFailsFast() -> None:
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.host)
+        return httpx.Response(503)
+
+    metrics = RunMetrics()
+    breakers = CircuitBreakers(failureThreshold=2, resetSeconds=10, metrics=metrics)
+    transport = ResilientTransport(httpx.MockTransport(handler), breakers, metrics)
+    with httpx.Client(transport=transport) as client:
+        for _ in range(breakers.failureThreshold):
+            assert client.get("https://a.pl/").status_code == 503
+        with pytest.raises(CircuitOpenError):
+            client.get("https://a.pl/")
+        assert len(requested) == breakers.failureThreshold
+        with stageDeadline(0), pytest.raises(StageDeadlineExceeded):
+            client.get("https://b.pl/")
+        assert "b.pl" not in requested
+    assert (
+        metrics.counter("http_requests_rejected_total", host="b.pl", reason="deadline")
+        == 1
+    )
@@ -0,0 +1,172 @@
+import json
+import logging
+import threading
+from collections.abc import Callable
+from dataclasses import asdict
+from datetime import UTC, datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import unquote
+
+from starsep_utils.healthchecks import healthchecks
+
+from compare.comparator import CompareResult
+from configuration import SERVICE_HOST, SERVICE_REFRESH_SECONDS
+from model.runContext import RunContext
+from network.transitNetwork import TransitNetwork
+from osm.OSMRelationAnalyzer import networkRelations
+from pipeline.resultExport import jsonDefault
+from pipeline.routeCheck import WarmState, checkRelations, routeRelationIds
+from pipeline.runState import RunState, startRun
+
+
+def checkResultJson(
+    compareResult: CompareResult,
+    context: RunContext,
+    *,
+    partial: bool,
+) -> dict:
+    return {
+        "partial": partial,
+        "refs": compareResult.refs,
+        "routes": {
+            ref: asdict(routeResult)
+            for ref, routeResult in compareResult.renderResults.items()
+        },
+        # relations skipped before comparison, e.g. missing url or invalid WTP variant
+        "issues": {
+            name: value
+            for name, value in asdict(context).items()
+            if isinstance(value, set) and len(value) > 0
+        },
+    }
+
+
+class OSMWTPService:
+    def __init__(
+        self,
+        network: TransitNetwork,
+        refresh: Callable[[], dict[str, Any]],
+    ) -> None:
+        self.network = network
+        self.refresh = refresh
+        self.warmState: WarmState | None = None
+        self.refreshing = threading.Event()
+        self.stopped = threading.Event()
+
+    def refreshWarmState(self) -> None:
+        self.refreshing.set()
+        try:
+            results = self.refresh()
+            # swapped at once, requests in flight keep the previous state
+            self.warmState = WarmState.fromStageResults(
+                results,
+                self.network,
+                datetime.now(UTC),
+            )
+            healthchecks()
+        except Exception:
+            logging.exception("❌ Refresh failed, keeping previous state")
+        finally:
+            self.refreshing.clear()
+
+    def refreshLoop(self) -> None:
+        self.refreshWarmState()
+        while not self.stopped.wait(SERVICE_REFRESH_SECONDS):
+            self.refreshWarmState()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.warmState is not None,
+            "refreshing": self.refreshing.is_set(),
+            "refreshedAt": (
+                self.warmState.refreshedAt.isoformat(timespec="seconds")
+                if self.warmState is not None
+                else None
+            ),
+        }
+
+
+class OSMWTPServer(ThreadingHTTPServer):
+    def __init__(self, port: int, service: OSMWTPService) -> None:
+        super().__init__((SERVICE_HOST, port), OSMWTPRequestHandler)
+        self.service = service
+
+
+class OSMWTPRequestHandler(BaseHTTPRequestHandler):
+    server: OSMWTPServer
+
+    def sendJson(self, status: HTTPStatus, payload: Any) -> None:  # noqa: ANN401
+        body = json.dumps(payload, default=jsonDefault, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        service = self.server.service
+        parts = [unquote(part) for part in self.path.strip("/").split("/")]
+        if parts == ["status"]:
+            self.sendJson(HTTPStatus.OK, service.status())
+            return
+        if len(parts) != 2 or parts[0] not in ("route", "relation"):
+            self.sendJson(HTTPStatus.NOT_FOUND, {"error": "Unknown endpoint"})
+            return
+        warmState = service.warmState
+        if warmState is None:
+            self.sendJson(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Warming up"})
+            return
+        kind, value = parts
+        if kind == "route":
+            relationIds = routeRelationIds(
+                networkRelations(
+                    warmState.overpassResult,
+                    service.network.rootRelationId,
+                ),
+                value,
+            )
+        else:
+            try:
+                relationIds = [int(relationId) for relationId in value.split(",")]
+            except ValueError:
+                self.sendJson(HTTPStatus.BAD_REQUEST, {"error": "Invalid relation id"})
+                return
+        if len(relationIds) == 0:
+            self.sendJson(HTTPStatus.NOT_FOUND, {"error": f"Unknown route {value}"})
+            return
+        try:
+            # a run of its own, a refresh may be running at the same time
+            with startRun(RunState()):
+                compareResult, context = checkRelations(
+                    relationIds,
+                    warmState.referenceData,
+                )
+        except Exception as e:
+            logging.exception(f"❌ Checking {kind} {value} failed")
+            self.sendJson(HTTPStatus.BAD_GATEWAY, {"error": str(e)})
+            return
+        self.sendJson(
+            HTTPStatus.OK,
+            checkResultJson(
+                compareResult,
+                context,
+                partial=warmState.referenceData.partial,
+            ),
+        )
+
+
+def serve(
+    port: int,
+    network: TransitNetwork,
+    refresh: Callable[[], dict[str, Any]],
+) -> None:
+    service = OSMWTPService(network, refresh)
+    threading.Thread(target=service.refreshLoop, daemon=True).start()
+    with OSMWTPServer(port, service) as server:
+        logging.info(f"🌐 Serving on http://{SERVICE_HOST}:{port}")
+        try:
+            server.serve_forever()
+        finally:
+            service.stopped.set()
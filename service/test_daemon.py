@@ -0,0 +1,107 @@
+import json
+import threading
+from datetime import UTC, datetime
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from starsep_utils import OverpassResult, Relation
+from starsep_utils.overpass import RelationMember
+
+from compare.comparator import CompareResult, RouteResult
+from model.runContext import RunContext
+from pipeline.routeCheck import ReferenceData, WarmState
+from service.daemon import OSMWTPServer, OSMWTPService
+from warsaw.network import warsawNetwork
+
+
+def _warmState() -> WarmState:
+    relation = Relation(
+        id=7,
+        type="relation",
+        tags={"type": "route", "route": "bus", "ref": "520"},
+        members=[],
+    )
+    root = Relation(
+        id=warsawNetwork.rootRelationId,
+        type="relation",
+        tags={"type": "network"},
+        members=[RelationMember(type="relation", id=7, role="")],
+    )
+    return WarmState(
+        overpassResult=OverpassResult(
+            nodes={},
+            ways={},
+            relations={root.id: root, relation.id: relation},
+        ),
+        referenceData=ReferenceData(
+            network=warsawNetwork,
+            apiResults={},
+            gtfsStops={},
+            gtfsPatterns=None,
+            gtfsShapes=None,
+            lastStopRefs=None,
+        ),
+        refreshedAt=datetime(2025, 1, 1, tzinfo=UTC),
+    )
+
+
+def _get(server: OSMWTPServer, path: str) -> tuple[int, dict]:
+    try:
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}{path}") as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def testService(mocker) -> None:  # noqa: ANN001
+    context = RunContext()
+    context.missingRouteUrl.add(("https://osm.org/relation/8", "Linia 520"))
+    checkRelations = mocker.patch(
+        "service.daemon.checkRelations",
+        return_value=(
+            CompareResult(
+                renderResults={
+                    "520": RouteResult(
+                        routeMismatch=False,
+                        error=False,
+                        detourOnlyErrors=True,
+                        variantResults=[],
+                    ),
+                },
+                refs=["520"],
+                operatorRefToName={},
+            ),
+            context,
+        ),
+    )
+    service = OSMWTPService(warsawNetwork, refresh=dict)
+    server = OSMWTPServer(0, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert _get(server, "/route/520")[0] == 503
+        service.warmState = _warmState()
+        assert _get(server, "/status") == (
+            200,
+            {
+                "ready": True,
+                "refreshing": False,
+                "refreshedAt": "2025-01-01T00:00:00+00:00",
+            },
+        )
+        status, payload = _get(server, "/route/520")
+        assert status == 200
+        assert payload["refs"] == ["520"]
+        assert payload["issues"] == {
+            "missingRouteUrl": [["https://osm.org/relation/8", "Linia 520"]],
+        }
+        checkRelations.assert_called_once_with(
+            [7],
+            service.warmState.referenceData,
+        )
+        assert _get(server, "/route/999")[0] == 404
+        assert _get(server, "/relation/abc")[0] == 400
+        assert _get(server, "/relation/7,8")[0] == 200
+        assert checkRelations.call_args.args[0] == [7, 8]
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,13 +1,13 @@
 import logging
 
+from model.operatorRoute import OperatorRoutes
 from model.types import RouteRef
 from osm.OSMRelationAnalyzer import VariantResult
-from warsaw.fetchApiRoutes import APIUMWarszawaRouteResult
 
 
 # http://localhost:8111/load_object?objects=r16280027&addtags=gtfs:shape_id:like=RA%25/10/TP-WYS
 def compareApiRoutesWithOSM(
-    apiResults: dict[RouteRef, list[APIUMWarszawaRouteResult]],
+    apiResults: OperatorRoutes,
     osmResults: dict[RouteRef, list[VariantResult]],
 ) -> None:
     for routeRef, variants in osmResults.items():
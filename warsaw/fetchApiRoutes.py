@@ -1,25 +1,17 @@
 import json
 import logging
 import os
-from dataclasses import dataclass
 
-import httpx
 from starsep_utils import logDuration
 
-from model.types import RouteRef, StopRef
-
-API_UM_WARSZAWA_API_KEY = os.getenv("API_KEY")
-
-
-@dataclass(frozen=True)
-class APIUMWarszawaRouteResult:
-    routeRef: RouteRef
-    variantId: str
-    stopRefs: list[StopRef]
+from model.operatorRoute import OperatorRoutes, OperatorRouteVariant
+from pipeline.lastKnownGood import API_UM_SOURCE, withLastKnownGood
+from pipeline.runState import currentRun
+from scraper.httpx_client import REDACTED_SECRET, httpxClient
 
 
 @logDuration
-def _parseApiUMData(data: dict) -> dict[RouteRef, list[APIUMWarszawaRouteResult]]:
+def _parseApiUMData(data: dict) -> OperatorRoutes:
     result = {}
     for routeRef, route in data.items():
         result[routeRef] = []
@@ -31,7 +23,7 @@ def _parseApiUMData(data: dict) -> dict[RouteRef, list[APIUMWarszawaRouteResult]
                 for _, stop in sorted(stops.items(), key=lambda x: int(x[0]))
             ]
             result[routeRef].append(
-                APIUMWarszawaRouteResult(
+                OperatorRouteVariant(
                     routeRef=routeRef,
                     variantId=variantId,
                     stopRefs=stopRefs,
@@ -40,21 +32,43 @@ def _parseApiUMData(data: dict) -> dict[RouteRef, list[APIUMWarszawaRouteResult]
     return result
 
 
-def fetchApiRoutes() -> dict[RouteRef, list[APIUMWarszawaRouteResult]]:
-    if API_UM_WARSZAWA_API_KEY is None:
+def downloadApiRoutesJson(apiKey: str) -> str:
+    resourceId = "26b9ade1-f5d4-439e-84b4-9af37ab7ebf1"
+    url = f"https://api.um.warszawa.pl/api/action/public_transport_routes/?apikey={apiKey}&resource_id={resourceId}"
+    with (
+        logDuration("Downloading data from API UM Warszawa"),
+        httpxClient(currentRun()) as httpClient,
+    ):
+        response = httpClient.get(url)
+        response.raise_for_status()
+    return response.text
+
+
+def parseApiRoutesJson(text: str) -> OperatorRoutes:
+    with logDuration("Parsing API UM Warszawa JSON"):
+        data = json.loads(text)["result"]
+    return _parseApiUMData(data)
+
+
+def fetchApiRoutes() -> OperatorRoutes:
+    run = currentRun()
+    apiKey = os.getenv("API_KEY")
+    if apiKey is None and run.offline:
+        # keys of recorded requests are redacted
+        apiKey = REDACTED_SECRET
+    if apiKey is None:
         logging.error(
             "Missing API UM Warszawa api key. Set it as API_KEY environment variable",
         )
         return {}
     try:
-        resourceId = "26b9ade1-f5d4-439e-84b4-9af37ab7ebf1"
-        url = f"https://api.um.warszawa.pl/api/action/public_transport_routes/?apikey={API_UM_WARSZAWA_API_KEY}&resource_id={resourceId}"
-        with logDuration("Downloading data from API UM Warszawa"):
-            response = httpx.get(url)
-            response.raise_for_status()
-        with logDuration("Parsing API UM Warszawa JSON"):
-            data = json.loads(response.text)["result"]
-        return _parseApiUMData(data)
+        return withLastKnownGood(
+            run,
+            API_UM_SOURCE,
+            "apiUM.json",
+            lambda: downloadApiRoutesJson(apiKey),
+            parseApiRoutesJson,
+        )
     except Exception:
         logging.exception("Failed to fetch data from API UM Warszawa")
         return {}
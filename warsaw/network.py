@@ -0,0 +1,58 @@
+from pathlib import Path
+
+from configuration import ENABLE_TRAIN, outputDirectory
+from gtfs.gtfsFeed import GTFSFeed
+from model.runContext import WTPLinkTuple
+from network.transitNetwork import TransitNetwork
+from warsaw.fetchApiRoutes import fetchApiRoutes
+from warsaw.warsawConstants import KM_WIKIDATA, WARSAW_PUBLIC_TRANSPORT_ID, WKD_WIKIDATA
+from warsaw.wtpLastStopRefs import generateLastStopRefs, lastStopRef
+from warsaw.wtpScraper import (
+    WTPLink,
+    mapWtpStop,
+    scrapeHomepage,
+    scrapeLink,
+    wtpDomain,
+)
+from warsaw.wtpStopMapping import wtpStopMapping
+
+
+def parseWTPLink(link: str) -> WTPLinkTuple | None:
+    parsedLink = WTPLink.parseWTPRouteLink(link)
+    return parsedLink.toTuple() if parsedLink is not None else None
+
+
+def isWTPLinkExpected(link: WTPLinkTuple) -> bool:
+    line = WTPLink.fromTuple(link).line
+    return line not in ["M1", "M2"] or (not ENABLE_TRAIN and not line.startswith("S"))
+
+
+warsawNetwork = TransitNetwork(
+    name="warsaw",
+    rootRelationId=WARSAW_PUBLIC_TRANSPORT_ID,
+    osmNetwork="ZTM Warszawa",
+    ignoredOSMNetworks=[
+        "Warszawska Kolej Dojazdowa",
+        "WKD",
+        "KM",
+        "Koleje Mazowieckie",
+    ],
+    ignoredOperatorWikidata=[KM_WIKIDATA, WKD_WIKIDATA],
+    gtfsFeed=GTFSFeed(
+        name="warsaw",
+        zipPath=Path("GTFS-Warsaw") / "warsaw.zip",
+        stopRefLength=6,
+    ),
+    outputDirectory=outputDirectory,
+    operatorDomain=wtpDomain,
+    parseOperatorLink=parseWTPLink,
+    operatorLinkUrl=lambda link: WTPLink.fromTuple(link).url(),
+    isOperatorLinkExpected=isWTPLinkExpected,
+    scrapeOperatorRoute=scrapeLink,
+    scrapeOperatorHomepage=scrapeHomepage,
+    fetchOperatorRoutes=fetchApiRoutes,
+    operatorStopMapping=wtpStopMapping,
+    mapOperatorStop=mapWtpStop,
+    generateLastStopRefs=generateLastStopRefs,
+    lastStopRef=lastStopRef,
+)
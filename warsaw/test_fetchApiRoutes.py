@@ -1,4 +1,5 @@
-from warsaw.fetchApiRoutes import APIUMWarszawaRouteResult, _parseApiUMData
+from model.operatorRoute import OperatorRouteVariant
+from warsaw.fetchApiRoutes import _parseApiUMData
 
 
 def _stopFromRef(ref: str) -> dict:
@@ -29,7 +30,7 @@ def testParseApiUMData(mocker) -> None:  # noqa: ANN001
     }
     expectedResult = {
         routeRef: [
-            APIUMWarszawaRouteResult(
+            OperatorRouteVariant(
                 routeRef=routeRef,
                 variantId=variantId,
                 stopRefs=expectedRefs,
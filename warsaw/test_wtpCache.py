@@ -0,0 +1,196 @@
+import math
+import time
+from datetime import date
+from pathlib import Path
+
+import httpx
+from diskcache import Cache
+
+from configuration import EXPIRE_WTP_SECONDS
+from pipeline.runState import RunState, startRun
+from scraper.scraper import fetchWebsite
+from warsaw.wtpCache import (
+    HOMEPAGE_KEY,
+    MEMORY_TIER,
+    WTP_ENTRY_SECONDS,
+    MemoryTier,
+    cachedValue,
+    compactWTPCache,
+    exportWTPCache,
+    importWTPCache,
+    invalidateWTPCache,
+    readPayload,
+    writePayload,
+    wtpCacheStats,
+    wtpPageKey,
+)
+from warsaw.wtpCacheCommand import entryMatcher
+from warsaw.wtpScraper import WTPLink
+
+
+def testCompactionDropsOutdatedEntries(tmp_path: Path) -> None:
+    with Cache(tmp_path) as diskCache:
+        url = "https://www.wtp.waw.pl/rozklady-jazdy/?wtp_md=3&wtp_ln=520"
+        # entry of the former memoized function, pickled
+        diskCache.set(("warsaw.wtpScraper.cachedScrapeLink", url), {"stops": []})
+        writePayload(wtpPageKey(url), b"current", diskCache, expire=None)
+        writePayload(wtpPageKey(url + "&x"), b"expired", diskCache, expire=0.01)
+        time.sleep(0.02)
+
+        compaction = compactWTPCache(diskCache)
+        assert compaction.entriesBefore == 3
+        assert (compaction.expired, compaction.outdated) == (1, 1)
+        assert compaction.entriesAfter == 1
+        assert readPayload(wtpPageKey(url), diskCache) == (b"current", math.inf)
+
+
+def _fillCache(diskCache: Cache) -> list[str]:
+    links = [
+        WTPLink("520", "A", "0"),
+        WTPLink("520", "B", "1"),
+        WTPLink("17", "A", "0"),
+    ]
+    keys = [wtpPageKey(link.url()) for link in links]
+    # dated fallback of the first link
+    keys.append(wtpPageKey(links[0].url() + "&wtp_dt=2025-05-12"))
+    keys.append(HOMEPAGE_KEY)
+    for key in keys:
+        # stored 11 hours ago
+        writePayload(key, key.encode(), diskCache, expire=WTP_ENTRY_SECONDS - 11 * 3600)
+    return keys
+
+
+def testInvalidateByLineLinkAndDate(tmp_path: Path) -> None:
+    with Cache(tmp_path) as diskCache:
+        keys = _fillCache(diskCache)
+        assert invalidateWTPCache(diskCache, entryMatcher("17", None, None)) == 1
+        link = WTPLink("520", "A", "0")
+        assert invalidateWTPCache(diskCache, entryMatcher(None, link, None)) == 2
+        assert sorted(diskCache.iterkeys()) == sorted([keys[1], HOMEPAGE_KEY])
+        # everything was scraped today
+        assert (
+            invalidateWTPCache(diskCache, entryMatcher(None, None, date(2000, 1, 1)))
+            == 0
+        )
+        assert (
+            invalidateWTPCache(diskCache, entryMatcher(None, None, date(2100, 1, 1)))
+            == 2
+        )
+
+
+def testExportImportAndStats(tmp_path: Path) -> None:
+    with (
+        Cache(tmp_path / "source") as source,
+        Cache(tmp_path / "target", statistics=True) as target,
+    ):
+        keys = _fillCache(source)
+        assert exportWTPCache(source, tmp_path / "export.zip") == len(keys)
+        assert importWTPCache(target, tmp_path / "export.zip") == len(keys)
+        for key in keys:
+            assert readPayload(key, target)[0] == key.encode()
+        _, expireTime = target.get(keys[0], expire_time=True)
+        _, sourceExpireTime = source.get(keys[0], expire_time=True)
+        assert abs(expireTime - sourceExpireTime) < 1
+
+        stats = wtpCacheStats(target)
+        assert (stats.entries, stats.pages, stats.staleEntries) == (5, 4, 0)
+        assert stats.ageHistogram["6-12h"] == 5
+        assert stats.hits >= len(keys)
+
+
+def testMemoryTierEvictsAndExpires() -> None:
+    memoryTier: MemoryTier[str] = MemoryTier(maxEntries=2)
+    memoryTier.put("a", "A", expireTime=100)
+    memoryTier.put("b", "B", expireTime=200)
+    assert memoryTier.get("a", now=0) == "A"
+    # b is the least recently used one
+    memoryTier.put("c", "C", expireTime=100)
+    assert memoryTier.get("b", now=0) is None
+    assert memoryTier.get("a", now=100) is None
+    assert memoryTier.get("c", now=99) == "C"
+
+
+def testCachedValueTiers(tmp_path: Path, mocker) -> None:  # noqa: ANN001
+    mocker.patch("warsaw.wtpCache.wtpCache", return_value=Cache(tmp_path))
+    MEMORY_TIER.clear()
+    computed = []
+
+    def lookup() -> str:
+        return cachedValue(
+            wtpPageKey("https://www.wtp.waw.pl/"),
+            lambda: computed.append(1) or "page",
+            str.encode,
+            bytes.decode,
+        )
+
+    with startRun(RunState()) as run:
+        assert [lookup(), lookup()] == ["page", "page"]
+        MEMORY_TIER.clear()
+        assert lookup() == "page"
+    assert len(computed) == 1
+    lookups = {
+        (dict(labels)["tier"], dict(labels)["result"]): value
+        for (name, labels), value in run.metrics.counters.items()
+        if name == "wtp_cache_tier_lookups_total"
+    }
+    assert lookups == {
+        ("memory", "miss"): 2,
+        ("memory", "hit"): 1,
+        ("disk", "miss"): 1,
+        ("disk", "hit"): 1,
+    }
+    assert run.metrics.counter("wtp_cache_lookups_total", result="hit") == 2
+    MEMORY_TIER.clear()
+
+
+def testCachedValueFallsBackToStaleEntries(tmp_path: Path, mocker) -> None:  # noqa: ANN001
+    diskCache = Cache(tmp_path)
+    mocker.patch("warsaw.wtpCache.wtpCache", return_value=diskCache)
+    MEMORY_TIER.clear()
+    key = wtpPageKey("https://www.wtp.waw.pl/")
+    # fetched a day ago, past EXPIRE_WTP_SECONDS
+    writePayload(key, b"old", diskCache, expire=WTP_ENTRY_SECONDS - 24 * 3600)
+
+    def fail() -> str:
+        message = "wtp.waw.pl is down"
+        raise httpx.ConnectError(message)
+
+    with startRun(RunState()) as run:
+        assert (
+            cachedValue(key, fail, str.encode, bytes.decode, staleItem="520") == "old"
+        )
+    [staleSource] = run.staleData.summary()
+    assert staleSource.items == ["520"]
+    assert time.time() - staleSource.fetchedAt.timestamp() > EXPIRE_WTP_SECONDS
+    # refetched once wtp.waw.pl works again
+    assert cachedValue(key, lambda: "new", str.encode, bytes.decode) == "new"
+    assert readPayload(key, diskCache)[0] == b"new"
+    MEMORY_TIER.clear()
+
+
+def testCachedValueKeepsEntryWhenWTPFails(tmp_path: Path, mocker) -> None:  # noqa: ANN001
+    diskCache = Cache(tmp_path)
+    mocker.patch("warsaw.wtpCache.wtpCache", return_value=diskCache)
+    MEMORY_TIER.clear()
+    url = "https://www.wtp.waw.pl/rozklady-jazdy/?wtp_md=3&wtp_ln=520"
+    key = wtpPageKey(url)
+    writePayload(key, b"old", diskCache, expire=WTP_ENTRY_SECONDS - 24 * 3600)
+    client = httpx.Client(
+        transport=httpx.MockTransport(
+            lambda _: httpx.Response(503, text="<html>Przerwa techniczna</html>"),
+        ),
+    )
+
+    with startRun(RunState()) as run:
+        value = cachedValue(
+            key,
+            lambda: fetchWebsite(url, httpClient=client),
+            str.encode,
+            bytes.decode,
+            staleItem="520",
+        )
+    assert value == "old"
+    assert readPayload(key, diskCache)[0] == b"old"
+    [staleSource] = run.staleData.summary()
+    assert staleSource.items == ["520"]
+    MEMORY_TIER.clear()
@@ -1,5 +1,15 @@
+from benchmarks.fixtures import loadWTPPages
+from model.operatorRoute import OperatorRouteResult
 from model.stopData import StopData
-from warsaw.wtpScraper import mapWtpStop
+from warsaw.wtpScraper import (
+    CachedWTPResult,
+    cachedParseWebsite,
+    decodeCachedWTPResult,
+    decodeWTPLinks,
+    encodeCachedWTPResult,
+    encodeWTPLinks,
+    mapWtpStop,
+)
 
 
 def test_mapWtpStop() -> None:
@@ -11,3 +21,33 @@ def test_mapWtpStop() -> None:
         ref="290980",
         name="Warszawa Falenica",
     )
+
+
+def testCachedWTPResultEncoding() -> None:
+    cachedResults = [
+        cachedParseWebsite(htmlContent=html, inputUrl=url, httpClient=None)
+        for url, html in loadWTPPages().items()
+    ]
+    cachedResults.append(
+        CachedWTPResult(
+            wtpResult=OperatorRouteResult(
+                unavailable=False,
+                detour=True,
+                new=False,
+                short=True,
+                stops=[StopData("Marysin 02", "200002"), StopData("Wiarusa 02", "-")],
+                stopsDetour=[True, False],
+                stopsNew=[False, True],
+            ),
+            seenLinks={("520", "A", "0"), ("520", "B", "1")},
+            missingLastStop={"https://www.wtp.waw.pl/a"},
+            manyLastStops={("https://www.wtp.waw.pl/b", "[<div>Zażółć</div>]")},
+            missingLastStopRefNames={("-", "Wiarusa 02")},
+        ),
+    )
+    for cachedResult in cachedResults:
+        assert (
+            decodeCachedWTPResult(encodeCachedWTPResult(cachedResult)) == cachedResult
+        )
+    links = [("520", "A", "0"), ("17", "A", "0"), ("520", "B", "0")]
+    assert decodeWTPLinks(encodeWTPLinks(links)) == links
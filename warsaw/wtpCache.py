@@ -0,0 +1,352 @@
+import bisect
+import itertools
+import json
+import math
+import threading
+import time
+import zipfile
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+import httpx
+
+from configuration import (
+    EXPIRE_WTP_SECONDS,
+    WTP_CACHE_SIZE_LIMIT,
+    WTP_MEMORY_CACHE_ENTRIES,
+    WTP_STALE_SECONDS,
+    cacheDirectory,
+)
+from pipeline.lastKnownGood import WTP_SOURCE
+from pipeline.metrics import RunMetrics
+from pipeline.runState import currentRun
+
+if TYPE_CHECKING:
+    from diskcache import Cache
+
+T = TypeVar("T")
+
+wtpCacheDirectory = cacheDirectory / "WTP"
+# bump when the encoding of cached values changes, older entries are dropped
+WTP_CACHE_SCHEMA_VERSION = 2
+PAGE_KEY_PREFIX = "page "
+HOMEPAGE_KEY = "homepage"
+EXPORT_MANIFEST_NAME = "manifest.json"
+# entries are refetched after EXPIRE_WTP_SECONDS, then they stay on disk
+# for WTP_STALE_SECONDS as a fallback when wtp.waw.pl fails
+WTP_ENTRY_SECONDS = EXPIRE_WTP_SECONDS + WTP_STALE_SECONDS
+# upper bounds of age buckets in hours, older entries are only a fallback
+AGE_BUCKET_HOURS = [1, 3, 6, 12]
+
+
+@cache
+def wtpCache() -> "Cache":
+    # opened on first use, entry points which don't scrape don't import diskcache
+    from diskcache import Cache  # noqa: PLC0415
+
+    # when the size limit is reached, expired entries go first, then least recently used,
+    # hits and misses are counted across runs for the cache stats command
+    return Cache(
+        wtpCacheDirectory,
+        size_limit=WTP_CACHE_SIZE_LIMIT,
+        eviction_policy="least-recently-used",
+        statistics=True,
+    )
+
+
+def wtpPageKey(url: str) -> str:
+    return PAGE_KEY_PREFIX + url
+
+
+def isCurrentEntry(key: object, value: object) -> bool:
+    # pickled entries of older versions have tuple keys or non-bytes values
+    return (
+        isinstance(key, str)
+        and (key == HOMEPAGE_KEY or key.startswith(PAGE_KEY_PREFIX))
+        and isinstance(value, bytes)
+        and value[:1] == bytes([WTP_CACHE_SCHEMA_VERSION])
+    )
+
+
+def readPayload(key: str, diskCache: "Cache") -> tuple[bytes, float] | None:
+    # payload and its expiry time
+    value, expireTime = diskCache.get(key, expire_time=True)
+    if value is None or not isCurrentEntry(key, value):
+        return None
+    return value[1:], math.inf if expireTime is None else expireTime
+
+
+def writePayload(
+    key: str,
+    payload: bytes,
+    diskCache: "Cache",
+    expire: float | None,
+) -> None:
+    # bytes are stored in SQLite as they are, without pickling
+    diskCache.set(key, bytes([WTP_CACHE_SCHEMA_VERSION]) + payload, expire=expire)
+
+
+@contextmanager
+def uncountedLookups(diskCache: "Cache") -> Iterator[None]:
+    # reads of cache management aren't hits of the pipeline
+    diskCache.stats(enable=False)
+    try:
+        yield
+    finally:
+        diskCache.stats(enable=True)
+
+
+class MemoryTier(Generic[T]):
+    # decoded values of recently used entries in front of the disk cache,
+    # they expire together with their disk entries
+    def __init__(self, maxEntries: int) -> None:
+        self.maxEntries = maxEntries
+        self.entries: OrderedDict[str, tuple[T, float]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str, now: float) -> T | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expireTime = entry
+            if expireTime <= now:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: T, expireTime: float) -> None:
+        with self.lock:
+            self.entries[key] = (value, expireTime)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+MEMORY_TIER: MemoryTier[object] = MemoryTier(WTP_MEMORY_CACHE_ENTRIES)
+
+
+def _countLookup(metrics: RunMetrics, tier: str, *, hit: bool) -> None:
+    metrics.increment(
+        "wtp_cache_tier_lookups_total",
+        tier=tier,
+        result="hit" if hit else "miss",
+    )
+
+
+def storedAt(expireTime: float) -> float:
+    return expireTime - WTP_ENTRY_SECONDS
+
+
+def cachedValue(
+    key: str,
+    compute: Callable[[], T],
+    encode: Callable[[T], bytes],
+    decode: Callable[[bytes], T],
+    # marks stale data in the rendered pages, e.g. the line of a page
+    staleItem: str | None = None,
+) -> T:
+    # memory first, then disk, values computed on a miss are stored in both
+    run = currentRun()
+    now = time.time()
+    value = MEMORY_TIER.get(key, now)
+    _countLookup(run.metrics, "memory", hit=value is not None)
+    if value is not None:
+        run.metrics.increment("wtp_cache_lookups_total", result="hit")
+        return value
+    diskCache = wtpCache()
+    stored = readPayload(key, diskCache)
+    fresh = stored is not None and storedAt(stored[1]) + EXPIRE_WTP_SECONDS > now
+    _countLookup(run.metrics, "disk", hit=fresh)
+    run.metrics.increment("wtp_cache_lookups_total", result="hit" if fresh else "miss")
+    if stored is not None and fresh:
+        payload, expireTime = stored
+        value = decode(payload)
+        freshUntil = storedAt(expireTime) + EXPIRE_WTP_SECONDS
+    else:
+        if stored is not None:
+            run.metrics.increment("wtp_cache_stale_total")
+        try:
+            value = compute()
+        except httpx.HTTPError:
+            if stored is None:
+                raise
+            payload, expireTime = stored
+            run.staleData.addStale(
+                WTP_SOURCE,
+                datetime.fromtimestamp(storedAt(expireTime), UTC),
+                staleItem,
+            )
+            # not kept in memory, the next lookup tries wtp.waw.pl again
+            return decode(payload)
+        freshUntil = now + EXPIRE_WTP_SECONDS
+        writePayload(key, encode(value), diskCache, expire=WTP_ENTRY_SECONDS)
+    MEMORY_TIER.put(key, value, freshUntil)
+    return value
+
+
+@dataclass(frozen=True)
+class CacheCompaction:
+    entriesBefore: int
+    bytesBefore: int
+    expired: int
+    outdated: int
+    evicted: int
+    entriesAfter: int
+    bytesAfter: int
+
+
+def compactWTPCache(diskCache: "Cache") -> CacheCompaction:
+    entriesBefore = len(diskCache)
+    bytesBefore = diskCache.volume()
+    expired = diskCache.expire(retry=True)
+    outdated = 0
+    with uncountedLookups(diskCache):
+        for key in list(diskCache.iterkeys()):
+            if not isCurrentEntry(key, diskCache.get(key, retry=True)):
+                outdated += diskCache.delete(key, retry=True)
+    return CacheCompaction(
+        entriesBefore=entriesBefore,
+        bytesBefore=bytesBefore,
+        expired=expired,
+        outdated=outdated,
+        # least recently used entries, until the cache fits its size limit
+        evicted=diskCache.cull(retry=True),
+        entriesAfter=len(diskCache),
+        bytesAfter=diskCache.volume(),
+    )
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    key: str
+    value: bytes
+    # entries are always stored for WTP_ENTRY_SECONDS
+    storedAt: float
+    expireTime: float
+
+
+def cacheEntries(diskCache: "Cache") -> Iterator[CacheEntry]:
+    # current entries which haven't expired yet
+    with uncountedLookups(diskCache):
+        for key in list(diskCache.iterkeys()):
+            value, expireTime = diskCache.get(key, expire_time=True, retry=True)
+            if expireTime is not None and isCurrentEntry(key, value):
+                yield CacheEntry(
+                    key=key,
+                    value=value,
+                    storedAt=storedAt(expireTime),
+                    expireTime=expireTime,
+                )
+
+
+def ageBuckets() -> list[str]:
+    bounds = [0, *AGE_BUCKET_HOURS]
+    return [
+        *(f"{lower}-{upper}h" for lower, upper in itertools.pairwise(bounds)),
+        f">{bounds[-1]}h",
+    ]
+
+
+def ageBucket(ageSeconds: float) -> str:
+    return ageBuckets()[bisect.bisect_right(AGE_BUCKET_HOURS, ageSeconds / 3600)]
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    entries: int
+    pages: int
+    # entries past the fallback time and entries of older versions, until they are pruned
+    staleEntries: int
+    payloadBytes: int
+    diskBytes: int
+    sizeLimit: int
+    ageHistogram: dict[str, int]
+    # since statistics were enabled, including lookups of stale entries
+    hits: int
+    misses: int
+
+    def hitRatio(self) -> float | None:
+        lookups = self.hits + self.misses
+        return None if lookups == 0 else self.hits / lookups
+
+
+def wtpCacheStats(diskCache: "Cache") -> CacheStats:
+    now = time.time()
+    entries = list(cacheEntries(diskCache))
+    ageHistogram = Counter(ageBucket(now - entry.storedAt) for entry in entries)
+    hits, misses = diskCache.stats(enable=True)
+    return CacheStats(
+        entries=len(entries),
+        pages=sum(1 for entry in entries if entry.key.startswith(PAGE_KEY_PREFIX)),
+        staleEntries=len(diskCache) - len(entries),
+        payloadBytes=sum(len(entry.value) for entry in entries),
+        diskBytes=diskCache.volume(),
+        sizeLimit=diskCache.size_limit,
+        ageHistogram={bucket: ageHistogram[bucket] for bucket in ageBuckets()},
+        hits=hits,
+        misses=misses,
+    )
+
+
+def pruneWTPCache(diskCache: "Cache") -> int:
+    return diskCache.expire(retry=True)
+
+
+def invalidateWTPCache(
+    diskCache: "Cache",
+    matches: Callable[[CacheEntry], bool],
+) -> int:
+    return sum(
+        diskCache.delete(entry.key, retry=True)
+        for entry in cacheEntries(diskCache)
+        if matches(entry)
+    )
+
+
+def exportWTPCache(diskCache: "Cache", path: Path) -> int:
+    # entries keep their expiry time, imported pages expire when they would have here
+    entries = []
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as exportFile:
+        for index, entry in enumerate(cacheEntries(diskCache)):
+            fileName = f"entries/{index:06d}"
+            exportFile.writestr(fileName, entry.value)
+            entries.append(
+                {"key": entry.key, "expireTime": entry.expireTime, "file": fileName},
+            )
+        manifest = {"version": WTP_CACHE_SCHEMA_VERSION, "entries": entries}
+        exportFile.writestr(EXPORT_MANIFEST_NAME, json.dumps(manifest, indent=1))
+    return len(entries)
+
+
+def importWTPCache(diskCache: "Cache", path: Path) -> int:
+    now = time.time()
+    imported = 0
+    with zipfile.ZipFile(path) as exportFile:
+        manifest = json.loads(exportFile.read(EXPORT_MANIFEST_NAME))
+        if manifest["version"] != WTP_CACHE_SCHEMA_VERSION:
+            message = f"WTP cache export {path} has version {manifest['version']}, expected {WTP_CACHE_SCHEMA_VERSION}"
+            raise ValueError(message)
+        for entry in manifest["entries"]:
+            if entry["expireTime"] <= now:
+                continue
+            diskCache.set(
+                entry["key"],
+                exportFile.read(entry["file"]),
+                expire=entry["expireTime"] - now,
+                retry=True,
+            )
+            imported += 1
+    return imported
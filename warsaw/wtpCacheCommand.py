@@ -0,0 +1,151 @@
+import argparse
+import logging
+import sys
+from collections.abc import Callable
+from datetime import UTC, date, datetime, time
+from pathlib import Path
+
+from starsep_utils import formatFileSize
+
+from warsaw.wtpCache import (
+    PAGE_KEY_PREFIX,
+    CacheEntry,
+    CacheStats,
+    compactWTPCache,
+    exportWTPCache,
+    importWTPCache,
+    invalidateWTPCache,
+    pruneWTPCache,
+    wtpCache,
+    wtpCacheDirectory,
+    wtpCacheStats,
+)
+from warsaw.wtpScraper import WTPLink
+
+
+def formatStats(stats: CacheStats) -> str:
+    hitRatio = stats.hitRatio()
+    lines = [
+        f"entries        {stats.entries} ({stats.pages} pages)",
+        f"stale entries  {stats.staleEntries}",
+        f"payload        {formatFileSize(stats.payloadBytes, 1)}",
+        f"on disk        {formatFileSize(stats.diskBytes, 1)} of {formatFileSize(stats.sizeLimit, 1)}",
+        f"hits / misses  {stats.hits} / {stats.misses}"
+        + ("" if hitRatio is None else f" ({hitRatio:.0%})"),
+        "age",
+        *(f"  {bucket:>6}  {count}" for bucket, count in stats.ageHistogram.items()),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def entryMatcher(
+    line: str | None,
+    link: WTPLink | None,
+    before: date | None,
+) -> Callable[[CacheEntry], bool]:
+    beforeTimestamp = (
+        None
+        if before is None
+        else datetime.combine(before, time.min, tzinfo=UTC).timestamp()
+    )
+
+    def matches(entry: CacheEntry) -> bool:
+        if beforeTimestamp is not None and entry.storedAt >= beforeTimestamp:
+            return False
+        if line is None and link is None:
+            return True
+        # dated fallback pages of a link are invalidated with it
+        entryLink = (
+            WTPLink.parseWTPRouteLink(entry.key.removeprefix(PAGE_KEY_PREFIX))
+            if entry.key.startswith(PAGE_KEY_PREFIX)
+            else None
+        )
+        if entryLink is None:
+            return False
+        return (line is None or entryLink.line == line) and (
+            link is None or entryLink == link
+        )
+
+    return matches
+
+
+def parseArguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=f"Manage the WTP cache in {wtpCacheDirectory}",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "stats",
+        help="entry counts, sizes, ages of entries and hits since the cache was created",
+    )
+    commands.add_parser("prune", help="drop expired entries")
+    commands.add_parser(
+        "compact",
+        help="drop expired entries and entries of older versions, evict down to the size limit",
+    )
+    invalidate = commands.add_parser(
+        "invalidate",
+        help="drop entries which match all given filters, they are scraped again by the next run",
+    )
+    invalidate.add_argument("--line", help="all variants of this line, e.g. 520")
+    invalidate.add_argument(
+        "--link",
+        nargs=3,
+        metavar=("LINE", "DIRECTION", "VARIANT"),
+        help="a single WTP link, e.g. 520 A 0",
+    )
+    invalidate.add_argument(
+        "--before",
+        type=date.fromisoformat,
+        help="entries scraped before this day (UTC), e.g. 2025-05-12",
+    )
+    export = commands.add_parser(
+        "export",
+        help="write current entries to a zip archive, e.g. to seed another server",
+    )
+    export.add_argument("path", type=Path)
+    importParser = commands.add_parser(
+        "import",
+        help="add entries from an archive written by export, expired ones are skipped",
+    )
+    importParser.add_argument("path", type=Path)
+    arguments = parser.parse_args()
+    if arguments.command == "invalidate" and all(
+        value is None for value in (arguments.line, arguments.link, arguments.before)
+    ):
+        parser.error("invalidate needs --line, --link or --before")
+    return arguments
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    arguments = parseArguments()
+    diskCache = wtpCache()
+    if arguments.command == "stats":
+        sys.stdout.write(formatStats(wtpCacheStats(diskCache)))
+    elif arguments.command == "prune":
+        logging.info(f"🧹 Pruned {pruneWTPCache(diskCache)} expired WTP cache entries")
+    elif arguments.command == "compact":
+        compaction = compactWTPCache(diskCache)
+        logging.info(
+            f"🧹 WTP cache compacted: {compaction.entriesBefore} => {compaction.entriesAfter} entries, "
+            f"{formatFileSize(compaction.bytesBefore, 1)} => {formatFileSize(compaction.bytesAfter, 1)}, "
+            f"{compaction.expired} expired, {compaction.outdated} outdated, {compaction.evicted} evicted",
+        )
+    elif arguments.command == "invalidate":
+        link = None if arguments.link is None else WTPLink.fromTuple(arguments.link)
+        invalidated = invalidateWTPCache(
+            diskCache,
+            entryMatcher(arguments.line, link, arguments.before),
+        )
+        logging.info(f"🗑️ Invalidated {invalidated} WTP cache entries")
+    elif arguments.command == "export":
+        exported = exportWTPCache(diskCache, arguments.path)
+        logging.info(f"📦 Exported {exported} WTP cache entries to {arguments.path}")
+    elif arguments.command == "import":
+        imported = importWTPCache(diskCache, arguments.path)
+        logging.info(f"📦 Imported {imported} WTP cache entries from {arguments.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,28 @@
 import logging
 import re
-from dataclasses import dataclass
 from itertools import groupby
 
 from starsep_utils import haversine, logDuration
 
 from configuration import MISSING_REF
-from model.gtfs import GTFSStop
+from model.operatorRoute import LastStopQuery, LastStopRefsResult, ScrapedOSMRoute
 from model.stopData import StopData
-from model.types import RouteRef, StopName, StopRef
-from warsaw.fetchApiRoutes import APIUMWarszawaRouteResult
-from warsaw.scrapedOSMRoute import ScrapedOSMRoute
-
-
-@dataclass(frozen=True)
-class LastStopRefsResult:
-    lastStopsRefsAfter: dict[tuple[str, str], str]
-    uniqueRefForName: dict[str, str]
-
+from model.types import StopRef
 
 stopNameRegex = re.compile(r"^(.*) (\d\d)$")
 
 
-def lastStopRef(
-    lastStopName: StopName,
-    previousRef: StopRef,
-    lastStopRefsResult: LastStopRefsResult,
-    routeRef: RouteRef,
-    stops: list[StopData],
-    apiResults: dict[RouteRef, list[APIUMWarszawaRouteResult]],
-    gtfsStops: dict[StopRef, GTFSStop],
-) -> str:
+def lastStopRef(query: LastStopQuery) -> StopRef:  # noqa: PLR0911
+    lastStopName = query.lastStopName
+    previousRef = query.previousRef
+    routeRef = query.routeRef
+    lastStopRefsResult = query.lastStopRefs
+    gtfsStops = query.gtfsStops
+    stopRefsWithoutLastOne = [stop.ref for stop in query.stops[:-1]]
+    # GTFS trip patterns are authoritative, heuristics are used only without a match
+    gtfsLastStopRef = query.gtfsPatterns.lastStopRef(routeRef, stopRefsWithoutLastOne)
+    if gtfsLastStopRef is not None:
+        return gtfsLastStopRef
     match = re.match(stopNameRegex, lastStopName)
     if match is None:
         return MISSING_REF
@@ -43,9 +35,8 @@ def lastStopRef(
     if key in lastStopRefsResult.lastStopsRefsAfter:
         return f"{lastStopRefsResult.lastStopsRefsAfter[key]}{lastStopLocalRef}"
     # find last stop ref from API UM Warszawa route
-    if routeRef in apiResults:
-        stopRefsWithoutLastOne = [stop.ref for stop in stops[:-1]]
-        for variant in apiResults[routeRef]:
+    if routeRef in query.operatorRoutes:
+        for variant in query.operatorRoutes[routeRef]:
             if variant.stopRefs[:-1] == stopRefsWithoutLastOne:
                 return variant.stopRefs[-1]
     if previousRef in gtfsStops:
@@ -91,7 +82,7 @@ def generateLastStopRefs(scrapedRoutes: list[ScrapedOSMRoute]) -> LastStopRefsRe
         lastStopsRefsAfter[resultKey] = currentStopGroupRef
 
     for route in scrapedRoutes:
-        stops = route.wtpResult.stops
+        stops = route.operatorResult.stops
         stopsCount = len(stops)
         for i in range(stopsCount):
             previousStop = stops[i - 1] if i > 0 else None
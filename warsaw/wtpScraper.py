@@ -1,18 +1,31 @@
 import dataclasses
 import logging
+import struct
+import sys
+import zlib
+from collections.abc import Iterator
 from dataclasses import dataclass
 from typing import Optional
 from urllib import parse
 
-from bs4 import BeautifulSoup
-from diskcache import Cache
+import httpx
 from httpx import Client
 from starsep_utils import logDuration
 
-from configuration import EXPIRE_WTP_SECONDS, MISSING_REF, cacheDirectory
+from configuration import MISSING_REF
+from model.operatorRoute import OperatorRouteResult
+from model.runContext import RunContext
 from model.stopData import StopData
+from pipeline.lastKnownGood import WTP_SOURCE
+from pipeline.runState import currentRun
 from scraper.httpx_client import httpxClient
 from scraper.scraper import fetchWebsite, parseLinkArguments
+from warsaw.wtpCache import (
+    HOMEPAGE_KEY,
+    cachedValue,
+    wtpCache,
+    wtpPageKey,
+)
 from warsaw.wtpStopMapping import wtpStopMapping
 
 lineUnavailableToday = "Najbliższy dzień z dostępnym rozkładem dla wybranej linii to"
@@ -31,8 +44,14 @@ wtpDirectionArg = "wtp_dr"
 wtpVariantArg = "wtp_vr"
 wtpDateArg = "wtp_dt"
 wtpDomain = "wtp.waw.pl"
+# shown in the rendered pages when the homepage couldn't be scraped
+HOMEPAGE_STALE_ITEM = "strona główna rozkładów"
 
-wtpCache = Cache(cacheDirectory / "WTP")
+WTP_FIELD_SEPARATOR = "\0"
+# flags and counts of stops, seen links, missing last stops, many last stops
+# and missing last stop ref names, followed by compressed fields
+WTP_RESULT_HEADER = struct.Struct("<BHHHHH")
+WTP_LINKS_HEADER = struct.Struct("<I")
 
 
 @dataclass(frozen=True)
@@ -68,35 +87,16 @@ class WTPLink:
         )
 
 
-@dataclass(frozen=True)
-class WTPResult:
-    unavailable: bool
-    detour: bool
-    new: bool
-    short: bool
-    stops: list[StopData]
-    stopsDetour: list[bool]
-    stopsNew: list[bool]
-
-
 @dataclass(frozen=True)
 class CachedWTPResult:
-    wtpResult: WTPResult
+    wtpResult: OperatorRouteResult
     seenLinks: set[tuple[str, str, str]]
     missingLastStop: set[str]
     manyLastStops: set[tuple[str, str]]
     missingLastStopRefNames: set[tuple[str, str]]
 
 
-wtpSeenLinks: set[tuple[str, str, str]] = set()
-wtpStopRefs: set[str] = set()
-wtpMissingLastStop: set[str] = set()
-wtpManyLastStops: set[tuple[str, str]] = set()
-wtpMissingLastStopRefNames: set[tuple[str, str]] = set()
-
-
-@wtpCache.memoize(expire=EXPIRE_WTP_SECONDS, ignore={"httpClient"})
-def cachedScrapeLink(link: str, httpClient: Client) -> CachedWTPResult:
+def scrapeWTPPage(link: str, httpClient: Client) -> CachedWTPResult:
     htmlContent = fetchWebsite(link, httpClient=httpClient)
     return cachedParseWebsite(
         htmlContent=htmlContent,
@@ -105,19 +105,154 @@ def cachedScrapeLink(link: str, httpClient: Client) -> CachedWTPResult:
     )
 
 
-def scrapeLink(link: str, httpClient: Client) -> WTPResult | None:
+def _encodeFields(fields: list[str]) -> bytes:
+    # pages repeat line refs and stop names, they compress well
+    return zlib.compress(WTP_FIELD_SEPARATOR.join(fields).encode())
+
+
+def _decodeFields(compressed: bytes) -> list[str]:
+    # interned, so stop names and refs repeated across pages are shared in memory
+    return list(
+        map(
+            sys.intern, zlib.decompress(compressed).decode().split(WTP_FIELD_SEPARATOR)
+        ),
+    )
+
+
+def _groups(
+    fields: list[str],
+    start: int,
+    count: int,
+    width: int,
+) -> Iterator[tuple[str, ...]]:
+    end = start + count * width
+    return zip(
+        *(fields[start + offset : end : width] for offset in range(width)),
+        strict=True,
+    )
+
+
+def encodeCachedWTPResult(cachedResult: CachedWTPResult) -> bytes:
+    wtpResult = cachedResult.wtpResult
+    fields = []
+    for stop, detour, new in zip(
+        wtpResult.stops,
+        wtpResult.stopsDetour,
+        wtpResult.stopsNew,
+        strict=True,
+    ):
+        fields.extend((stop.name, stop.ref, str(detour | new << 1)))
+    for link in sorted(cachedResult.seenLinks):
+        fields.extend(link)
+    fields.extend(sorted(cachedResult.missingLastStop))
+    for values in sorted(cachedResult.manyLastStops):
+        fields.extend(values)
+    for values in sorted(cachedResult.missingLastStopRefNames):
+        fields.extend(values)
+    flags = (
+        wtpResult.unavailable
+        | wtpResult.detour << 1
+        | wtpResult.new << 2
+        | wtpResult.short << 3
+    )
+    return WTP_RESULT_HEADER.pack(
+        flags,
+        len(wtpResult.stops),
+        len(cachedResult.seenLinks),
+        len(cachedResult.missingLastStop),
+        len(cachedResult.manyLastStops),
+        len(cachedResult.missingLastStopRefNames),
+    ) + _encodeFields(fields)
+
+
+def decodeCachedWTPResult(payload: bytes) -> CachedWTPResult:
+    (
+        flags,
+        stopsCount,
+        seenLinksCount,
+        missingLastStopCount,
+        manyLastStopsCount,
+        missingLastStopRefNamesCount,
+    ) = WTP_RESULT_HEADER.unpack_from(payload)
+    fields = _decodeFields(payload[WTP_RESULT_HEADER.size :])
+    stopsEnd = stopsCount * 3
+    stopFlags = [int(value) for value in fields[2:stopsEnd:3]]
+    seenLinksEnd = stopsEnd + seenLinksCount * 3
+    missingLastStopEnd = seenLinksEnd + missingLastStopCount
+    manyLastStopsEnd = missingLastStopEnd + manyLastStopsCount * 2
+    return CachedWTPResult(
+        wtpResult=OperatorRouteResult(
+            unavailable=bool(flags & 1),
+            detour=bool(flags & 2),
+            new=bool(flags & 4),
+            short=bool(flags & 8),
+            stops=list(map(StopData, fields[0:stopsEnd:3], fields[1:stopsEnd:3])),
+            stopsDetour=[bool(stopFlag & 1) for stopFlag in stopFlags],
+            stopsNew=[bool(stopFlag & 2) for stopFlag in stopFlags],
+        ),
+        seenLinks=set(_groups(fields, stopsEnd, seenLinksCount, 3)),
+        missingLastStop=set(fields[seenLinksEnd:missingLastStopEnd]),
+        manyLastStops=set(_groups(fields, missingLastStopEnd, manyLastStopsCount, 2)),
+        missingLastStopRefNames=set(
+            _groups(fields, manyLastStopsEnd, missingLastStopRefNamesCount, 2),
+        ),
+    )
+
+
+def encodeWTPLinks(links: list[tuple[str, str, str]]) -> bytes:
+    return WTP_LINKS_HEADER.pack(len(links)) + _encodeFields(
+        [value for link in links for value in link],
+    )
+
+
+def decodeWTPLinks(payload: bytes) -> list[tuple[str, str, str]]:
+    (linksCount,) = WTP_LINKS_HEADER.unpack_from(payload)
+    return list(
+        _groups(_decodeFields(payload[WTP_LINKS_HEADER.size :]), 0, linksCount, 3),
+    )
+
+
+def cachedScrapeLink(link: str, httpClient: Client) -> CachedWTPResult:
+    # results are shared by the memory tier, mapWtpResult copies stops before changes
+    parsedLink = WTPLink.parseWTPRouteLink(link)
+    return cachedValue(
+        wtpPageKey(link),
+        lambda: scrapeWTPPage(link, httpClient=httpClient),
+        encodeCachedWTPResult,
+        decodeCachedWTPResult,
+        staleItem=None if parsedLink is None else parsedLink.line,
+    )
+
+
+def _scrapeWTPLink(link: str, httpClient: Client) -> CachedWTPResult:
+    if currentRun().cacheBypassed:
+        return scrapeWTPPage(link, httpClient=httpClient)
+    return cachedScrapeLink(link, httpClient=httpClient)
+
+
+def scrapeLink(
+    link: str, httpClient: Client, context: RunContext
+) -> OperatorRouteResult | None:
     parsedLink = WTPLink.parseWTPRouteLink(link)
     if parsedLink is None:
         logging.error(f"Couldn't parse link {link}")
         return None
-    cachedResult = mapWtpResult(
-        cachedScrapeLink(parsedLink.url(), httpClient=httpClient),
+    return addWTPResultToContext(
+        _scrapeWTPLink(parsedLink.url(), httpClient=httpClient),
+        context,
     )
-    wtpSeenLinks.update(cachedResult.seenLinks)
-    wtpStopRefs.update({stop.ref for stop in cachedResult.wtpResult.stops})
-    wtpMissingLastStop.update(cachedResult.missingLastStop)
-    wtpManyLastStops.update(cachedResult.manyLastStops)
-    wtpMissingLastStopRefNames.update(cachedResult.missingLastStopRefNames)
+
+
+def addWTPResultToContext(
+    cachedWTPResult: CachedWTPResult,
+    context: RunContext,
+) -> OperatorRouteResult:
+    cachedResult = mapWtpResult(cachedWTPResult)
+    context.wtpSeenLinks.update(cachedResult.seenLinks)
+    context.wtpStopRefs.update({stop.ref for stop in cachedResult.wtpResult.stops})
+    context.wtpMissingLastStop.update(cachedResult.missingLastStop)
+    context.wtpManyLastStops.update(cachedResult.manyLastStops)
+    context.wtpMissingLastStopRefNames.update(cachedResult.missingLastStopRefNames)
     return cachedResult.wtpResult
 
 
@@ -126,6 +261,9 @@ def cachedParseWebsite(
     inputUrl: str,
     httpClient: Client,
 ) -> CachedWTPResult:
+    from bs4 import BeautifulSoup  # noqa: PLC0415
+
+    currentRun().metrics.increment("wtp_pages_parsed_total")
     parser = BeautifulSoup(htmlContent, features="html.parser")
     seenLinks: set[tuple[str, str, str]] = set()
     missingLastStop: set[str] = set()
@@ -133,7 +271,7 @@ def cachedParseWebsite(
     missingLastStopRefNames: set[tuple[str, str]] = set()
     if variantUnavailable in htmlContent or lineUnavailable in htmlContent:
         return CachedWTPResult(
-            wtpResult=WTPResult(
+            wtpResult=OperatorRouteResult(
                 unavailable=True,
                 detour=False,
                 new=False,
@@ -152,7 +290,7 @@ def cachedParseWebsite(
         anotherDateLink = unavailableDiv[0].select("a")[0].get("href")
         anotherDateLinkArgs = parseLinkArguments(anotherDateLink)
         if wtpDateArg in anotherDateLinkArgs:
-            return cachedScrapeLink(
+            return _scrapeWTPLink(
                 inputUrl + f"&{wtpDateArg}={anotherDateLinkArgs[wtpDateArg][0]}",
                 httpClient=httpClient,
             )
@@ -192,7 +330,7 @@ def cachedParseWebsite(
         stopsDetour.append(len(stopLink.parent.select(".detour")) > 0)
         stopsNew.append(len(stopLink.parent.select(".new")) > 0)
     return CachedWTPResult(
-        WTPResult(
+        OperatorRouteResult(
             unavailable=False,
             detour=len(parser.select("div.timetable-route-point.active.detour")) > 0,
             new=len(parser.select("div.timetable-route-point.active.new")) > 0,
@@ -208,9 +346,10 @@ def cachedParseWebsite(
     )
 
 
-@wtpCache.memoize(expire=EXPIRE_WTP_SECONDS)
-def cachedScrapeHomepage() -> list[tuple[str, str, str]]:
-    with httpxClient() as httpClient:
+def scrapeHomepageLinks() -> list[tuple[str, str, str]]:
+    from bs4 import BeautifulSoup  # noqa: PLC0415
+
+    with httpxClient(currentRun()) as httpClient:
         mainContent = BeautifulSoup(
             fetchWebsite(
                 f"https://www.{wtpDomain}/rozklady-jazdy/",
@@ -229,10 +368,30 @@ def cachedScrapeHomepage() -> list[tuple[str, str, str]]:
     return result
 
 
+def cachedScrapeHomepage() -> list[tuple[str, str, str]]:
+    return cachedValue(
+        HOMEPAGE_KEY,
+        scrapeHomepageLinks,
+        encodeWTPLinks,
+        decodeWTPLinks,
+    )
+
+
 @logDuration
-def scrapeHomepage() -> None:
+def scrapeHomepage(context: RunContext) -> None:
     logging.info("🔧 Scraping WTP homepage")
-    wtpSeenLinks.update(cachedScrapeHomepage())
+    run = currentRun()
+    if not run.cacheBypassed:
+        # pages past their fallback time are dropped, newer ones are refetched when stale
+        wtpCache().expire()
+    try:
+        links = scrapeHomepageLinks() if run.cacheBypassed else cachedScrapeHomepage()
+    except httpx.HTTPError:
+        # only links of not linked WTP pages are missing, the rest of the run goes on
+        logging.exception("Failed to scrape WTP homepage")
+        run.staleData.addMissing(WTP_SOURCE, HOMEPAGE_STALE_ITEM)
+        return
+    context.wtpSeenLinks.update(links)
 
 
 def mapWtpResult(cachedWTPResult: CachedWTPResult) -> CachedWTPResult:
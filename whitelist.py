@@ -1,3 +1,6 @@
 operatorLink  # unused variable (osm/OSMRelationAnalyzer.py:75)
 routeType  # unused variable (osm/OSMRelationAnalyzer.py:83)
 compareApiRoutesWithOSM  # unused function (warsaw/compareApiRoutesWithOSM.py:10)
+maximum  # unused variable (model/gtfs.py:19)
+do_GET  # unused method (service/daemon.py:96)
+fromStartTime  # unused variable (pipeline/history.py:60)